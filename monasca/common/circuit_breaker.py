@@ -0,0 +1,131 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+
+from monasca.common import instrumentation
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """Fails requests fast while a remote service is unavailable.
+
+    The breaker starts closed and lets every request through. After
+    failure_threshold consecutive failures it opens: requests are rejected
+    without being attempted, and a background thread calls probe every
+    retry_interval seconds until it succeeds. The breaker is then half
+    open and lets a single trial request through, which closes the breaker
+    if it succeeds or opens it again if it fails.
+
+    The state is registered as the gauge circuit_breaker.<name>.state, and
+    the number of transitions to every state and of rejected requests as
+    counters next to it.
+    """
+
+    def __init__(self, name, probe, failure_threshold=1, retry_interval=1.0):
+        """Initializes the breaker.
+
+        :param name: The name the instrumentation is registered under.
+        :param probe: Callable without arguments that tries to reach the
+        service and raises an exception if it can not.
+        :param failure_threshold: The number of consecutive failures that
+        open the breaker.
+        :param retry_interval: The number of seconds between probes while
+        the breaker is open.
+        """
+        self._name = name
+        self._probe = probe
+        self._failure_threshold = max(failure_threshold, 1)
+        self._retry_interval = retry_interval
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._trial_in_progress = False
+
+        prefix = 'circuit_breaker.' + name
+        self._state_gauge = instrumentation.gauge(prefix + '.state')
+        self._state_gauge.set(CLOSED)
+        self._transitions = dict(
+            (state, instrumentation.counter(prefix + '.transitions.' + state))
+            for state in (CLOSED, OPEN, HALF_OPEN))
+        self._rejected = instrumentation.counter(prefix + '.rejected')
+
+    @property
+    def state(self):
+        return self._state
+
+    def _set_state(self, state):
+        LOG.info('Circuit breaker %s is %s.' % (self._name, state))
+        self._state = state
+        self._state_gauge.set(state)
+        self._transitions[state].inc()
+
+    def _open(self):
+        self._set_state(OPEN)
+        self._trial_in_progress = False
+        thread = threading.Thread(target=self._probe_until_reachable,
+                                  name='circuit-breaker-' + self._name)
+        thread.daemon = True
+        thread.start()
+
+    def _probe_until_reachable(self):
+        while True:
+            time.sleep(self._retry_interval)
+            try:
+                self._probe()
+                break
+            except Exception as ex:
+                LOG.debug('Circuit breaker %s probe failed: %s' %
+                          (self._name, ex))
+        with self._lock:
+            self._set_state(HALF_OPEN)
+
+    def allow_request(self):
+        """Returns True if a request may be attempted.
+
+        Every allowed request must be followed by a call to record_success
+        or record_failure.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            self._rejected.inc()
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._trial_in_progress = False
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (self._state == HALF_OPEN or
+                    (self._state == CLOSED and
+                     self._failures >= self._failure_threshold)):
+                self._open()
@@ -0,0 +1,113 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import zlib
+
+# zlib window bits for each supported Content-Encoding.
+WBITS = {'gzip': 16 + zlib.MAX_WBITS,
+         'x-gzip': 16 + zlib.MAX_WBITS,
+         'deflate': zlib.MAX_WBITS}
+
+# Number of compressed bytes read from the underlying stream at a time.
+READ_SIZE = 16 * 1024
+
+
+class UnsupportedEncodingException(Exception):
+    pass
+
+
+class DecompressedSizeExceededException(Exception):
+    pass
+
+
+class DecompressionException(Exception):
+    pass
+
+
+def decoding_stream(stream, content_encoding, max_size):
+    """Returns a stream that reads the decoded body from stream.
+
+    :param stream: The stream to read the encoded body from.
+    :param content_encoding: The value of the Content-Encoding header, or
+    None.
+    :param max_size: The maximum number of decompressed bytes that may be
+    read from the returned stream.
+    :raises UnsupportedEncodingException: If the encoding is not supported.
+    """
+    if not content_encoding:
+        return stream
+    content_encoding = content_encoding.strip().lower()
+    if content_encoding == 'identity':
+        return stream
+    if content_encoding not in WBITS:
+        raise UnsupportedEncodingException(
+            'Unsupported Content-Encoding %s' % content_encoding)
+    return DecompressingStream(stream, WBITS[content_encoding], max_size)
+
+
+class DecompressingStream(object):
+    """File-like object that decompresses a zlib or gzip stream on read.
+
+    Compressed data is read from the underlying stream in small blocks and
+    never more than the requested number of decompressed bytes is produced
+    per read, so a small compressed body can not expand into a large
+    buffer in memory.
+    """
+
+    def __init__(self, stream, wbits, max_size, read_size=READ_SIZE):
+        self._stream = stream
+        self._decompressor = zlib.decompressobj(wbits)
+        self._max_size = max_size
+        self._read_size = read_size
+        self._size = 0
+        self._pending = ''
+        self._eof = False
+
+    def _decompress(self, max_length):
+        try:
+            if self._pending:
+                data = self._decompressor.decompress(self._pending,
+                                                     max_length)
+            else:
+                compressed = self._stream.read(self._read_size)
+                if not compressed:
+                    self._eof = True
+                    return self._decompressor.flush()
+                data = self._decompressor.decompress(compressed, max_length)
+            self._pending = self._decompressor.unconsumed_tail
+            return data
+        except zlib.error as ex:
+            raise DecompressionException(str(ex))
+
+    def read(self, size=-1):
+        chunks = []
+        remaining = size
+        while not self._eof and (size < 0 or remaining > 0):
+            # allow one byte over the limit to detect a body that is too
+            # large without decompressing any further.
+            max_length = self._max_size - self._size + 1
+            if remaining > 0:
+                max_length = min(max_length, remaining)
+            data = self._decompress(max_length)
+            self._size += len(data)
+            if self._size > self._max_size:
+                raise DecompressedSizeExceededException(
+                    'Decompressed request body is larger than %d bytes' %
+                    self._max_size)
+            if data:
+                chunks.append(data)
+                remaining -= len(data)
+                if size > 0:
+                    break
+        return ''.join(chunks)
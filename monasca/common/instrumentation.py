@@ -0,0 +1,271 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Process wide registry of counters, gauges, meters and histograms.
+
+Components register their instruments by name, for example::
+
+    dropped = instrumentation.counter('ingestion.async_queue.dropped')
+    dropped.inc()
+
+and snapshot() returns the current value of every registered instrument.
+The snapshots of several processes, like the workers of a server, can be
+combined with merge().
+"""
+
+import bisect
+import math
+import threading
+import time
+
+_lock = threading.Lock()
+_registry = {}
+
+# upper bounds of the histogram buckets, a last bucket holds larger values.
+LATENCY_MS_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+                     10000, 30000)
+SIZE_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000,
+               100000)
+
+PERCENTILES = (50, 95, 99)
+
+
+class Counter(object):
+    """A value that only goes up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self._count += n
+
+    @property
+    def count(self):
+        return self._count
+
+    def snapshot(self):
+        return {'type': 'counter', 'count': self._count}
+
+
+class Gauge(object):
+    """A value that is set to the current reading of something."""
+
+    def __init__(self):
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return {'type': 'gauge', 'value': self._value}
+
+
+class Meter(object):
+    """Counts events and measures their rate.
+
+    The one minute rate is an exponentially weighted moving average that is
+    updated every TICK_INTERVAL seconds, like the meters used by the Java
+    implementation of the API.
+    """
+
+    TICK_INTERVAL = 5.0
+    _ALPHA = 1 - math.exp(-TICK_INTERVAL / 60.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._uncounted = 0
+        self._rate = None
+        self._start_time = time.time()
+        self._last_tick = self._start_time
+
+    def _tick_if_necessary(self):
+        now = time.time()
+        while now - self._last_tick >= self.TICK_INTERVAL:
+            instant_rate = self._uncounted / self.TICK_INTERVAL
+            self._uncounted = 0
+            if self._rate is None:
+                self._rate = instant_rate
+            else:
+                self._rate += self._ALPHA * (instant_rate - self._rate)
+            self._last_tick += self.TICK_INTERVAL
+
+    def mark(self, n=1):
+        with self._lock:
+            self._tick_if_necessary()
+            self._count += n
+            self._uncounted += n
+
+    @property
+    def count(self):
+        return self._count
+
+    def snapshot(self):
+        with self._lock:
+            self._tick_if_necessary()
+            elapsed = time.time() - self._start_time
+            return {'type': 'meter',
+                    'count': self._count,
+                    'mean_rate': self._count / elapsed if elapsed else 0.0,
+                    'one_minute_rate': self._rate or 0.0}
+
+
+class Histogram(object):
+    """Counts values in buckets with fixed upper bounds.
+
+    Percentiles are estimated as the upper bound of the bucket they fall
+    in, or the largest value for the last bucket. Histograms with the same
+    bounds are merged by adding their buckets, so the percentiles of
+    several processes can be combined, unlike those of sampled values.
+    """
+
+    def __init__(self, bounds=LATENCY_MS_BOUNDS):
+        self._lock = threading.Lock()
+        self._bounds = tuple(bounds)
+        self._buckets = [0] * (len(self._bounds) + 1)
+        self._count = 0
+        self._sum = 0
+        self._min = None
+        self._max = None
+
+    def observe(self, value):
+        with self._lock:
+            self._buckets[bisect.bisect_left(self._bounds, value)] += 1
+            self._count += 1
+            self._sum += value
+            if self._min is None or value < self._min:
+                self._min = value
+            if self._max is None or value > self._max:
+                self._max = value
+
+    @property
+    def count(self):
+        return self._count
+
+    def snapshot(self):
+        with self._lock:
+            return _histogram_snapshot(self._bounds, list(self._buckets),
+                                       self._sum, self._min, self._max)
+
+
+def _histogram_snapshot(bounds, buckets, total, minimum, maximum):
+    count = sum(buckets)
+    result = {'type': 'histogram',
+              'count': count,
+              'sum': total,
+              'min': minimum,
+              'max': maximum,
+              'mean': float(total) / count if count else 0.0,
+              'bounds': list(bounds),
+              'buckets': buckets}
+    for percentile in PERCENTILES:
+        estimate = None
+        if count:
+            rank = math.ceil(count * percentile / 100.0)
+            seen = 0
+            for i, bucket in enumerate(buckets):
+                seen += bucket
+                if seen >= rank:
+                    estimate = (min(bounds[i], maximum) if i < len(bounds)
+                                else maximum)
+                    break
+        result['p%d' % percentile] = estimate
+    return result
+
+
+def _get_or_create(name, instrument_class, *args):
+    with _lock:
+        instrument = _registry.get(name)
+        if instrument is None:
+            instrument = _registry[name] = instrument_class(*args)
+        elif not isinstance(instrument, instrument_class):
+            raise TypeError('%s is already registered as a %s' %
+                            (name, type(instrument).__name__))
+        return instrument
+
+
+def counter(name):
+    return _get_or_create(name, Counter)
+
+
+def gauge(name):
+    return _get_or_create(name, Gauge)
+
+
+def meter(name):
+    return _get_or_create(name, Meter)
+
+
+def histogram(name, bounds=LATENCY_MS_BOUNDS):
+    return _get_or_create(name, Histogram, bounds)
+
+
+def snapshot():
+    """Returns the current value of every registered instrument by name."""
+    with _lock:
+        instruments = _registry.items()
+    return dict((name, instrument.snapshot())
+                for name, instrument in instruments)
+
+
+def _merge_instrument(snapshots):
+    kind = snapshots[0]['type']
+    if kind == 'counter':
+        return {'type': kind,
+                'count': sum(snap['count'] for snap in snapshots)}
+    if kind == 'meter':
+        merged = dict((key, sum(snap[key] for snap in snapshots))
+                      for key in ('count', 'mean_rate', 'one_minute_rate'))
+        merged['type'] = kind
+        return merged
+    if kind == 'histogram':
+        bounds = snapshots[0]['bounds']
+        buckets = [0] * (len(bounds) + 1)
+        for snap in snapshots:
+            for i, bucket in enumerate(snap['buckets']):
+                buckets[i] += bucket
+        minimums = [snap['min'] for snap in snapshots
+                    if snap['min'] is not None]
+        maximums = [snap['max'] for snap in snapshots
+                    if snap['max'] is not None]
+        return _histogram_snapshot(bounds, buckets,
+                                   sum(snap['sum'] for snap in snapshots),
+                                   min(minimums) if minimums else None,
+                                   max(maximums) if maximums else None)
+    # gauges are readings of every process, they are not added up.
+    return {'type': kind, 'values': [snap['value'] for snap in snapshots]}
+
+
+def merge(snapshots):
+    """Combines the snapshots of several processes.
+
+    Counters, meters and histograms are added up. Gauges are readings that
+    can not be added, like states or ratios, so they get the list of the
+    values of every process instead of a value.
+
+    :param snapshots: A list of results of snapshot().
+    :return: A dict of instrument name to merged snapshot.
+    """
+    by_name = {}
+    for snap in snapshots:
+        for name, instrument in snap.iteritems():
+            by_name.setdefault(name, []).append(instrument)
+    return dict((name, _merge_instrument(instruments))
+                for name, instruments in by_name.iteritems())
@@ -0,0 +1,190 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import re
+
+import simplejson
+
+# Number of bytes read from the underlying stream at a time.
+READ_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# the characters a number may start with, and the characters that may
+# follow a prefix of a number that is itself a valid number, like 1 in
+# 1.5 or 1e5.
+_NUMBER_START = frozenset('-0123456789')
+_NUMBER_REST = frozenset('0123456789.eE+-')
+
+_decoder = simplejson.JSONDecoder()
+
+
+class JSONStream(object):
+    """Incrementally decodes a JSON document read from a stream.
+
+    Only the part of the document that has not been decoded yet is kept in
+    memory, so the elements of a top-level array can be consumed one at a
+    time without holding the whole request body.
+
+    Malformed documents raise ValueError while being iterated.
+    """
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self._stream = stream
+        self._read_size = read_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        data = self._stream.read(self._read_size)
+        if not data:
+            self._eof = True
+        else:
+            # drop the part of the buffer that has already been decoded.
+            self._buf = self._buf[self._pos:] + data
+            self._pos = 0
+
+    def _peek(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                return ''
+            self._fill()
+
+    def _decode_value(self):
+        """Decodes the next value and returns it with its raw JSON text."""
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+                # a number followed by the end of the buffer or by more of
+                # a number may be cut by the read, unless the stream is
+                # exhausted.
+                if (self._eof or
+                        self._buf[self._pos] not in _NUMBER_START or
+                        (end < len(self._buf) and
+                         self._buf[end] not in _NUMBER_REST)):
+                    raw = self._buf[self._pos:end]
+                    self._pos = end
+                    return value, raw
+            except ValueError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def _expect_end(self):
+        if self._peek():
+            raise ValueError('Extra data after JSON document at %d' %
+                             self._pos)
+
+    def is_array(self):
+        """Returns True if the document is a JSON array."""
+        return self._peek() == '['
+
+    def read_value(self):
+        """Decodes the whole document as a single JSON value."""
+        return self.read_value_with_raw()[0]
+
+    def read_value_with_raw(self):
+        """Decodes the whole document as a single JSON value.
+
+        :return: The value and the JSON text it was decoded from.
+        """
+        value_and_raw = self._decode_value()
+        self._expect_end()
+        return value_and_raw
+
+    def __iter__(self):
+        """Yields the elements of the top-level JSON array one at a time."""
+        for value, _raw in self.iter_with_raw():
+            yield value
+
+    def iter_with_raw(self):
+        """Yields the elements of the top-level JSON array one at a time.
+
+        Every element is yielded as a (value, raw) tuple, where raw is the
+        slice of the document the value was decoded from.
+        """
+        if self._peek() != '[':
+            raise ValueError('Expecting JSON array')
+        self._pos += 1
+
+        if self._peek() == ']':
+            self._pos += 1
+        else:
+            while True:
+                yield self._decode_value()
+                c = self._peek()
+                self._pos += 1
+                if c == ']':
+                    break
+                if c != ',':
+                    raise ValueError('Expecting , delimiter or ] at %d' %
+                                     (self._pos - 1))
+
+        self._expect_end()
+
+    def iter_values(self):
+        """Yields the values of a stream of concatenated JSON documents.
+
+        This is how InfluxDB sends chunked query results, one object for
+        every part of a series.
+        """
+        while self._peek():
+            yield self._decode_value()[0]
+
+
+def starts_array(doc):
+    """Returns True if the JSON text doc is an array."""
+    return doc[_WHITESPACE.match(doc).end():][:1] == '['
+
+
+def split_array(doc):
+    """Splits a JSON array into the JSON text of its elements.
+
+    Every element is decoded to check that it is valid JSON, but it is not
+    encoded again, the elements are returned as the slices of doc they were
+    decoded from, so this is cheaper than decoding the array and encoding
+    every element.
+
+    :param doc: The JSON text of an array.
+    :return: The list of the JSON texts of the elements.
+    :raises ValueError: If doc is not a JSON array.
+    """
+    pos = _WHITESPACE.match(doc).end()
+    if doc[pos:pos + 1] != '[':
+        raise ValueError('Expecting JSON array')
+    pos = _WHITESPACE.match(doc, pos + 1).end()
+
+    elements = []
+    if doc[pos:pos + 1] == ']':
+        pos += 1
+    else:
+        while True:
+            _value, end = _decoder.raw_decode(doc, pos)
+            elements.append(doc[pos:end])
+            pos = _WHITESPACE.match(doc, end).end()
+            c = doc[pos:pos + 1]
+            pos = _WHITESPACE.match(doc, pos + 1).end()
+            if c == ']':
+                break
+            if c != ',':
+                raise ValueError('Expecting , delimiter or ] at %d' % end)
+
+    if doc[pos:].strip():
+        raise ValueError('Extra data after JSON document at %d' % pos)
+    return elements
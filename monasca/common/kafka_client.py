@@ -0,0 +1,354 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import socket
+import threading
+import time
+import weakref
+
+from kafka import client
+from kafka import codec
+from kafka import common
+from kafka import protocol
+
+from monasca.common import circuit_breaker
+from monasca.common import instrumentation
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+# Errors that mean the brokers can not be reached, or the cluster can not
+# take requests for the topic right now.
+UNAVAILABLE_ERRORS = (common.KafkaUnavailableError,
+                      common.LeaderNotAvailableError,
+                      common.NotLeaderForPartitionError,
+                      common.BrokerNotAvailableError,
+                      common.RequestTimedOutError,
+                      common.FailedPayloadsError,
+                      common.LeaderUnavailableError,
+                      common.PartitionUnavailableError,
+                      common.ConnectionError,
+                      common.KafkaTimeoutError,
+                      socket.error)
+
+# Errors that mean the partition metadata of the client is out of date,
+# usually because a leader moved to another broker.
+LEADER_MOVED_ERRORS = (common.NotLeaderForPartitionError,
+                       common.LeaderNotAvailableError,
+                       common.UnknownTopicOrPartitionError,
+                       common.FailedPayloadsError,
+                       common.LeaderUnavailableError,
+                       common.PartitionUnavailableError)
+
+COMPRESSION_CODECS = ('none', 'gzip', 'snappy', 'lz4')
+
+_registry_lock = threading.Lock()
+_registry = {}
+_registry_pid = None
+
+
+def get_client(uri, failure_threshold, retry_interval,
+               metadata_refresh_interval=0):
+    """Returns the ReconnectingClient this process shares for uri.
+
+    Every publisher to the same brokers, whatever its topic or dispatcher,
+    uses the same client and so the same connections. Callers should call
+    get_client every time rather than keep the result: a process forked by
+    the server, like a gunicorn worker, must not use the sockets of its
+    parent, so the first call in a new process starts over with new
+    clients.
+
+    :param uri: The Kafka brokers as host:port, separated by commas.
+    :param failure_threshold: See ReconnectingClient.
+    :param retry_interval: See ReconnectingClient.
+    :param metadata_refresh_interval: See ReconnectingClient.
+    """
+    global _registry_pid
+    with _registry_lock:
+        pid = os.getpid()
+        if _registry_pid != pid:
+            # the clients of the parent can not be closed either, closing
+            # shuts down the sockets the parent still uses.
+            _registry.clear()
+            _registry_pid = pid
+        shared = _registry.get(uri)
+        if shared is None:
+            shared = _registry[uri] = ReconnectingClient(
+                uri, 'kafka.' + uri, failure_threshold, retry_interval,
+                metadata_refresh_interval)
+        return shared
+
+
+def resolve_codec(compression):
+    """Returns the kafka protocol codec for a [kafka] compression value.
+
+    Codecs that the installed kafka and compression libraries do not
+    support fall back to no compression with a warning, so a missing
+    optional library does not stop the API.
+
+    :param compression: One of COMPRESSION_CODECS.
+    :raises ValueError: If compression is not one of COMPRESSION_CODECS.
+    """
+    compression = (compression or 'none').lower()
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError('Kafka compression must be one of %s' %
+                         ', '.join(COMPRESSION_CODECS))
+
+    if compression == 'gzip':
+        return protocol.CODEC_GZIP
+    if compression == 'snappy' and codec.has_snappy():
+        return protocol.CODEC_SNAPPY
+    lz4_codec = getattr(protocol, 'CODEC_LZ4', None)
+    if (compression == 'lz4' and lz4_codec is not None and
+            getattr(codec, 'has_lz4', lambda: False)()):
+        return lz4_codec
+    if compression != 'none':
+        LOG.warning('Kafka compression %s is not available, messages are '
+                    'sent uncompressed.' % compression)
+    return protocol.CODEC_NONE
+
+
+class ReconnectingClient(object):
+    """A KafkaClient that is reconnected in the background.
+
+    The client is guarded by a circuit breaker. While the breaker is open,
+    get() raises KafkaUnavailableError at once instead of trying to
+    connect, and a background thread reconnects every retry_interval
+    seconds. The first connection is made in the background too, get()
+    raises KafkaUnavailableError until it is done. Request threads never
+    wait for Kafka to connect.
+
+    The client connects to the first of the brokers in uri that answers,
+    and learns the other brokers and the leader of every partition from
+    it. Another background thread reloads that metadata every
+    metadata_refresh_interval seconds, so produce requests follow leaders
+    that moved to other brokers before they fail.
+
+    KafkaClient is not thread safe, so threads that send requests acquire
+    a copy of the client for their own use and release it when they are
+    done. Copies are kept for the next thread, and get the latest partition
+    metadata every time they are acquired. The lock of the client is only
+    held to hand out and take back copies, never while talking to Kafka,
+    so concurrent requests and the metadata refresh do not wait for each
+    other.
+    """
+
+    def __init__(self, uri, name, failure_threshold, retry_interval,
+                 metadata_refresh_interval=0):
+        """Initializes the client. No connection is made yet.
+
+        :param uri: The Kafka brokers to bootstrap from as host:port,
+        separated by commas.
+        :param name: The name the instrumentation is registered under.
+        :param failure_threshold: The number of consecutive failures that
+        open the circuit breaker.
+        :param retry_interval: The number of seconds between reconnection
+        attempts while the circuit breaker is open.
+        :param metadata_refresh_interval: The number of seconds between
+        reloads of the partition metadata, or 0 to only reload it when
+        requests fail.
+        """
+        self.uri = uri
+        # guards the client, its metadata and the copies, and is never held
+        # while sending requests.
+        self._lock = threading.Lock()
+        self._client = None
+        # copies of the client that are not in use.
+        self._idle = []
+        # the client every copy was made of and the brokers it was given
+        # when it was acquired, to know whether it loaded new metadata.
+        self._leases = weakref.WeakKeyDictionary()
+        self._breaker = circuit_breaker.CircuitBreaker(
+            name, self._reconnect, failure_threshold, retry_interval)
+        self._metadata_refresh_interval = metadata_refresh_interval
+        self._connecting = False
+        self._refreshing = False
+        self._refreshes = instrumentation.counter(name + '.metadata_refreshes')
+        self._refresh_failures = instrumentation.counter(
+            name + '.metadata_refresh_failures')
+
+    @property
+    def breaker(self):
+        return self._breaker
+
+    @property
+    def client(self):
+        """The KafkaClient the copies are made of, or None."""
+        return self._client
+
+    def _reconnect(self):
+        # connect without holding the lock, so users are not blocked.
+        new_client = client.KafkaClient(self.uri)
+        with self._lock:
+            old_client, self._client = self._client, new_client
+            old_copies, self._idle = self._idle, []
+            if self._metadata_refresh_interval > 0 and not self._refreshing:
+                self._refreshing = True
+                thread = threading.Thread(target=self._refresh_metadata,
+                                          name='kafka-metadata-refresh')
+                thread.daemon = True
+                thread.start()
+        # copies in use are closed when they are released.
+        for old in old_copies + [old_client]:
+            if old:
+                old.close()
+        LOG.info('Reconnected to Kafka at %s.' % self.uri)
+
+    def connect(self):
+        """Starts connecting in the background, unless connected already."""
+        with self._lock:
+            if (self._client is not None or self._connecting or
+                    self._breaker.state == circuit_breaker.OPEN):
+                # the breaker reconnects on its own while it is open.
+                return
+            self._connecting = True
+        thread = threading.Thread(target=self._connect,
+                                  name='kafka-connect')
+        thread.daemon = True
+        thread.start()
+
+    def _connect(self):
+        try:
+            self._reconnect()
+            self._breaker.record_success()
+        except Exception as ex:
+            LOG.error('Kafka at %s initialization failed: %s' %
+                      (self.uri, ex))
+            self._breaker.record_failure()
+        finally:
+            with self._lock:
+                self._connecting = False
+
+    def _refresh_metadata(self):
+        while True:
+            time.sleep(self._metadata_refresh_interval)
+            with self._lock:
+                if self._client is None:
+                    # closed, the next connection starts another thread.
+                    self._refreshing = False
+                    return
+                # only the topics in use, a request without topics loads
+                # the metadata of every topic of the cluster.
+                topics = self._client.topic_partitions.keys()
+            if not topics:
+                continue
+            try:
+                # not through the breaker, a refresh must not take the trial
+                # request of a half open breaker.
+                kafka = self._acquire_unchecked()
+            except common.KafkaUnavailableError:
+                continue
+            try:
+                # released with new metadata, the copy shares it.
+                kafka.load_metadata_for_topics(*topics)
+                self._refreshes.inc()
+            except Exception as ex:
+                # requests report the failures of the brokers.
+                self._refresh_failures.inc()
+                LOG.warning('Could not refresh the Kafka metadata: %s' % ex)
+            finally:
+                self.release(kafka)
+
+    def get(self):
+        """Returns the connected KafkaClient.
+
+        A caller that gets a client must report the outcome of using it
+        with success() or failure(). Callers that cache objects built on the
+        client, like producers, should rebuild them when get() returns a
+        different client. Only one thread may send requests with it, the
+        others send with copies from acquire().
+
+        :raises KafkaUnavailableError: If the circuit breaker is open or the
+        client is not connected yet.
+        """
+        kafka = self._client
+        if kafka is None:
+            self.connect()
+            raise common.KafkaUnavailableError(
+                'Kafka at %s is unavailable, connecting' % self.uri)
+        if not self._breaker.allow_request():
+            raise common.KafkaUnavailableError(
+                'Kafka at %s is unavailable, waiting to reconnect' % self.uri)
+        return kafka
+
+    def acquire(self):
+        """Returns a copy of the KafkaClient for the caller's use alone.
+
+        The copy must be given back with release() once the caller is done,
+        and the outcome of using it reported with success() or failure().
+
+        :raises KafkaUnavailableError: As get().
+        """
+        return self._lease(self.get())
+
+    def _acquire_unchecked(self):
+        # as acquire(), without asking the circuit breaker.
+        base = self._client
+        if base is None:
+            raise common.KafkaUnavailableError(
+                'Kafka at %s is unavailable, connecting' % self.uri)
+        return self._lease(base)
+
+    def _lease(self, base):
+        with self._lock:
+            kafka = None
+            while self._idle:
+                kafka = self._idle.pop()
+                if self._leases[kafka][0] is base:
+                    break
+                kafka = None
+            if kafka is None:
+                # a copy starts without connections, it connects to the
+                # brokers it sends requests to.
+                kafka = base.copy()
+            kafka.brokers = base.brokers
+            kafka.topic_partitions = dict(base.topic_partitions)
+            kafka.topics_to_brokers = dict(base.topics_to_brokers)
+            self._leases[kafka] = (base, base.brokers)
+        return kafka
+
+    def release(self, kafka):
+        """Gives back a copy returned by acquire().
+
+        Partition metadata the copy loaded while it was used becomes the
+        metadata of the client.
+        """
+        with self._lock:
+            base, brokers = self._leases.get(kafka, (None, None))
+            if base is not None and base is self._client:
+                if kafka.brokers is not brokers:
+                    base.brokers = kafka.brokers
+                    base.topic_partitions = dict(kafka.topic_partitions)
+                    base.topics_to_brokers = dict(kafka.topics_to_brokers)
+                self._idle.append(kafka)
+                return
+        # made from a client that was replaced since.
+        kafka.close()
+
+    def success(self):
+        self._breaker.record_success()
+
+    def failure(self):
+        """Reports that Kafka could not be reached with the client."""
+        self._breaker.record_failure()
+
+    def close(self):
+        with self._lock:
+            old_client, self._client = self._client, None
+            old_copies, self._idle = self._idle, []
+        for old in old_copies + [old_client]:
+            if old:
+                old.close()
@@ -11,9 +11,8 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
-import time
+import threading
 
-from kafka import client
 from kafka import common
 from kafka import consumer
 from kafka import producer
@@ -24,6 +23,8 @@ try:
 except ImportError:
     import json
 
+from monasca.common import json_stream
+from monasca.common import kafka_client
 from monasca.openstack.common import log
 
 LOG = log.getLogger(__name__)
@@ -31,7 +32,14 @@ LOG = log.getLogger(__name__)
 
 class KafkaConnection(object):
 
-    def __init__(self):
+    def __init__(self, topic=None, from_latest=False):
+        """Initializes the connection. No connection is made yet.
+
+        :param topic: The topic to produce to and consume from, by default
+        the metrics topic.
+        :param from_latest: If True, a new consumer starts with the messages
+        published after it connected rather than with the oldest ones.
+        """
         if not cfg.CONF.kafka.uri:
             raise Exception('Kafka is not configured correctly! '
                             'Use configuration file to specify Kafka '
@@ -39,7 +47,8 @@ class KafkaConnection(object):
                             'uri=192.168.1.191:9092')
 
         self.uri = cfg.CONF.kafka.uri
-        self.topic = cfg.CONF.kafka.topic
+        self.topic = topic or cfg.CONF.kafka.metrics_topic
+        self.from_latest = from_latest
         self.group = cfg.CONF.kafka.group
         self.wait_time = cfg.CONF.kafka.wait_time
         self.async = cfg.CONF.kafka.async
@@ -49,92 +58,110 @@ class KafkaConnection(object):
         self.compact = cfg.CONF.kafka.compact
         self.partitions = cfg.CONF.kafka.partitions
         self.drop_data = cfg.CONF.kafka.drop_data
+        self.codec = kafka_client.resolve_codec(cfg.CONF.kafka.compression)
 
-        self._client = None
+        # consumers keep fetching with their client, so they do not share
+        # it with the publishers of the process.
+        self._consumer_client = None
         self._consumer = None
+        # the positions of a consumer that had to be dropped, so the one
+        # that replaces it goes on where it stopped.
+        self._consumer_offsets = None
         self._producer = None
+        self._producer_lock = threading.Lock()
 
         LOG.debug('Kafka Connection initialized successfully!')
 
-    def _init_client(self, wait_time=None):
-        for i in range(self.max_retry):
-            try:
-                # if there is a client instance, but _init_client is called
-                # again, most likely the connection has gone stale, close that
-                # connection and reconnect.
-                if self._client:
-                    self._client.close()
-
-                if not wait_time:
-                    wait_time = self.wait_time
-                time.sleep(wait_time)
-
-                self._client = client.KafkaClient(self.uri)
-
-                # when a client is re-initialized, existing consumer should be
-                # reset as well.
-                self._consumer = None
-                self._producer = None
-                LOG.debug("Successfully connected to Kafka server at topic: "
-                          "\"%s\" partitions %s" % (self.topic,
-                                                    self.partitions))
-                break
-            except common.KafkaUnavailableError:
-                LOG.error('Kafka server at %s is down.' % self.uri)
-            except common.LeaderNotAvailableError:
-                LOG.error('Kafka at %s has no leader available.' % self.uri)
-            except Exception:
-                LOG.error('Kafka at %s initialization failed.' % self.uri)
-            # Wait a bit and try again to get a client
-            time.sleep(self.wait_time)
-
-    def _init_consumer(self):
-        try:
-            if not self._client:
-                self._init_client()
-            self._consumer = consumer.SimpleConsumer(
-                self._client, self.group, self.topic,
-                auto_commit=self.auto_commit,
-                partitions=self.partitions)
-            LOG.debug('Consumer was created successfully.')
-        except Exception:
-            self._consumer = None
-            LOG.exception('Kafka (%s) consumer can not be created.' %
-                          self.uri)
+    def _init_consumer(self, kafka):
+        if self._consumer is not None:
+            self._consumer_offsets = dict(self._consumer.offsets)
+        self._consumer = consumer.SimpleConsumer(
+            kafka, self.group, self.topic,
+            auto_commit=self.auto_commit,
+            partitions=self.partitions)
+        if self._consumer_offsets:
+            self._consumer.offsets.update(self._consumer_offsets)
+            self._consumer.fetch_offsets = self._consumer.offsets.copy()
+        elif self.from_latest:
+            self._consumer.seek(0, 2)
+        LOG.debug('Consumer was created successfully.')
+
+    def _drop_consumer(self):
+        if self._consumer is not None:
+            self._consumer_offsets = dict(self._consumer.offsets)
+        self._consumer = None
 
-    def _init_producer(self):
-        try:
-            if not self._client:
-                self._init_client()
-            self._producer = producer.SimpleProducer(
-                self._client, async=self.async, ack_timeout=self.ack_time)
-            LOG.debug('Producer was created successfully.')
-        except Exception:
-            self._producer = None
-            LOG.exception('Kafka (%s) producer can not be created.' %
-                          self.uri)
+    def positions(self):
+        """Returns the offset of the next message to consume by partition."""
+        if self._consumer is not None:
+            return dict(self._consumer.offsets)
+        return dict(self._consumer_offsets or {})
+
+    def _init_producer(self, kafka):
+        self._producer = producer.SimpleProducer(
+            kafka, async=self.async, ack_timeout=self.ack_time,
+            codec=self.codec)
+        LOG.debug('Producer was created successfully.')
 
     def commit(self):
         if self._consumer and self.auto_commit:
             self._consumer.commit()
 
     def close(self):
-        if self._client:
-            self._consumer = None
-            self._producer = None
-            self._client.close()
+        self._drop_consumer()
+        self._producer = None
+        if self._consumer_client:
+            self._consumer_client.close()
 
-    def get_messages(self):
+    def connect_consumer(self):
+        """Connects the consumer if it is not connected yet.
+
+        get_messages connects on its own, callers only need this to know
+        where consuming starts before they get the first message.
+
+        :return: True if the consumer is connected.
+        """
+        if self._consumer_client is None:
+            self._consumer_client = kafka_client.ReconnectingClient(
+                self.uri, 'kafka.consumer.' + self.topic, self.max_retry,
+                self.wait_time)
         try:
-            if not self._consumer:
-                self._init_consumer()
+            kafka = self._consumer_client.get()
+        except common.KafkaUnavailableError as ex:
+            LOG.error(ex)
+            return False
 
+        try:
+            # a new client means the connection was re-established, the
+            # consumer has to be rebuilt on top of it.
+            if not self._consumer or self._consumer.client is not kafka:
+                self._init_consumer(kafka)
+            self._consumer_client.success()
+            return True
+        except kafka_client.UNAVAILABLE_ERRORS:
+            LOG.exception('Error occurred while connecting the consumer.')
+            self._consumer_client.failure()
+            self._drop_consumer()
+            return False
+
+    def get_messages(self):
+        if not self.connect_consumer():
+            yield None
+            return
+
+        try:
             for message in self._consumer:
                 LOG.debug(message.message.value)
                 yield message
+        except kafka_client.UNAVAILABLE_ERRORS:
+            LOG.error('Error occurred while handling kafka messages.')
+            self._consumer_client.failure()
+            self._drop_consumer()
+            yield None
         except Exception:
             LOG.error('Error occurred while handling kafka messages.')
-            self._consumer = None
+            self._consumer_client.success()
+            self._drop_consumer()
             yield None
 
     def send_messages(self, messages):
@@ -142,35 +169,66 @@ class KafkaConnection(object):
         if not messages or self.drop_data:
             return 204
 
+        shared_client = kafka_client.get_client(
+            self.uri, self.max_retry, self.wait_time,
+            cfg.CONF.kafka.metadata_refresh_interval)
+        try:
+            kafka = shared_client.acquire()
+        except common.KafkaUnavailableError as ex:
+            LOG.error(ex)
+            return 503
+        try:
+            return self._send_messages(shared_client, kafka, messages)
+        finally:
+            shared_client.release(kafka)
+
+    def _send_messages(self, shared_client, kafka, messages):
         code = 400
         try:
-            if not self._producer:
-                self._init_producer()
+            if self.async:
+                # the producer sends from a copy of its own, it is rebuilt
+                # when the connection was re-established.
+                base = shared_client.client
+                with self._producer_lock:
+                    if (not self._producer or
+                            self._producer.client is not base):
+                        self._init_producer(base)
+                    kafka_producer = self._producer
+            else:
+                # building a synchronous producer costs nothing, it sends
+                # with the copy of the client this request acquired.
+                kafka_producer = producer.SimpleProducer(
+                    kafka, ack_timeout=self.ack_time, codec=self.codec,
+                    random_start=True)
 
             LOG.debug('Start sending messages to kafka.')
             if self.compact:
-                self._producer.send_messages(self.topic, messages)
+                kafka_producer.send_messages(self.topic, messages)
+            elif json_stream.starts_array(messages):
+                # every element is sent as the slice of the body it was
+                # read from, the array is not decoded.
+                items = json_stream.split_array(messages)
+                LOG.debug('Msg split successfully.')
+                if items:
+                    kafka_producer.send_messages(self.topic, *items)
             else:
-                data = json.loads(messages)
+                json.loads(messages)
                 LOG.debug('Msg parsed successfully.')
-                if isinstance(data, list):
-                    for item in data:
-                        self._producer.send_messages(
-                            self.topic, json.dumps(item))
-                else:
-                    self._producer.send_messages(self.topic, messages)
+                kafka_producer.send_messages(self.topic, messages)
             LOG.debug('Message posted successfully.')
             code = 204
-        except (common.KafkaUnavailableError,
-                common.LeaderNotAvailableError):
-            self._client = None
+            shared_client.success()
+        except kafka_client.UNAVAILABLE_ERRORS:
+            shared_client.failure()
             code = 503
             LOG.exception('Error occurred while posting data to '
                           'Kafka.')
         except ValueError:
+            shared_client.success()
             code = 406
             LOG.exception('Message %s is not valid json.' % messages)
         except Exception:
+            shared_client.success()
             code = 500
             LOG.exception('Unknown error.')
 
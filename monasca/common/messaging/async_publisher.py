@@ -0,0 +1,129 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import os
+import threading
+
+from monasca.common import instrumentation
+from monasca.common.messaging import exceptions
+from monasca.common.messaging import publisher
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+_start_lock = threading.Lock()
+
+
+class AsyncPublisher(publisher.Publisher):
+    """Publishes messages from background threads.
+
+    Messages are put on a bounded in-process queue and sent by worker
+    threads through the wrapped publisher, so callers return as soon as
+    their messages are queued. When the queue is full,
+    MessageQueueFullException is raised instead of blocking.
+
+    Messages that the wrapped publisher fails to send are logged and
+    counted, but can not be reported to the caller that queued them.
+
+    The worker threads are started on first use in every process, so a
+    publisher created, or already used, before the server forks its workers
+    starts its threads in each worker.
+    """
+
+    def __init__(self, delegate, name, queue_size, workers=1):
+        """Initializes the publisher.
+
+        :param delegate: The publisher used to send the messages.
+        :param name: The name the instrumentation is registered under.
+        :param queue_size: The maximum number of queued messages.
+        :param workers: The number of worker threads.
+        """
+        self._delegate = delegate
+        self._queue_size = queue_size
+        self._workers = workers
+
+        self._pid = None
+        self._queue = collections.deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._threads = []
+
+        prefix = 'publisher.async.' + name
+        self._depth = instrumentation.gauge(prefix + '.depth')
+        self._drained = instrumentation.meter(prefix + '.drained')
+        self._dropped = instrumentation.counter(prefix + '.dropped')
+        self._failed = instrumentation.counter(prefix + '.failed')
+
+    def _start_workers(self):
+        with _start_lock:
+            if self._pid == os.getpid():
+                return
+            # the threads of a parent process do not run in a forked child,
+            # its queue is sent by the parent and its condition may have
+            # been held by one of them.
+            self._queue = collections.deque()
+            self._size = 0
+            self._depth.set(0)
+            self._cond = threading.Condition()
+            self._threads = []
+            for i in range(self._workers):
+                thread = threading.Thread(target=self._drain,
+                                          name='async-publisher-%d' % i)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def _drain(self):
+        # a worker keeps draining the queue it was started for.
+        cond = self._cond
+        queue = self._queue
+        while True:
+            with cond:
+                while not queue:
+                    cond.wait()
+                messages, keys = queue.popleft()
+                self._size -= len(messages)
+                self._depth.set(self._size)
+
+            try:
+                self._delegate.send_messages(messages, keys)
+                self._drained.mark(len(messages))
+            except Exception:
+                self._failed.inc(len(messages))
+                LOG.exception('Dropped %d messages that could not be '
+                              'published.' % len(messages))
+
+    def send_message(self, message):
+        self.send_messages([message])
+
+    def send_messages(self, messages, keys=None):
+        if not messages:
+            return
+
+        if self._pid != os.getpid():
+            self._start_workers()
+
+        with self._cond:
+            if self._size + len(messages) > self._queue_size:
+                self._dropped.inc(len(messages))
+                raise exceptions.MessageQueueFullException(
+                    'Publish queue is full')
+
+            self._queue.append((messages, keys))
+            self._size += len(messages)
+            self._depth.set(self._size)
+            self._cond.notify()
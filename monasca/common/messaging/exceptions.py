@@ -14,4 +14,13 @@
 
 
 class MessageQueueException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class MessageQueueFullException(MessageQueueException):
+    pass
+
+
+class MessageQueueUnavailable(MessageQueueException):
+    """The message queue can not be reached, sending again may succeed."""
+    pass
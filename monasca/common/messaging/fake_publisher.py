@@ -12,6 +12,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+import threading
+import time
+
+from oslo.config import cfg
+
+from monasca.common import instrumentation
 from monasca.common.messaging import publisher
 
 
@@ -21,4 +28,66 @@ class FakePublisher(publisher.Publisher):
         pass
 
     def send_message(self, message):
-        pass
\ No newline at end of file
+        pass
+
+    def send_messages(self, messages, keys=None):
+        pass
+
+
+class RecordingPublisher(publisher.Publisher):
+    """Keeps the last messages sent in memory instead of publishing them.
+
+    Every call sleeps for the simulated latency of a message queue round
+    trip, then appends the messages and their keys to a ring buffer that
+    holds the last capacity of them. The number of sends, messages and
+    bytes are registered as publisher.recording.<topic>.sends, .messages and
+    .bytes, so the overhead of the API itself can be measured without a
+    message queue.
+    """
+
+    def __init__(self, topic, capacity=None, latency=None):
+        """Initializes the publisher.
+
+        :param topic: The topic the instrumentation is registered under.
+        :param capacity: The number of messages kept, by default
+        [messaging] recording_capacity.
+        :param latency: The number of seconds every call takes, by default
+        [messaging] recording_latency_ms.
+        """
+        if capacity is None:
+            capacity = cfg.CONF.messaging.recording_capacity
+        if latency is None:
+            latency = cfg.CONF.messaging.recording_latency_ms / 1000.0
+        self.topic = topic
+        self.latency = latency
+
+        self._lock = threading.Lock()
+        self._recorded = collections.deque(maxlen=capacity)
+
+        prefix = 'publisher.recording.' + topic
+        self.sends = instrumentation.counter(prefix + '.sends')
+        self.messages = instrumentation.counter(prefix + '.messages')
+        self.bytes = instrumentation.counter(prefix + '.bytes')
+
+    def send_message(self, message):
+        self.send_messages([message])
+
+    def send_messages(self, messages, keys=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if keys is None:
+            keys = [None] * len(messages)
+        with self._lock:
+            self._recorded.extend(zip(messages, keys))
+        self.sends.inc()
+        self.messages.inc(len(messages))
+        self.bytes.inc(sum(len(message) for message in messages))
+
+    def recorded(self):
+        """Returns the recorded (message, key) pairs, oldest first."""
+        with self._lock:
+            return list(self._recorded)
+
+    def clear(self):
+        with self._lock:
+            self._recorded.clear()
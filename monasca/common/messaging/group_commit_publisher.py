@@ -0,0 +1,127 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+
+from monasca.common import instrumentation
+from monasca.common.messaging import publisher
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+
+class _Batch(object):
+
+    def __init__(self):
+        self.entries = []
+        self.size = 0
+        self.full = False
+        self.done = threading.Event()
+        self.error = None
+
+
+class GroupCommitPublisher(publisher.Publisher):
+    """Publishes the messages of concurrent callers together.
+
+    The first caller to send messages opens a batch and waits up to linger
+    seconds for other callers to add theirs, or until the batch holds
+    max_bytes of messages. It then sends the whole batch with a single call
+    to the wrapped publisher. Every caller waits for that call and gets
+    its outcome: send_messages returns once the messages were published,
+    or raises the exception of the wrapped publisher.
+    """
+
+    def __init__(self, delegate, name, max_bytes, linger):
+        """Initializes the publisher.
+
+        :param delegate: The publisher used to send the batches.
+        :param name: The name the instrumentation is registered under.
+        :param max_bytes: The size of the messages in a batch that makes it
+        be sent without waiting any longer.
+        :param linger: The maximum number of seconds the first caller of a
+        batch waits for other callers.
+        """
+        self._delegate = delegate
+        self._max_bytes = max_bytes
+        self._linger = linger
+
+        self._cond = threading.Condition()
+        self._batch = None
+
+        prefix = 'publisher.group_commit.' + name
+        self._flushes = instrumentation.meter(prefix + '.flushes')
+        self._batch_requests = instrumentation.gauge(
+            prefix + '.last_batch_requests')
+
+    def send_message(self, message):
+        self.send_messages([message])
+
+    def send_messages(self, messages, keys=None):
+        if not messages:
+            return
+
+        with self._cond:
+            batch = self._batch
+            is_leader = batch is None
+            if is_leader:
+                batch = self._batch = _Batch()
+            batch.entries.append((messages, keys))
+            batch.size += sum(len(message) for message in messages)
+            if batch.size >= self._max_bytes:
+                batch.full = True
+                # a full batch is closed, later callers open a new one.
+                self._batch = None
+                self._cond.notify_all()
+
+            if is_leader:
+                deadline = time.time() + self._linger
+                while not batch.full:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._batch is batch:
+                    self._batch = None
+
+        if is_leader:
+            self._flush(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+
+    def _flush(self, batch):
+        all_messages = []
+        all_keys = None
+        if any(keys is not None for _messages, keys in batch.entries):
+            all_keys = []
+        for messages, keys in batch.entries:
+            all_messages.extend(messages)
+            if all_keys is not None:
+                if keys is None:
+                    # the publisher spreads messages without keys itself.
+                    keys = [None] * len(messages)
+                all_keys.extend(keys)
+
+        try:
+            self._delegate.send_messages(all_messages, all_keys)
+        except Exception as ex:
+            batch.error = ex
+        finally:
+            self._flushes.mark()
+            self._batch_requests.set(len(batch.entries))
+            batch.done.set()
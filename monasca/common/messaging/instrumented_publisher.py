@@ -0,0 +1,85 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import time
+
+from monasca.common import instrumentation
+from monasca.common.messaging import publisher
+from monasca.common import resource_api
+
+
+def create(driver, topic):
+    """Loads a monasca.messaging driver for topic and instruments it.
+
+    :param driver: The name of the messaging driver.
+    :param topic: The topic the publisher sends to.
+    """
+    return InstrumentedPublisher(
+        resource_api.init_driver('monasca.messaging', driver, [topic]),
+        topic)
+
+
+class InstrumentedPublisher(publisher.Publisher):
+    """Measures the sends of the publisher it wraps.
+
+    The instruments are registered per topic as publisher.<topic>.sends,
+    .messages, .bytes, .failures, .retries, .batch_size and .latency_ms,
+    the last two being histograms. Publishers that send messages again,
+    like the spooling publisher, count them in .retries with
+    retries_counter(topic).
+    """
+
+    def __init__(self, delegate, topic):
+        """Initializes the publisher.
+
+        :param delegate: The publisher that sends the messages.
+        :param topic: The topic the instruments are registered under.
+        """
+        self._delegate = delegate
+
+        prefix = 'publisher.' + topic
+        self._sends = instrumentation.meter(prefix + '.sends')
+        self._messages = instrumentation.counter(prefix + '.messages')
+        self._bytes = instrumentation.counter(prefix + '.bytes')
+        self._failures = instrumentation.counter(prefix + '.failures')
+        self._batch_size = instrumentation.histogram(
+            prefix + '.batch_size', instrumentation.SIZE_BOUNDS)
+        self._latency = instrumentation.histogram(prefix + '.latency_ms')
+        retries_counter(topic)
+
+    def send_message(self, message):
+        self.send_messages([message])
+
+    def send_messages(self, messages, keys=None):
+        if not messages:
+            return
+
+        start = time.time()
+        try:
+            self._delegate.send_messages(messages, keys)
+        except Exception:
+            self._failures.inc()
+            raise
+        finally:
+            self._latency.observe((time.time() - start) * 1000)
+            self._sends.mark()
+
+        self._messages.inc(len(messages))
+        self._bytes.inc(sum(len(message) for message in messages))
+        self._batch_size.observe(len(messages))
+
+
+def retries_counter(topic):
+    """Returns the counter of messages sent again to topic."""
+    return instrumentation.counter('publisher.' + topic + '.retries')
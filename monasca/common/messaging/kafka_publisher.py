@@ -11,20 +11,28 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
-import time
+import collections
+import threading
 
-from kafka import client
 from kafka import common
 from kafka import producer
+from kafka import protocol
 from oslo.config import cfg
 
+from monasca.common import instrumentation
+from monasca.common import kafka_client
 from monasca.common.messaging import exceptions
+from monasca.common.messaging import partitioning
 from monasca.common.messaging import publisher
 from monasca.openstack.common import log
 
 
 LOG = log.getLogger(__name__)
 
+# the bytes kafka adds to every message: offset, size, crc, magic byte,
+# attributes and the lengths of the key and value.
+MESSAGE_OVERHEAD = 26
+
 
 class KafkaPublisher(publisher.Publisher):
     def __init__(self, topic):
@@ -45,66 +53,316 @@ class KafkaPublisher(publisher.Publisher):
         self.compact = cfg.CONF.kafka.compact
         self.partitions = cfg.CONF.kafka.partitions
         self.drop_data = cfg.CONF.kafka.drop_data
+        self.keyed = cfg.CONF.kafka.keyed
+        self.codec = kafka_client.resolve_codec(cfg.CONF.kafka.compression)
+        self.max_message_bytes = cfg.CONF.kafka.max_message_bytes
+        self.dead_letter_topic = cfg.CONF.kafka.dead_letter_topic
 
-        self._client = None
         self._producer = None
+        self._producer_lock = threading.Lock()
+        self._next_partition = 0
 
-    def _init_client(self, wait_time=None):
-        for i in range(self.max_retry):
-            try:
-                # if there is a client instance, but _init_client is called
-                # again, most likely the connection has gone stale, close that
-                # connection and reconnect.
-                if self._client:
-                    self._client.close()
-
-                if not wait_time:
-                    wait_time = self.wait_time
-                time.sleep(wait_time)
-
-                self._client = client.KafkaClient(self.uri)
-
-                # when a client is re-initialized, existing consumer should be
-                # reset as well.
-                self._producer = None
-                break
-            except common.KafkaUnavailableError:
-                LOG.error('Kafka server at %s is down.' % self.uri)
-            except common.LeaderNotAvailableError:
-                LOG.error('Kafka at %s has no leader available.' % self.uri)
-            except Exception:
-                LOG.error('Kafka at %s initialization failed.' % self.uri)
-
-            # Wait a bit and try again to get a client
-            time.sleep(self.wait_time)
-
-    def _init_producer(self):
-        try:
-            if not self._client:
-                self._init_client()
-            self._producer = producer.SimpleProducer(
-                self._client, async=self.async, ack_timeout=self.ack_time)
-            LOG.debug('Kafka SimpleProducer was created successfully.')
-        except Exception:
-            self._producer = None
-            LOG.exception('Kafka (%s) producer can not be created.' % self.uri)
+        prefix = 'publisher.kafka.' + topic
+        self._uncompressed_bytes = instrumentation.counter(
+            prefix + '.uncompressed_bytes')
+        self._compressed_bytes = instrumentation.counter(
+            prefix + '.compressed_bytes')
+        self._compression_ratio = instrumentation.gauge(
+            prefix + '.compression_ratio')
+        self._rerouted = instrumentation.counter(prefix + '.rerouted')
+        self._split_batches = instrumentation.counter(prefix + '.split')
+        self._dead_lettered = instrumentation.counter(
+            prefix + '.dead_lettered')
+
+        # connect before the first message, which would otherwise be
+        # rejected while the connection is made.
+        self._shared_client().connect()
+
+    def _shared_client(self):
+        return kafka_client.get_client(
+            self.uri, self.max_retry, self.wait_time,
+            cfg.CONF.kafka.metadata_refresh_interval)
+
+    def _init_producer(self, kafka):
+        # only used in async mode, synchronous produce requests are built
+        # by _produce.
+        self._producer = producer.Producer(
+            kafka, async=True, ack_timeout=self.ack_time, codec=self.codec)
+        LOG.debug('Kafka %s was created successfully.' % self._producer)
 
     def close(self):
-        if self._client:
-            self._producer = None
-            self._client.close()
+        # the client is shared with the other publishers of the process.
+        self._producer = None
 
     def send_message(self, message):
+        self.send_messages([message])
+
+    def _partition(self, kafka, messages, keys):
+        """Returns the messages grouped by the partition to send them to.
+
+        In keyed mode every message goes to the partition its key maps to.
+        Messages without a key, such as events, and all of the messages when
+        not in keyed mode, go to the next partition in turn, so single
+        messages are spread over the partitions from one send to the next.
+
+        :return: An OrderedDict of partition to list of messages, in the
+        order they were given within each partition.
+        """
+        if self.topic not in kafka.topic_partitions:
+            kafka.load_metadata_for_topics(self.topic)
+        partitions = kafka.topic_partitions.get(self.topic)
+        if not partitions:
+            raise common.LeaderNotAvailableError(
+                'No partitions for topic %s' % self.topic)
+
+        partitioned = collections.OrderedDict()
+        self._next_partition = (self._next_partition + 1) % len(partitions)
+        next_partition = partitions[self._next_partition]
+        if not self.keyed or keys is None:
+            partitioned[next_partition] = messages
+            return partitioned
+
+        for message, key in zip(messages, keys):
+            if key is None:
+                partition = next_partition
+            else:
+                partition = partitioning.partition(key, partitions)
+            partitioned.setdefault(partition, []).append(message)
+        return partitioned
+
+    def _split(self, partitioned):
+        """Splits the messages of every partition into message sets that fit.
+
+        A message set holds at most max_message_bytes of messages, counted
+        before compression, so it fits whether or not it is compressed.
+
+        :return: A list of OrderedDicts of partition to messages, to be sent
+        one after the other so the order within every partition is kept,
+        and the messages too large for any message set.
+        """
+        rounds = []
+        oversized = []
+        for partition, partition_messages in partitioned.iteritems():
+            chunks = []
+            chunk = []
+            size = 0
+            for message in partition_messages:
+                message_size = len(message) + MESSAGE_OVERHEAD
+                if message_size > self.max_message_bytes:
+                    oversized.append(message)
+                    continue
+                if chunk and size + message_size > self.max_message_bytes:
+                    chunks.append(chunk)
+                    chunk = []
+                    size = 0
+                chunk.append(message)
+                size += message_size
+            if chunk:
+                chunks.append(chunk)
+            for i, chunk in enumerate(chunks):
+                if i == len(rounds):
+                    rounds.append(collections.OrderedDict())
+                rounds[i][partition] = chunk
+
+        if len(rounds) > 1:
+            self._split_batches.inc()
+        if oversized and not self.dead_letter_topic:
+            raise common.MessageSizeTooLargeError(
+                '%d messages for topic %s are larger than %d bytes' %
+                (len(oversized), self.topic, self.max_message_bytes))
+        return rounds, oversized
+
+    def _produce(self, kafka, partitioned):
+        """Sends the messages in as few produce requests as fit.
+
+        The messages of every partition are put in message sets of at most
+        max_message_bytes, compressed as a whole with the configured codec.
+        Messages larger than that, and messages the brokers still reject as
+        too large when sent on their own, go to the dead-letter topic.
+        """
+        rounds, undeliverable = self._split(partitioned)
+        for partitioned_round in rounds:
+            undeliverable.extend(self._produce_round(kafka, partitioned_round))
+        if undeliverable:
+            self._dead_letter(kafka, undeliverable)
+
+    def _produce_round(self, kafka, partitioned):
+        """Sends one message set to each partition, in one request per broker.
+
+        Message sets the brokers reject as too large are halved and sent
+        again.
+
+        :return: The messages rejected as too large on their own.
+        """
+        requests = []
+        sizes = {}
+        for partition, partition_messages in partitioned.iteritems():
+            message_set = protocol.create_message_set(partition_messages,
+                                                      self.codec)
+            sizes[partition] = (
+                sum(len(message) for message in partition_messages),
+                sum(len(message.value) for message in message_set))
+            requests.append(common.ProduceRequest(self.topic, partition,
+                                                  message_set))
+
+        failed, error, too_large = self._send_produce_requests(kafka,
+                                                               requests)
+        if failed:
+            # the leaders of these partitions moved, send them again to the
+            # leaders in the current metadata.
+            LOG.info('Re-routing %d produce requests for topic %s: %s' %
+                     (len(failed), self.topic, error))
+            self._rerouted.inc(len(failed))
+            kafka.load_metadata_for_topics(self.topic)
+            failed, error, rerouted_too_large = self._send_produce_requests(
+                kafka, failed)
+            if failed:
+                raise error
+            too_large.extend(rerouted_too_large)
+
+        undeliverable = []
+        for request in too_large:
+            partition_messages = partitioned[request.partition]
+            del sizes[request.partition]
+            if len(partition_messages) == 1:
+                undeliverable.extend(partition_messages)
+                continue
+            self._split_batches.inc()
+            half = len(partition_messages) // 2
+            for part in (partition_messages[:half],
+                         partition_messages[half:]):
+                undeliverable.extend(self._produce_round(
+                    kafka, collections.OrderedDict([(request.partition,
+                                                     part)])))
+
+        self._uncompressed_bytes.inc(sum(size for size, _ in
+                                         sizes.itervalues()))
+        self._compressed_bytes.inc(sum(size for _, size in
+                                       sizes.itervalues()))
+        if self._compressed_bytes.count:
+            self._compression_ratio.set(
+                float(self._uncompressed_bytes.count) /
+                self._compressed_bytes.count)
+        return undeliverable
+
+    def _dead_letter(self, kafka, messages):
+        """Sends messages that can not be published to the dead-letter topic.
+
+        Every message is sent gzip compressed in a request of its own, to
+        the partitions of the topic in turn, so the topic only needs a
+        max.message.bytes as large as the compressed messages.
+
+        :raises: MessageSizeTooLargeError when no dead-letter topic is
+        configured, or the error of a message that could not be sent.
+        """
+        if not self.dead_letter_topic:
+            raise common.MessageSizeTooLargeError(
+                '%d messages for topic %s were rejected as too large' %
+                (len(messages), self.topic))
+        if self.dead_letter_topic not in kafka.topic_partitions:
+            kafka.load_metadata_for_topics(self.dead_letter_topic)
+        partitions = kafka.topic_partitions.get(self.dead_letter_topic)
+        if not partitions:
+            raise common.LeaderNotAvailableError(
+                'No partitions for topic %s' % self.dead_letter_topic)
+
+        LOG.warning('Sending %d messages for topic %s to dead-letter topic '
+                    '%s' % (len(messages), self.topic,
+                            self.dead_letter_topic))
+        for i, message in enumerate(messages):
+            request = common.ProduceRequest(
+                self.dead_letter_topic, partitions[i % len(partitions)],
+                [protocol.create_gzip_message([message])])
+            failed, error, too_large = self._send_produce_requests(
+                kafka, [request])
+            if failed:
+                raise error
+            if too_large:
+                raise common.MessageSizeTooLargeError(
+                    'A message of %d bytes for topic %s does not fit in '
+                    'dead-letter topic %s' % (len(message), self.topic,
+                                              self.dead_letter_topic))
+            self._dead_lettered.inc()
+
+    def _send_produce_requests(self, kafka, requests):
+        """Sends produce requests to the leaders of their partitions.
+
+        :return: The requests that failed because the metadata of the
+        client is out of date, the error of one of them, and the requests
+        rejected because their message set is too large.
+        :raises: The errors of the other failures.
+        """
         try:
-            if not self._producer:
-                self._init_producer()
-            self._producer.send_messages(self.topic, message)
+            responses = kafka.send_produce_request(
+                requests, timeout=self.ack_time, fail_on_error=False)
+        except common.FailedPayloadsError as ex:
+            # the requests to the other brokers were sent.
+            return ex.args[0], ex, []
+        except kafka_client.LEADER_MOVED_ERRORS as ex:
+            return requests, ex, []
 
-        except (common.KafkaUnavailableError,
-                common.LeaderNotAvailableError):
-            self._client = None
+        failed = []
+        error = None
+        too_large = []
+        for request, response in zip(requests, responses):
+            if not response.error:
+                continue
+            response_error = common.kafka_errors.get(
+                response.error, common.UnknownError)(response)
+            if isinstance(response_error, common.MessageSizeTooLargeError):
+                too_large.append(request)
+                continue
+            if not isinstance(response_error,
+                              kafka_client.LEADER_MOVED_ERRORS):
+                raise response_error
+            failed.append(request)
+            error = response_error
+        return failed, error, too_large
+
+    def send_messages(self, messages, keys=None):
+        if not messages:
+            return
+
+        shared_client = self._shared_client()
+        try:
+            kafka = shared_client.acquire()
+        except common.KafkaUnavailableError as ex:
+            raise exceptions.MessageQueueUnavailable(str(ex))
+        try:
+            self._send_messages(shared_client, kafka, messages, keys)
+        finally:
+            shared_client.release(kafka)
+
+    def _send_messages(self, shared_client, kafka, messages, keys):
+        try:
+            partitioned = self._partition(kafka, messages, keys)
+            if self.async:
+                # a new client means the connection was re-established, the
+                # producer has to be rebuilt on top of it. The producer
+                # sends from a copy of its own.
+                base = shared_client.client
+                with self._producer_lock:
+                    if (not self._producer or
+                            self._producer.client is not base):
+                        self._init_producer(base)
+                rounds, oversized = self._split(partitioned)
+                for partitioned_round in rounds:
+                    for partition, partition_messages in (
+                            partitioned_round.iteritems()):
+                        self._producer.send_messages(self.topic, partition,
+                                                     *partition_messages)
+                if oversized:
+                    self._dead_letter(kafka, oversized)
+            else:
+                self._produce(kafka, partitioned)
+            shared_client.success()
+
+        except kafka_client.UNAVAILABLE_ERRORS:
+            shared_client.failure()
             LOG.exception('Error occurred while posting data to Kafka.')
-            raise exceptions.MessageQueueException()
+            raise exceptions.MessageQueueUnavailable()
         except Exception:
+            # the request reached Kafka, so the link itself is fine.
+            shared_client.success()
             LOG.exception('Unknown error.')
-            raise exceptions.MessageQueueException()
\ No newline at end of file
+            raise exceptions.MessageQueueException()
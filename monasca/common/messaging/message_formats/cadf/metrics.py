@@ -14,4 +14,8 @@
 
 
 def transform(metrics, tenant_id, region):
-    raise NotImplemented()
\ No newline at end of file
+    raise NotImplementedError()
+
+
+def serialize(metrics, raw_metrics, tenant_id, region):
+    raise NotImplementedError()
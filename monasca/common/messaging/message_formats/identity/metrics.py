@@ -12,6 +12,17 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import json
+
 
 def transform(metrics, tenant_id, region):
-    return metrics
\ No newline at end of file
+    return metrics
+
+
+def serialize(metrics, raw_metrics, tenant_id, region):
+    if not isinstance(metrics, list):
+        metrics = [metrics]
+        raw_metrics = [raw_metrics]
+
+    return [raw if raw is not None else json.dumps(metric)
+            for metric, raw in zip(metrics, raw_metrics)]
@@ -26,4 +26,17 @@ def create_metrics_transform():
     elif metrics_message_format == 'cadf':
         return cadf_metrics.transform
     else:
-        return id_metrics.transform
\ No newline at end of file
+        return id_metrics.transform
+
+
+def create_metrics_serializer():
+    metrics_message_format = cfg.CONF.messaging.metrics_message_format
+    if metrics_message_format == 'reference':
+        return r_metrics.serialize
+    elif metrics_message_format == 'cadf':
+        # rejected when the metrics dispatcher is loaded, not on the first
+        # request.
+        raise NotImplementedError(
+            'The cadf metrics message format is not implemented')
+    else:
+        return id_metrics.serialize
@@ -22,7 +22,7 @@ def transform(event, tenant_id, region):
             tenantId=tenant_id,
             region=region
         ),
-        creation_time=datetime.now()
+        creation_time=datetime.datetime.now()
     )
 
     return transformed_event
\ No newline at end of file
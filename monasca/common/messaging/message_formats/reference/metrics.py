@@ -13,19 +13,47 @@
 # under the License.
 
 import datetime
+import json
+
+
+def _envelope(metric, tenant_id, region, creation_time):
+    return {'metric': metric,
+            'meta': {'tenantId': tenant_id, 'region': region},
+            'creation_time': creation_time}
 
 
 def transform(metrics, tenant_id, region):
-    transformed_metric = {'metric': {},
-                          'meta': {'tenantId': tenant_id, 'region': region},
-                          'creation_time': datetime.now()}
+    creation_time = datetime.datetime.now()
 
     if isinstance(metrics, list):
-        transformed_metrics = []
-        for metric in metrics:
-            transformed_metric['metric'] = metric
-            transformed_metrics.append(transformed_metric)
-        return transformed_metrics
+        return [_envelope(metric, tenant_id, region, creation_time)
+                for metric in metrics]
     else:
-        transformed_metric['metric'] = metrics
-        return transformed_metric
\ No newline at end of file
+        return _envelope(metrics, tenant_id, region, creation_time)
+
+
+def serialize(metrics, raw_metrics, tenant_id, region):
+    """Returns the messages for the metrics as JSON strings.
+
+    The envelope holding the tenant, region and creation time is encoded
+    once and the JSON text of every metric, as it was read from the request
+    body, is spliced into it. Metrics without JSON text (None in
+    raw_metrics) are encoded.
+
+    :param metrics: A metric object or array of metric objects.
+    :param raw_metrics: The JSON text of the metric or array of JSON texts
+    of the metrics.
+    :return: A list with one message per metric.
+    """
+    if not isinstance(metrics, list):
+        metrics = [metrics]
+        raw_metrics = [raw_metrics]
+
+    prefix = '{"metric":'
+    suffix = (',"meta":' +
+              json.dumps({'tenantId': tenant_id, 'region': region}) +
+              ',"creation_time":' +
+              json.dumps(datetime.datetime.now().isoformat()) + '}')
+
+    return [prefix + (raw if raw is not None else json.dumps(metric)) +
+            suffix for metric, raw in zip(metrics, raw_metrics)]
@@ -0,0 +1,61 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import zlib
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf8')
+    return str(value)
+
+
+def series_key(metric, tenant_id, region):
+    """Returns the partition key of the series the metric belongs to.
+
+    The key is made of the tenant, region, metric name and the dimensions
+    sorted by name, so every measurement of a series gets the same key no
+    matter the order its dimensions were sent in.
+
+    :param metric: A metric object.
+    :param tenant_id: The tenant the metric is published for.
+    :param region: The region the metric is published in.
+    :return: The key as a str.
+    """
+    parts = [_encode(tenant_id), _encode(region), _encode(metric['name'])]
+    dimensions = metric.get('dimensions')
+    if dimensions:
+        for name in sorted(dimensions):
+            parts.append(_encode(name))
+            parts.append(_encode(dimensions[name]))
+    return '\0'.join(parts)
+
+
+def series_keys(metrics, tenant_id, region):
+    """Returns the partition keys of a metric or list of metrics."""
+    if not isinstance(metrics, list):
+        metrics = [metrics]
+    return [series_key(metric, tenant_id, region) for metric in metrics]
+
+
+def partition(key, partitions):
+    """Returns the partition for the key.
+
+    Uses CRC32 rather than hash(), which differs between Python builds, so
+    that every API process maps a key to the same partition.
+
+    :param key: The partition key as a str.
+    :param partitions: The list of partitions of the topic.
+    """
+    return partitions[(zlib.crc32(key) & 0xffffffff) % len(partitions)]
@@ -25,4 +25,19 @@ class Publisher(object):
 
         :param message: Message to send.
         """
-        return
\ No newline at end of file
+        return
+
+    @abc.abstractmethod
+    def send_messages(self, messages, keys=None):
+        """Sends a list of messages using the message queue.
+
+        Implementations should ship the whole list in as few round trips to
+        the message queue as possible.
+
+        :param messages: List of messages to send.
+        :param keys: Optional list with the partition key of every message,
+        or None for messages without one. Messages with the same key are
+        kept in order on the same partition by message queues that support
+        it.
+        """
+        return
@@ -18,7 +18,12 @@ from monasca.common.messaging import publisher
 class RabbitmqPublisher(publisher.Publisher):
 
     def __init__(self, topic):
-        pass
+        # rejected when the dispatchers are loaded, not on the first request.
+        raise NotImplementedError(
+            'The rabbitmq messaging driver is not implemented')
 
     def send_message(self, message):
-        raise NotImplemented()
\ No newline at end of file
+        raise NotImplementedError()
+
+    def send_messages(self, messages, keys=None):
+        raise NotImplementedError()
@@ -0,0 +1,291 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Write-ahead spool of messages on local disk.
+
+Messages are appended to fixed-size segment files that are memory mapped.
+Every record is a header holding the length and CRC32 of the message,
+followed by the message. A zero length marks the end of the written part
+of a segment, since segments are created filled with zeros.
+
+The position of the oldest message that has not been replayed yet is kept
+in a small cursor file. Segments are deleted once all of their messages
+have been replayed. On start up, the spool resumes from the cursor and
+finds the end of the last segment by scanning its records, so messages
+are replayed at least once.
+"""
+
+import errno
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from monasca.common.messaging import exceptions
+from monasca.openstack.common import fileutils
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+_HEADER = struct.Struct('>Ii')
+_SEGMENT_SUFFIX = '.seg'
+_CURSOR_FILE = 'cursor'
+_LOCK_FILE = 'lock'
+
+# file descriptors of the locked spool directories, held for the life of
+# the process.
+_locked_directories = {}
+
+
+class SpoolFullException(exceptions.MessageQueueException):
+    pass
+
+
+def claim_directory(base_directory):
+    """Returns a spool directory under base_directory for this process.
+
+    API worker processes can not share a spool. Every process locks the
+    first numbered sub-directory that no other process holds, so a
+    restarted worker takes over, and replays, the spool of the one it
+    replaces.
+
+    :param base_directory: The directory that holds the spools.
+    :return: The path of the claimed directory.
+    """
+    slot = 0
+    while True:
+        directory = os.path.join(base_directory, str(slot))
+        fileutils.ensure_tree(directory)
+        fd = os.open(os.path.join(directory, _LOCK_FILE),
+                     os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as ex:
+            os.close(fd)
+            if ex.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            slot += 1
+            continue
+        _locked_directories[directory] = fd
+        return directory
+
+
+class _Segment(object):
+
+    def __init__(self, directory, seq, size):
+        self.seq = seq
+        self.path = os.path.join(directory, '%020d%s' % (seq, _SEGMENT_SUFFIX))
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def read(self, offset):
+        """Returns the record at offset and the offset after it.
+
+        Returns (None, offset) at the end of the written records.
+        """
+        end = offset + _HEADER.size
+        if end > len(self.map):
+            return None, offset
+        length, crc = _HEADER.unpack(self.map[offset:end])
+        if length == 0 or end + length > len(self.map):
+            return None, offset
+        message = self.map[end:end + length]
+        if zlib.crc32(message) != crc:
+            # a torn write, the records after it were never completed.
+            return None, offset
+        return message, end + length
+
+    def write(self, offset, message):
+        end = offset + _HEADER.size
+        self.map[end:end + len(message)] = message
+        self.map[offset:end] = _HEADER.pack(len(message), zlib.crc32(message))
+        return end + len(message)
+
+    def flush(self):
+        self.map.flush()
+
+    def delete(self):
+        self.map.close()
+        os.unlink(self.path)
+
+
+class Spool(object):
+    """Append-only queue of messages stored in memory-mapped segments."""
+
+    def __init__(self, directory, segment_size, max_size,
+                 fsync='interval', fsync_interval=1.0):
+        """Opens, or creates, the spool in directory.
+
+        :param directory: The directory holding the spool files.
+        :param segment_size: The size in bytes of every segment file.
+        :param max_size: The maximum number of bytes of messages that
+        have not been replayed yet.
+        :param fsync: 'always' to flush every append to disk, 'interval' to
+        flush at most every fsync_interval seconds, 'never' to leave it to
+        the operating system.
+        :param fsync_interval: See fsync.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('fsync must be one of %s' %
+                             ', '.join(FSYNC_POLICIES))
+        fileutils.ensure_tree(directory)
+        self._directory = directory
+        self._segment_size = segment_size
+        self._max_size = max_size
+        self._fsync = fsync
+        self._fsync_interval = fsync_interval
+        self._last_sync = time.time()
+        self._lock = threading.Lock()
+
+        seqs = sorted(int(name[:-len(_SEGMENT_SUFFIX)])
+                      for name in os.listdir(directory)
+                      if name.endswith(_SEGMENT_SUFFIX))
+        if not seqs:
+            seqs = [0]
+        self._segments = dict((seq, _Segment(directory, seq, segment_size))
+                              for seq in seqs)
+
+        self._read_seq, self._read_offset = self._load_cursor()
+        if self._read_seq not in self._segments:
+            self._read_seq, self._read_offset = seqs[0], 0
+
+        self._count = 0
+        seq, offset = self._read_seq, self._read_offset
+        while True:
+            message, offset = self._segments[seq].read(offset)
+            if message is not None:
+                self._count += 1
+            elif seq < seqs[-1]:
+                seq, offset = seq + 1, 0
+            else:
+                break
+        self._write_seq, self._write_offset = seq, offset
+
+        if self._count:
+            LOG.info('Spool %s holds %d messages to replay.' %
+                     (directory, self._count))
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self._directory, _CURSOR_FILE)) as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (IOError, ValueError):
+            return None, 0
+
+    def _save_cursor(self):
+        path = os.path.join(self._directory, _CURSOR_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write('%d %d' % (self._read_seq, self._read_offset))
+            if self._fsync == 'always':
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(path + '.tmp', path)
+
+    def _sync(self):
+        if self._fsync == 'never':
+            return
+        now = time.time()
+        if (self._fsync == 'always' or
+                now - self._last_sync >= self._fsync_interval):
+            self._segments[self._write_seq].flush()
+            self._last_sync = now
+
+    def _used_size(self):
+        return ((self._write_seq - self._read_seq) * self._segment_size +
+                self._write_offset - self._read_offset)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, messages):
+        """Appends the messages to the spool.
+
+        :raises SpoolFullException: If the messages do not fit in the spool.
+        Then none of them are appended.
+        """
+        with self._lock:
+            size = 0
+            for message in messages:
+                record_size = _HEADER.size + len(message)
+                if record_size > self._segment_size:
+                    raise SpoolFullException(
+                        'Message of %d bytes does not fit in a spool segment'
+                        % len(message))
+                size += record_size
+            if self._used_size() + size > self._max_size:
+                raise SpoolFullException('Spool %s is full' % self._directory)
+
+            for message in messages:
+                if (self._write_offset + _HEADER.size + len(message) >
+                        self._segment_size):
+                    if self._fsync != 'never':
+                        self._segments[self._write_seq].flush()
+                    self._write_seq += 1
+                    self._write_offset = 0
+                    self._segments[self._write_seq] = _Segment(
+                        self._directory, self._write_seq,
+                        self._segment_size)
+                self._write_offset = self._segments[self._write_seq].write(
+                    self._write_offset, message)
+            self._count += len(messages)
+            self._sync()
+
+    def peek(self, max_messages):
+        """Returns up to max_messages of the oldest messages.
+
+        The messages stay in the spool until they are removed with
+        commit(len(messages)).
+        """
+        with self._lock:
+            messages = []
+            seq, offset = self._read_seq, self._read_offset
+            while len(messages) < max_messages:
+                message, offset = self._segments[seq].read(offset)
+                if message is not None:
+                    messages.append(message)
+                elif seq < self._write_seq:
+                    seq, offset = seq + 1, 0
+                else:
+                    break
+            return messages
+
+    def commit(self, num_messages):
+        """Removes the num_messages oldest messages from the spool."""
+        with self._lock:
+            for _ in range(num_messages):
+                while True:
+                    segment = self._segments[self._read_seq]
+                    message, offset = segment.read(self._read_offset)
+                    if message is not None:
+                        self._read_offset = offset
+                        break
+                    # the segment has been replayed completely.
+                    del self._segments[self._read_seq]
+                    segment.delete()
+                    self._read_seq += 1
+                    self._read_offset = 0
+            self._count -= num_messages
+            self._save_cursor()
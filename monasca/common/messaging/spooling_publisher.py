@@ -0,0 +1,210 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import struct
+import threading
+import time
+
+from monasca.common import instrumentation
+from monasca.common.messaging import exceptions
+from monasca.common.messaging import instrumented_publisher
+from monasca.common.messaging import publisher
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+# spooled records are the length of the partition key, the key and the
+# message. Messages without a key are spooled with an empty one.
+_KEY_LENGTH = struct.Struct('>I')
+
+
+def _pack(message, key):
+    key = key or ''
+    return _KEY_LENGTH.pack(len(key)) + key + message
+
+
+def _unpack(records):
+    messages = []
+    keys = []
+    for record in records:
+        end = _KEY_LENGTH.size + _KEY_LENGTH.unpack_from(record)[0]
+        keys.append(record[_KEY_LENGTH.size:end] or None)
+        messages.append(record[end:])
+    if all(key is None for key in keys):
+        keys = None
+    return messages, keys
+
+
+class SpoolingPublisher(publisher.Publisher):
+    """Spools messages to local disk while they can not be published.
+
+    Messages are sent through the wrapped publisher as long as it succeeds.
+    When it raises MessageQueueUnavailable, the messages are appended to the
+    spool instead and a background thread replays the spool, oldest
+    messages first, until it is empty. While the spool is not empty new
+    messages are appended to it too, so they are published in order.
+
+    Other errors are raised to the caller, and messages that the wrapped
+    publisher still rejects with them while replaying, like messages too
+    large for the topic, are dropped after max_attempts tries so they do
+    not hold up the rest of the spool.
+
+    The spool is opened on first use, so a publisher created before the
+    server forks its workers opens a spool in each worker.
+    """
+
+    def __init__(self, delegate, name, spool_factory, replay_rate,
+                 replay_batch_size, retry_interval=5.0, max_attempts=3):
+        """Initializes the publisher.
+
+        :param delegate: The publisher used to send the messages.
+        :param name: The name the instrumentation is registered under.
+        :param spool_factory: Callable without arguments that returns the
+        spool.Spool to use.
+        :param replay_rate: The maximum number of messages per second that
+        are replayed from the spool, or 0 for no limit.
+        :param replay_batch_size: The maximum number of messages sent at a
+        time while replaying.
+        :param retry_interval: The number of seconds to wait before replaying
+        again after the wrapped publisher failed.
+        :param max_attempts: The number of times a spooled message is sent
+        before it is dropped, when the message queue is available but
+        rejects it.
+        """
+        self._delegate = delegate
+        self._spool_factory = spool_factory
+        self._replay_rate = replay_rate
+        self._replay_batch_size = replay_batch_size
+        self._retry_interval = retry_interval
+        self._max_attempts = max_attempts
+
+        self._spool = None
+        self._replaying = False
+        self._lock = threading.Lock()
+
+        prefix = 'publisher.spool.' + name
+        self._pending = instrumentation.gauge(prefix + '.pending')
+        self._spooled = instrumentation.counter(prefix + '.spooled')
+        self._replayed = instrumentation.meter(prefix + '.replayed')
+        self._dropped = instrumentation.counter(prefix + '.dropped')
+        # spools are named after the topic they publish to.
+        self._retries = instrumented_publisher.retries_counter(name)
+
+    def _open_spool(self):
+        with self._lock:
+            if self._spool is None:
+                self._spool = self._spool_factory()
+                self._pending.set(len(self._spool))
+                if len(self._spool):
+                    self._start_replay()
+
+    def _start_replay(self):
+        self._replaying = True
+        thread = threading.Thread(target=self._run_replay,
+                                  name='spool-replay')
+        thread.daemon = True
+        thread.start()
+
+    def _run_replay(self):
+        # the thread must not die while _replaying is set, or new messages
+        # would be spooled and never replayed.
+        while True:
+            try:
+                self._replay()
+                return
+            except Exception:
+                LOG.exception('Replaying the spool failed, retrying in %s '
+                              'seconds.' % self._retry_interval)
+                time.sleep(self._retry_interval)
+
+    def _replay(self):
+        # the number of messages to send one at a time, after a batch of
+        # them was rejected.
+        isolate = 0
+        attempts = 0
+        while True:
+            records = self._spool.peek(
+                1 if isolate else self._replay_batch_size)
+            if not records:
+                with self._lock:
+                    if not len(self._spool):
+                        self._replaying = False
+                        LOG.info('Replayed all spooled messages.')
+                        return
+                continue
+
+            messages, keys = _unpack(records)
+            try:
+                self._delegate.send_messages(messages, keys)
+            except exceptions.MessageQueueUnavailable as ex:
+                LOG.warning('Could not replay %d spooled messages, retrying '
+                            'in %s seconds: %s' %
+                            (len(messages), self._retry_interval, ex))
+                time.sleep(self._retry_interval)
+                continue
+            except Exception as ex:
+                if len(messages) > 1:
+                    isolate = len(messages)
+                    continue
+                attempts += 1
+                if attempts < self._max_attempts:
+                    LOG.warning('Spooled message rejected, retrying in %s '
+                                'seconds: %s' % (self._retry_interval, ex))
+                    time.sleep(self._retry_interval)
+                    continue
+                LOG.error('Dropping a spooled message rejected %d times: %s' %
+                          (attempts, ex))
+                self._dropped.inc()
+            else:
+                self._replayed.mark(len(messages))
+                self._retries.inc(len(messages))
+                if self._replay_rate > 0:
+                    time.sleep(float(len(messages)) / self._replay_rate)
+
+            attempts = 0
+            isolate = max(isolate - len(messages), 0)
+            self._spool.commit(len(messages))
+            self._pending.set(len(self._spool))
+
+    def _append(self, messages, keys):
+        if keys is None:
+            keys = [None] * len(messages)
+        with self._lock:
+            self._spool.append([_pack(message, key)
+                                for message, key in zip(messages, keys)])
+            self._spooled.inc(len(messages))
+            self._pending.set(len(self._spool))
+            if not self._replaying:
+                self._start_replay()
+
+    def send_message(self, message):
+        self.send_messages([message])
+
+    def send_messages(self, messages, keys=None):
+        if not messages:
+            return
+
+        if self._spool is None:
+            self._open_spool()
+
+        if not self._replaying:
+            try:
+                self._delegate.send_messages(messages, keys)
+                return
+            except exceptions.MessageQueueUnavailable as ex:
+                LOG.warning('Spooling %d messages that could not be '
+                            'published: %s' % (len(messages), ex))
+
+        self._append(messages, keys)
@@ -0,0 +1,96 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Number of bytes read from the underlying stream at a time.
+READ_SIZE = 64 * 1024
+
+
+def is_available():
+    """Returns True if the msgpack package is installed."""
+    return msgpack is not None
+
+
+class MsgpackStream(object):
+    """Incrementally decodes a MessagePack document read from a stream.
+
+    The counterpart of json_stream.JSONStream for MessagePack bodies: the
+    elements of a top-level array can be consumed one at a time without
+    holding the whole request body. Strings are decoded as UTF-8, so the
+    values are the same as those decoded from the equivalent JSON.
+
+    Malformed documents raise ValueError while being iterated.
+    """
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self._stream = stream
+        self._read_size = read_size
+        self._unpacker = msgpack.Unpacker(encoding='utf8')
+        self._first_byte = None
+        self._eof = False
+
+    def _fill(self):
+        data = self._stream.read(self._read_size)
+        if not data:
+            self._eof = True
+        else:
+            if self._first_byte is None:
+                self._first_byte = ord(data[0])
+            self._unpacker.feed(data)
+
+    def _call(self, unpack):
+        # in feed mode the unpacker rolls back to the start of the value
+        # when it runs out of data, so it can be retried after a fill.
+        while True:
+            try:
+                return unpack()
+            except msgpack.OutOfData:
+                if self._eof:
+                    raise ValueError('Truncated MessagePack document')
+                self._fill()
+            except msgpack.UnpackException as ex:
+                raise ValueError(str(ex))
+
+    def _expect_end(self):
+        while not self._eof:
+            self._fill()
+        if self._unpacker.read_bytes(1):
+            raise ValueError('Extra data after MessagePack document')
+
+    def is_array(self):
+        """Returns True if the document is a MessagePack array."""
+        while self._first_byte is None and not self._eof:
+            self._fill()
+        return (self._first_byte is not None and
+                (0x90 <= self._first_byte <= 0x9f or
+                 self._first_byte in (0xdc, 0xdd)))
+
+    def read_value(self):
+        """Decodes the whole document as a single value."""
+        value = self._call(self._unpacker.unpack)
+        self._expect_end()
+        return value
+
+    def __iter__(self):
+        """Yields the elements of the top-level array one at a time."""
+        if not self.is_array():
+            raise ValueError('Expecting MessagePack array')
+        length = self._call(self._unpacker.read_array_header)
+        for _ in xrange(length):
+            yield self._call(self._unpacker.unpack)
+        self._expect_end()
@@ -42,3 +42,7 @@ class AlarmsRepository(object):
     @abc.abstractmethod
     def get_alarms(self, tenant_id, query_parms, offset):
         pass
+
+    @abc.abstractmethod
+    def get_all_alarms(self):
+        pass
@@ -0,0 +1,358 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import threading
+import time
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from monasca.common import instrumentation
+from monasca.common import kafka_conn
+from monasca.common.repositories import alarms_repository
+from monasca.common.repositories import constants
+from monasca.common.repositories import exceptions
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+# the columns of an alarm that are the same in all of its rows.
+_ALARM_COLUMNS = ('alarm_id', 'state', 'tenant_id', 'alarm_definition_id',
+                  'alarm_definition_name', 'severity')
+
+
+def _parse_dimensions(metric_dimensions):
+    dimensions = {}
+    if metric_dimensions:
+        for dimension in metric_dimensions.split(','):
+            name, _, value = dimension.partition('=')
+            dimensions[name] = value
+    return dimensions
+
+
+class _AlarmTable(object):
+    """The alarms of every tenant, as rows of the alarms query."""
+
+    def __init__(self, rows=()):
+        self.alarms = {}
+        self.by_tenant = {}
+        for row in rows:
+            self.add_row(row)
+
+    def add_row(self, row):
+        alarm = self.alarms.get(row['alarm_id'])
+        if alarm is None:
+            alarm = dict((column, row[column]) for column in _ALARM_COLUMNS)
+            alarm['metrics'] = []
+            self.alarms[row['alarm_id']] = alarm
+            self.by_tenant.setdefault(row['tenant_id'],
+                                      set()).add(row['alarm_id'])
+        alarm['metrics'].append(
+            (row['metric_name'], row['metric_dimensions'],
+             _parse_dimensions(row['metric_dimensions'])))
+
+    def put(self, rows):
+        if rows:
+            self.remove(rows[0]['alarm_id'])
+        for row in rows:
+            self.add_row(row)
+
+    def remove(self, alarm_id):
+        alarm = self.alarms.pop(alarm_id, None)
+        if alarm is not None:
+            self.by_tenant.get(alarm['tenant_id'], set()).discard(alarm_id)
+
+    def rows(self, alarm):
+        rows = []
+        for name, metric_dimensions, _dimensions in alarm['metrics']:
+            row = dict((column, alarm[column]) for column in _ALARM_COLUMNS)
+            row['metric_name'] = name
+            row['metric_dimensions'] = metric_dimensions
+            rows.append(row)
+        return rows
+
+
+def _matches(alarm, query_parms):
+    if ('alarm_definition_id' in query_parms and
+            alarm['alarm_definition_id'] !=
+            query_parms['alarm_definition_id']):
+        return False
+    if 'state' in query_parms and alarm['state'] != query_parms['state']:
+        return False
+    if ('metric_name' in query_parms and
+            not any(name == query_parms['metric_name']
+                    for name, _, _ in alarm['metrics'])):
+        return False
+    if 'metric_dimensions' in query_parms:
+        wanted = [dimension.split(':') for dimension in
+                  query_parms['metric_dimensions'].split(',')]
+        # like the SQL query, one metric must have all of the dimensions.
+        if not any(all(dimensions.get(name) == value
+                       for name, value in wanted)
+                   for _, _, dimensions in alarm['metrics']):
+            return False
+    return True
+
+
+class CachedAlarmsRepository(alarms_repository.AlarmsRepository):
+    """Serves alarm lists and shows from an in-memory copy of all alarms.
+
+    The copy is loaded from the wrapped repository and kept current with
+    the events and alarm state transitions published to Kafka, by the API
+    and by the threshold engine. It is loaded again every refresh_interval
+    seconds, which bounds how stale a missed event can leave it.
+
+    Consumers start at the latest offsets before the copy is loaded, and
+    events received while it loads are applied again on top of it, so no
+    event falls between the load and the consumers. Until both consumers
+    are connected and the copy is loaded, and for every other method,
+    requests go to the wrapped repository.
+
+    The copy is per process and is built on first use, so every worker of a
+    server keeps its own.
+    """
+
+    def __init__(self, delegate, topics, refresh_interval,
+                 retry_interval=1.0):
+        """Initializes the repository.
+
+        :param delegate: The AlarmsRepository holding the alarms.
+        :param topics: The topics of the alarm events and alarm state
+        transitions.
+        :param refresh_interval: The number of seconds between loads of the
+        alarms from the wrapped repository.
+        :param retry_interval: The number of seconds to wait after Kafka or
+        the wrapped repository failed.
+        """
+        super(CachedAlarmsRepository, self).__init__()
+        self._delegate = delegate
+        self._topics = topics
+        self._refresh_interval = refresh_interval
+        self._retry_interval = retry_interval
+
+        self._lock = threading.RLock()
+        self._pid = None
+        self._connections = {}
+        self._table = None
+        # events received while the alarms are loaded, None otherwise.
+        self._replay = None
+
+        self._hits = instrumentation.counter('alarm_cache.hits')
+        self._misses = instrumentation.counter('alarm_cache.misses')
+        self._alarms_gauge = instrumentation.gauge('alarm_cache.alarms')
+        self._events = instrumentation.counter('alarm_cache.events')
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # the threads and the copy of a parent process are not usable.
+            self._pid = os.getpid()
+            self._table = None
+            self._connections = dict(
+                (topic, kafka_conn.KafkaConnection(topic, from_latest=True))
+                for topic in self._topics)
+        connected = []
+        for topic, connection in self._connections.iteritems():
+            ready = threading.Event()
+            connected.append(ready)
+            thread = threading.Thread(target=self._consume,
+                                      args=(connection, ready),
+                                      name='alarm-cache-' + topic)
+            thread.daemon = True
+            thread.start()
+        thread = threading.Thread(target=self._refresh_periodically,
+                                  args=(connected,), name='alarm-cache')
+        thread.daemon = True
+        thread.start()
+
+    def _consume(self, connection, ready):
+        while True:
+            if connection.connect_consumer():
+                ready.set()
+                for message in connection.get_messages():
+                    if message is None:
+                        break
+                    self._handle_message(message.message.value)
+            time.sleep(self._retry_interval)
+
+    def _refresh_periodically(self, connected):
+        for ready in connected:
+            ready.wait()
+        while True:
+            try:
+                self._refresh()
+                time.sleep(self._refresh_interval)
+            except Exception as ex:
+                LOG.warning('Could not load the alarm cache: %s' % ex)
+                time.sleep(self._retry_interval)
+
+    def _refresh(self):
+        with self._lock:
+            self._replay = []
+        try:
+            rows = self._delegate.get_all_alarms()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        table = _AlarmTable(rows)
+        with self._lock:
+            replay, self._replay = self._replay, None
+            for event_type, event in replay:
+                self._apply(table, event_type, event)
+            self._table = table
+            self._alarms_gauge.set(len(table.alarms))
+        LOG.debug('Loaded %d alarms in the alarm cache.' % len(table.alarms))
+
+    def _handle_message(self, value):
+        try:
+            message = json.loads(value)
+            event_type, event = message.items()[0]
+        except Exception:
+            LOG.warning('Ignoring a malformed alarm event: %s' % value)
+            return
+        if not isinstance(event, dict):
+            return
+        self._events.inc()
+
+        alarm_id = event.get('alarmId')
+        tenant_id = event.get('tenantId', event.get('tenant_id'))
+        if (event_type in ('alarm-created', 'alarm-transitioned') and
+                alarm_id and tenant_id and self._table is not None and
+                alarm_id not in self._table.alarms):
+            # events do not carry the metrics of the alarm.
+            try:
+                event = dict(event, rows=self._delegate.get_alarm(tenant_id,
+                                                                  alarm_id))
+            except exceptions.DoesNotExistException:
+                return
+            except Exception as ex:
+                LOG.warning('Could not load alarm %s: %s' % (alarm_id, ex))
+                return
+
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((event_type, event))
+            if self._table is not None:
+                self._apply(self._table, event_type, event)
+                self._alarms_gauge.set(len(self._table.alarms))
+
+    def _apply(self, table, event_type, event):
+        if 'rows' in event:
+            table.put(event['rows'])
+        alarm = table.alarms.get(event.get('alarmId'))
+        definition_id = event.get('alarmDefinitionId')
+
+        if event_type == 'alarm-transitioned' and alarm is not None:
+            alarm['state'] = event['newState']
+        elif (event_type == 'alarm-updated' and alarm is not None and
+                'alarmState' in event):
+            alarm['state'] = event['alarmState']
+        elif event_type == 'alarm-deleted' and alarm is not None:
+            table.remove(alarm['alarm_id'])
+        elif event_type == 'alarm-definition-updated':
+            for alarm in table.alarms.itervalues():
+                if alarm['alarm_definition_id'] == definition_id:
+                    alarm['alarm_definition_name'] = event['alarmName']
+                    alarm['severity'] = event['severity']
+        elif event_type == 'alarm-definition-deleted':
+            for alarm_id, alarm in table.alarms.items():
+                if alarm['alarm_definition_id'] == definition_id:
+                    table.remove(alarm_id)
+
+    def _get_table(self):
+        self._start()
+        table = self._table
+        if table is None:
+            self._misses.inc()
+        else:
+            self._hits.inc()
+        return table
+
+    def watermark(self):
+        """Returns the positions of the consumers the cache is current to.
+
+        :return: A string of topic:partition:offset, separated by commas, or
+        None while requests go to the wrapped repository.
+        """
+        if self._table is None or self._pid != os.getpid():
+            return None
+        positions = []
+        for topic, connection in sorted(self._connections.iteritems()):
+            for partition, offset in sorted(
+                    connection.positions().iteritems()):
+                positions.append('%s:%s:%s' % (topic, partition, offset))
+        return ','.join(positions)
+
+    def get_alarm(self, tenant_id, id):
+        table = self._get_table()
+        if table is None:
+            return self._delegate.get_alarm(tenant_id, id)
+        with self._lock:
+            alarm = table.alarms.get(id)
+            if alarm is not None and alarm['tenant_id'] == tenant_id:
+                return table.rows(alarm)
+        # the event of an alarm that was just created may not have arrived.
+        return self._delegate.get_alarm(tenant_id, id)
+
+    def get_alarms(self, tenant_id, query_parms, offset):
+        table = self._get_table()
+        if table is None:
+            return self._delegate.get_alarms(tenant_id, query_parms, offset)
+        with self._lock:
+            alarm_ids = sorted(table.by_tenant.get(tenant_id, ()))
+            rows = []
+            count = 0
+            for alarm_id in alarm_ids:
+                if offset is not None and alarm_id <= offset:
+                    continue
+                alarm = table.alarms[alarm_id]
+                if not _matches(alarm, query_parms):
+                    continue
+                rows.extend(table.rows(alarm))
+                count += 1
+                if offset is not None and count >= constants.PAGE_LIMIT:
+                    break
+            return rows
+
+    def get_all_alarms(self):
+        return self._delegate.get_all_alarms()
+
+    def get_alarm_metrics(self, alarm_id):
+        return self._delegate.get_alarm_metrics(alarm_id)
+
+    def get_sub_alarms(self, tenant_id, alarm_id):
+        return self._delegate.get_sub_alarms(tenant_id, alarm_id)
+
+    def get_alarm_definition(self, tenant_id, alarm_id):
+        return self._delegate.get_alarm_definition(tenant_id, alarm_id)
+
+    def update_alarm(self, tenant_id, id, state):
+        prev_state = self._delegate.update_alarm(tenant_id, id, state)
+        # the change is seen by the next request, before its event arrives.
+        with self._lock:
+            if self._table is not None and id in self._table.alarms:
+                self._table.alarms[id]['state'] = state
+        return prev_state
+
+    def delete_alarm(self, tenant_id, id):
+        self._delegate.delete_alarm(tenant_id, id)
+        with self._lock:
+            if self._table is not None:
+                self._table.remove(id)
@@ -13,6 +13,7 @@
 # under the License.
 
 from monasca.common.repositories import metrics_repository
+from monasca.common import timestamps
 from monasca.openstack.common import log
 
 LOG = log.getLogger(__name__)
@@ -23,5 +24,20 @@ class MetricsRepository(metrics_repository.MetricsRepository):
     def __init__(self):
         return
 
-    def list_metrics(self, tenant_id, name, dimensions):
-        return {}
\ No newline at end of file
+    def list_metrics(self, tenant_id, region, name, dimensions, offset):
+        return {}
+
+    def measurement_list(self, tenant_id, region, name, dimensions,
+                         start_timestamp, end_timestamp, offset,
+                         time_format=timestamps.ISO_8601):
+        return []
+
+    def metrics_statistics(self, tenant_id, region, name, dimensions,
+                           start_timestamp, end_timestamp, statistics, period,
+                           time_format=timestamps.ISO_8601):
+        return []
+
+    def alarm_history(self, tenant_id, alarm_id_list,
+                      offset, start_timestamp, end_timestamp,
+                      time_format=timestamps.ISO_8601):
+        return []
@@ -12,16 +12,21 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import bisect
+import itertools
 import json
-import re
-import time
 import urllib
 
 from influxdb import client
 from oslo.config import cfg
+import requests
 
+from monasca.common import json_stream
+from monasca.common import timestamps
 from monasca.common.repositories import constants
 from monasca.common.repositories import exceptions
+from monasca.common.repositories.influxdb import serie_names
+from monasca.common.repositories.influxdb import series_catalogue
 from monasca.common.repositories import metrics_repository
 from monasca.openstack.common import log
 
@@ -38,16 +43,21 @@ class MetricsRepository(metrics_repository.MetricsRepository):
             self.influxdb_client = client.InfluxDBClient(
                 self.conf.influxdb.ip_address, self.conf.influxdb.port,
                 self.conf.influxdb.user, self.conf.influxdb.password,
-                self.conf.influxdb.database_name)
-
-            # compile regex only once for efficiency
-            self._serie_name_reqex = re.compile(
-                '([^?&=]+)\?([^?&=]+)&([^?&=]+)(&[^?&=]+=[^?&=]+)*')
-            self._serie_tenant_id_region_name_regex = re.compile(
-                '[^?&=]+\?[^?&=]+&[^?&=]+')
-            self._serie_name_dimension_regex = re.compile('&[^?&=]+=[^?&=]+')
-            self._serie_name_dimension_parts_regex = re.compile(
-                '&([^?&=]+)=([^?&=]+)')
+                self.conf.influxdb.database_name,
+                timeout=self.conf.influxdb.timeout)
+
+            self._serie_names = serie_names.DecodeCache(
+                self.conf.influxdb.serie_name_cache_size)
+
+            self._series_catalogue = None
+            if self.conf.series_catalogue.enabled:
+                self._series_catalogue = series_catalogue.SeriesCatalogue(
+                    # the catalogue keeps the metrics itself.
+                    self._list_series, self._list_recent_series,
+                    serie_names.decode,
+                    self.conf.series_catalogue.ttl,
+                    self.conf.series_catalogue.refresh_interval,
+                    self.conf.series_catalogue.max_bytes)
 
         except Exception as ex:
             LOG.exception()
@@ -137,10 +147,39 @@ class MetricsRepository(metrics_repository.MetricsRepository):
 
         return from_clause
 
+    def _list_series(self, tenant_id, region):
+
+        query = self._build_list_series_query(None, None, tenant_id, region)
+
+        result = self.influxdb_client.query(query, 's')
+
+        # the from clause also matches the regions region is a prefix of.
+        prefix = serie_names.prefix(tenant_id, region)
+        return [serie_name for _, serie_name in result[0]['points']
+                if serie_name.startswith(prefix)]
+
+    def _list_recent_series(self, tenant_id, region, start_timestamp):
+
+        # one point of every series written to since start_timestamp.
+        query = ('select value ' +
+                 self._build_from_clause(None, None, tenant_id, region,
+                                         start_timestamp) +
+                 ' limit 1')
+
+        result = self.influxdb_client.query(query, 's')
+
+        prefix = serie_names.prefix(tenant_id, region)
+        return [serie['name'] for serie in result
+                if serie['name'].startswith(prefix)]
+
     def list_metrics(self, tenant_id, region, name, dimensions, offset):
 
         try:
 
+            if self._series_catalogue is not None:
+                return self._series_catalogue.list_metrics(
+                    tenant_id, region, name, dimensions, offset)
+
             query = self._build_list_series_query(dimensions, name, tenant_id,
                                                   region)
 
@@ -181,12 +220,16 @@ class MetricsRepository(metrics_repository.MetricsRepository):
         """
 
         json_metric_list = []
-        serie_names_list_list = series_names[0]['points']
-        for serie_name_list in serie_names_list_list:
-            serie_name = serie_name_list[1]
-            if offset is not None:
-                if serie_name < urllib.unquote(offset):
-                    continue
+        serie_name_list = [serie_name for _, serie_name in
+                           series_names[0]['points']]
+        if offset is not None:
+            # seek to the offset in the sorted names, only the names of the
+            # page are decoded.
+            serie_name_list.sort()
+            start = bisect.bisect_left(serie_name_list,
+                                       urllib.unquote(offset))
+            serie_name_list = itertools.islice(serie_name_list, start, None)
+        for serie_name in serie_name_list:
             metric = self._decode_influxdb_serie_name(serie_name)
             if metric is None:
                 continue
@@ -209,51 +252,19 @@ class MetricsRepository(metrics_repository.MetricsRepository):
         urlencode(tenant)?urlencode(region)&urlencode(name)[&urlencode(
         dim_name)=urlencode(dim_value)]...
 
+        The metrics of recently decoded names are remembered, and must not
+        be modified.
 
         :param serie_name:
         :return:
         """
 
-        match = self._serie_name_reqex.match(serie_name)
-        if match:
-
-            # throw tenant_id (match.group(1) and region (match.group(2) away
-
-            metric_name = (
-                urllib.unquote_plus(match.group(3).encode(
-                    'utf8')).decode('utf8'))
-
-            metric = {u'name': metric_name,
-                      u'id': urllib.quote(serie_name)}
-
-            # only returns the last match. we need all dimensions.
-            dimensions = match.group(4)
-            if dimensions:
-                # remove the name, tenant_id, and region; just
-                # dimensions remain
-                dimensions_part = self._serie_tenant_id_region_name_regex.sub(
-                    '', serie_name)
-                dimensions = {}
-                dimension_list = self._serie_name_dimension_regex.findall(
-                    dimensions_part)
-                for dimension in dimension_list:
-                    match = self._serie_name_dimension_parts_regex.match(
-                        dimension)
-                    dimension_name = urllib.unquote(
-                        match.group(1).encode('utf8')).decode('utf8')
-                    dimension_value = urllib.unquote(
-                        match.group(2).encode('utf8')).decode('utf8')
-                    dimensions[dimension_name] = dimension_value
-
-                metric["dimensions"] = dimensions
-        else:
-            metric = None
-
-        return metric
+        return self._serie_names.decode(serie_name)
 
     def measurement_list(self, tenant_id, region, name, dimensions,
                          start_timestamp,
-                         end_timestamp, offset):
+                         end_timestamp, offset,
+                         time_format=timestamps.ISO_8601):
         """Example result from InfluxDB.
 
         [
@@ -326,26 +337,8 @@ class MetricsRepository(metrics_repository.MetricsRepository):
                 if metric is None:
                     continue
 
-                # Replace 'sequence_number' -> 'id' for column name
-                columns = [column.replace('sequence_number', 'id') for column
-                           in serie['columns']]
-                # Replace 'time' -> 'timestamp' for column name
-                columns = [column.replace('time', 'timestamp') for column in
-                           columns]
-
-                # format the utc date in the points
-                fmtd_pts = [[time.strftime("%Y-%m-%dT%H:%M:%SZ",
-                                           time.gmtime(point[0])), point[1],
-                             point[2]] for point in serie['points']]
-
-                # Set the last point's time as the id. Used for next link.
-                measurement = {u"name": metric['name'],
-                               u"id": serie['points'][-1][0],
-                               u"dimensions": metric['dimensions'],
-                               u"columns": columns,
-                               u"measurements": fmtd_pts}
-
-                json_measurement_list.append(measurement)
+                json_measurement_list.append(
+                    self._format_measurement(serie, metric, time_format))
 
             return json_measurement_list
 
@@ -355,7 +348,8 @@ class MetricsRepository(metrics_repository.MetricsRepository):
 
     def metrics_statistics(self, tenant_id, region, name, dimensions,
                            start_timestamp,
-                           end_timestamp, statistics, period):
+                           end_timestamp, statistics, period,
+                           time_format=timestamps.ISO_8601):
 
         json_statistics_list = []
 
@@ -383,26 +377,128 @@ class MetricsRepository(metrics_repository.MetricsRepository):
                 if metric is None:
                     continue
 
-                # Replace 'avg' -> 'mean' for column name
-                columns = [column.replace('mean', 'avg') for column in
-                           serie['columns']]
-                # Replace 'time' -> 'timestamp' for column name
-                columns = [column.replace('time', 'timestamp') for column in
-                           columns]
+                json_statistics_list.append(
+                    self._format_statistics(serie, metric, time_format))
+
+            return json_statistics_list
+
+        except Exception as ex:
+            LOG.exception(ex)
+            raise exceptions.RepositoryException(ex)
 
-                fmtd_pts_list_list = [[time.strftime("%Y-%m-%dT%H:%M:%SZ",
-                                                     time.gmtime(pts_list[
-                                                         0]))] + pts_list[1:]
-                                      for pts_list in serie['points']]
+    def _format_measurement(self, serie, metric, time_format):
 
-                measurement = {"name": metric['name'],
-                               "dimensions": metric['dimensions'],
-                               "columns": columns,
-                               "measurements": fmtd_pts_list_list}
+        # Replace 'sequence_number' -> 'id' for column name
+        columns = [column.replace('sequence_number', 'id') for column
+                   in serie['columns']]
+        # Replace 'time' -> 'timestamp' for column name
+        columns = [column.replace('time', 'timestamp') for column in
+                   columns]
 
-                json_statistics_list.append(measurement)
+        # Set the last point's time as the id. Used for next link.
+        last_timestamp = serie['points'][-1][0]
 
-            return json_statistics_list
+        # format the utc date in the points
+        fmtd_pts = timestamps.format_points(serie['points'], time_format)
+
+        return {u"name": metric['name'],
+                u"id": last_timestamp,
+                u"dimensions": metric.get('dimensions', {}),
+                u"columns": columns,
+                u"measurements": fmtd_pts}
+
+    def _format_statistics(self, serie, metric, time_format):
+
+        # Replace 'avg' -> 'mean' for column name
+        columns = [column.replace('mean', 'avg') for column in
+                   serie['columns']]
+        # Replace 'time' -> 'timestamp' for column name
+        columns = [column.replace('time', 'timestamp') for column in
+                   columns]
+
+        fmtd_pts_list_list = timestamps.format_points(serie['points'],
+                                                      time_format)
+
+        return {"name": metric['name'],
+                "dimensions": metric.get('dimensions', {}),
+                "columns": columns,
+                "measurements": fmtd_pts_list_list}
+
+    def _query_stream(self, query):
+        """Runs a query with a chunked result, read as it is iterated.
+
+        :return: The HTTP response, or None if no serie matched.
+        """
+
+        url = 'http://{}:{}/db/{}/series'.format(
+            self.conf.influxdb.ip_address, self.conf.influxdb.port,
+            self.conf.influxdb.database_name)
+        params = {'q': query, 'time_precision': 's', 'chunked': 'true',
+                  'u': self.conf.influxdb.user,
+                  'p': self.conf.influxdb.password}
+
+        # the timeout bounds every read, so a stalled InfluxDB does not hold
+        # the worker while the response is streamed.
+        response = requests.get(url, params=params, stream=True,
+                                timeout=self.conf.influxdb.timeout)
+        if response.status_code != 200:
+            # check for non-existent serie name.
+            if (response.status_code == 400 and
+                    response.content == "Couldn't look up columns"):
+                return None
+            raise client.InfluxDBClientError(response.content,
+                                             response.status_code)
+        response.raw.decode_content = True
+        return response
+
+    def _iter_series(self, response, format_serie, time_format):
+
+        # every part of a serie is a JSON object of its own.
+        try:
+            for serie in json_stream.JSONStream(response.raw).iter_values():
+                if not serie['points']:
+                    continue
+                metric = self._decode_influxdb_serie_name(serie['name'])
+                if metric is None:
+                    continue
+                yield format_serie(serie, metric, time_format)
+        finally:
+            response.close()
+
+    def measurement_stream(self, tenant_id, region, name, dimensions,
+                           start_timestamp, end_timestamp,
+                           time_format=timestamps.ISO_8601):
+
+        try:
+            query = self._build_select_query(dimensions, name, tenant_id,
+                                             region, start_timestamp,
+                                             end_timestamp, None)
+
+            response = self._query_stream(query)
+            if response is None:
+                return iter(())
+            return self._iter_series(response, self._format_measurement,
+                                     time_format)
+
+        except Exception as ex:
+            LOG.exception(ex)
+            raise exceptions.RepositoryException(ex)
+
+    def metrics_statistics_stream(self, tenant_id, region, name, dimensions,
+                                  start_timestamp, end_timestamp, statistics,
+                                  period, time_format=timestamps.ISO_8601):
+
+        try:
+            query = self._build_statistics_query(dimensions, name, tenant_id,
+                                                 region, start_timestamp,
+                                                 end_timestamp, statistics,
+                                                 period)
+
+            response = self._query_stream(query)
+            if response is None:
+                return iter(())
+            return self._iter_series(response, self._format_statistics,
+                                     time_format)
 
         except Exception as ex:
             LOG.exception(ex)
@@ -431,7 +527,7 @@ class MetricsRepository(metrics_repository.MetricsRepository):
 
     def alarm_history(self, tenant_id, alarm_id_list,
                       offset, start_timestamp=None,
-                      end_timestamp=None):
+                      end_timestamp=None, time_format=timestamps.ISO_8601):
         """Example result from Influxdb.
 
         [
@@ -531,14 +627,15 @@ class MetricsRepository(metrics_repository.MetricsRepository):
                 return json_alarm_history_list
 
             # There's only one serie, alarm_state_history.
-            for point in result[0]['points']:
+            points = result[0]['points']
+            formatted_timestamps = timestamps.format_timestamps(
+                [point[0] for point in points], time_format)
+            for point, timestamp in zip(points, formatted_timestamps):
                 alarm_point = {u'alarm_id': point[2],
                                u'metrics': json.loads(point[3]),
                                u'old_state': point[4], u'new_state': point[5],
                                u'reason': point[6], u'reason_data': point[7],
-                               u'timestamp': time.strftime(
-                                   "%Y-%m-%dT%H:%M:%SZ",
-                                   time.gmtime(point[0])),
+                               u'timestamp': timestamp,
                                u'id': point[0]}
 
                 json_alarm_history_list.append(alarm_point)
@@ -0,0 +1,190 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Decoding of the InfluxDB serie names of metrics.
+
+A serie name is formed by url encoding the tenant id, region, name, and
+dimensions, and concatenating them into a quasi URL query string::
+
+    urlencode(tenant)?urlencode(region)&urlencode(name)[&urlencode(
+    dim_name)=urlencode(dim_value)]...
+"""
+
+import re
+import urllib
+
+from monasca.common import instrumentation
+
+
+_SERIE_NAME = re.compile('([^?&=]+)\?([^?&=]+)&([^?&=]+)(&[^?&=]+=[^?&=]+)*')
+_TENANT_ID_REGION_NAME = re.compile('[^?&=]+\?[^?&=]+&[^?&=]+')
+_DIMENSION = re.compile('&[^?&=]+=[^?&=]+')
+_DIMENSION_PARTS = re.compile('&([^?&=]+)=([^?&=]+)')
+# the names whose only characters urllib.quote changes are the separators
+# and the escapes of their url encoded parts.
+_QUOTE_BY_REPLACING = re.compile('[A-Za-z0-9_.\-/%?&=]*\Z')
+
+
+def decode_with_regexes(serie_name):
+    """Decodes a serie name with regular expressions.
+
+    This is the original decoder. It also accepts names that only start
+    with a metric, and is used for those.
+
+    :return: The metric, or None if the name is not one.
+    """
+    match = _SERIE_NAME.match(serie_name)
+    if not match:
+        return None
+
+    # throw tenant_id (match.group(1) and region (match.group(2) away
+    metric_name = (
+        urllib.unquote_plus(match.group(3).encode('utf8')).decode('utf8'))
+
+    metric = {u'name': metric_name,
+              u'id': urllib.quote(serie_name)}
+
+    # only returns the last match. we need all dimensions.
+    if match.group(4):
+        # remove the name, tenant_id, and region; just dimensions remain
+        dimensions_part = _TENANT_ID_REGION_NAME.sub('', serie_name)
+        dimensions = {}
+        for dimension in _DIMENSION.findall(dimensions_part):
+            match = _DIMENSION_PARTS.match(dimension)
+            dimension_name = urllib.unquote(
+                match.group(1).encode('utf8')).decode('utf8')
+            dimension_value = urllib.unquote(
+                match.group(2).encode('utf8')).decode('utf8')
+            dimensions[dimension_name] = dimension_value
+
+        metric['dimensions'] = dimensions
+
+    return metric
+
+
+def quote(part):
+    """Url encodes a tenant id, region, name or dimension of a serie name."""
+    return urllib.quote(part.encode('utf8'), safe='')
+
+
+def prefix(tenant_id, region, name=None):
+    """Returns the start of the serie names of a tenant and region.
+
+    :param name: The name of the metrics, or None for all of them. Without
+    a name the prefix ends with the & before the name.
+    """
+    serie_prefix = quote(tenant_id) + '?' + quote(region) + '&'
+    if name:
+        serie_prefix += quote(name)
+    return serie_prefix
+
+
+def _quote(serie_name):
+    if not _QUOTE_BY_REPLACING.match(serie_name):
+        return urllib.quote(serie_name)
+    return str(serie_name.replace('%', '%25').replace('?', '%3F').
+               replace('&', '%26').replace('=', '%3D'))
+
+
+def _unquote(part):
+    if '%' not in part:
+        return unicode(part)
+    return urllib.unquote(part.encode('utf8')).decode('utf8')
+
+
+def decode(serie_name):
+    """Decodes a serie name in one pass over its parts.
+
+    Names that are not exactly a tenant, region, name and dimensions are
+    decoded by decode_with_regexes, so the result is always the same as
+    theirs.
+
+    :return: The metric, or None if the name is not one.
+    """
+    parts = serie_name.split('&')
+    tenant_id, _, region = parts[0].partition('?')
+    name = parts[1] if len(parts) > 1 else ''
+    if (not tenant_id or not region or not name or '=' in parts[0] or
+            '?' in region or '?' in name or '=' in name):
+        return decode_with_regexes(serie_name)
+
+    if '%' in name or '+' in name:
+        metric_name = urllib.unquote_plus(name.encode('utf8')).decode('utf8')
+    else:
+        metric_name = unicode(name)
+    metric = {u'name': metric_name,
+              u'id': _quote(serie_name)}
+
+    if len(parts) > 2:
+        dimensions = {}
+        for dimension in parts[2:]:
+            dimension_name, equals, dimension_value = dimension.partition('=')
+            if (not dimension_name or not dimension_value or not equals or
+                    '=' in dimension_value or '?' in dimension):
+                return decode_with_regexes(serie_name)
+            dimensions[_unquote(dimension_name)] = _unquote(dimension_value)
+        metric['dimensions'] = dimensions
+
+    return metric
+
+
+class DecodeCache(object):
+    """Decodes serie names, remembering the metrics of recent ones.
+
+    The same series are listed, queried and aggregated over and over, so
+    their metrics are kept in two generations of at most capacity / 2
+    names each. Names are looked up in the current generation, then in the
+    previous one, which moves them to the current one. When the current
+    generation is full it becomes the previous one, dropping the names not
+    used since. This approximates least recently used eviction with two
+    dict lookups, which is cheaper than keeping the exact order.
+
+    The metrics are shared by every caller and must not be modified.
+    """
+
+    def __init__(self, capacity, decoder=decode):
+        """Initializes the cache.
+
+        :param capacity: The most serie names remembered, or 0 to remember
+        none.
+        :param decoder: The function decoding the names not remembered.
+        """
+        self._generation_size = capacity // 2
+        self._decoder = decoder
+        self._current = {}
+        self._previous = {}
+
+        # hits are not counted, a lock for every one would cost more than
+        # the lookup.
+        self._misses = instrumentation.counter('serie_names.misses')
+
+    def decode(self, serie_name):
+        metric = self._current.get(serie_name)
+        if metric is not None:
+            return metric
+        if not self._generation_size:
+            return self._decoder(serie_name)
+
+        metric = self._previous.get(serie_name)
+        if metric is None:
+            self._misses.inc()
+            metric = self._decoder(serie_name)
+            if metric is None:
+                return None
+
+        if len(self._current) >= self._generation_size:
+            self._previous = self._current
+            self._current = {}
+        self._current[serie_name] = metric
+        return metric
@@ -0,0 +1,268 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import bisect
+import collections
+import threading
+import time
+import urllib
+
+from monasca.common import instrumentation
+from monasca.common.repositories import constants
+from monasca.common.repositories.influxdb import serie_names
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+# an estimate of the bytes taken by the decoded metric of a series, on top
+# of the length of its name.
+SERIES_OVERHEAD = 400
+
+
+class _Entry(object):
+    """The series of one tenant and region, sorted by name."""
+
+    def __init__(self, now):
+        self.names = []
+        self.metrics = {}
+        self.size = 0
+        self.loaded_at = now
+        self.refreshed_at = now
+        self.refreshing = False
+
+    def add(self, name, metric):
+        if name in self.metrics:
+            return
+        bisect.insort(self.names, name)
+        self.metrics[name] = metric
+        self.size += len(name) + SERIES_OVERHEAD
+
+
+class _Load(object):
+    """A load of the series of a tenant and region in progress."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+
+
+def _matches(metric, dimensions):
+    if dimensions:
+        metric_dimensions = metric.get('dimensions', {})
+        for dimension_name, dimension_value in dimensions.iteritems():
+            if metric_dimensions.get(dimension_name) != dimension_value:
+                return False
+    return True
+
+
+class SeriesCatalogue(object):
+    """Answers metric listings from the series names of every tenant.
+
+    The series of a tenant and region are loaded on the first listing and
+    decoded once. Every refresh_interval seconds the series that received
+    measurements since the last refresh are added, which finds new series
+    without listing all of them, and every ttl seconds all of them are
+    loaded again, which drops deleted series.
+
+    Only one thread loads or refreshes the series of a tenant and region at
+    a time. Concurrent listings wait for the first load, but are answered
+    from the current series while they are refreshed or loaded again.
+
+    The catalogues of the tenants used least recently are evicted once the
+    estimated size of all of them exceeds max_bytes. A tenant larger than
+    that on its own is not kept.
+    """
+
+    def __init__(self, list_series, list_recent_series, decode, ttl,
+                 refresh_interval, max_bytes):
+        """Initializes the catalogue.
+
+        :param list_series: A function of tenant ID and region that returns
+        the names of all of their series.
+        :param list_recent_series: A function of tenant ID, region and a
+        timestamp in seconds that returns the names of their series with
+        measurements after it.
+        :param decode: A function that returns the metric of a series name,
+        or None if the name is not a metric.
+        :param ttl: The number of seconds after which all of the series of a
+        tenant are loaded again.
+        :param refresh_interval: The number of seconds after which new series
+        of a tenant are looked for.
+        :param max_bytes: The estimated size all of the catalogues are kept
+        under.
+        """
+        self._list_series = list_series
+        self._list_recent_series = list_recent_series
+        self._decode = decode
+        self._ttl = ttl
+        self._refresh_interval = refresh_interval
+        self._max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        # the loads in progress by tenant and region.
+        self._loads = {}
+
+        self._hits = instrumentation.counter('series_catalogue.hits')
+        self._misses = instrumentation.counter('series_catalogue.misses')
+        self._refreshes = instrumentation.counter(
+            'series_catalogue.refreshes')
+        self._evictions = instrumentation.counter(
+            'series_catalogue.evictions')
+        self._bytes = instrumentation.gauge('series_catalogue.bytes')
+        self._tenants = instrumentation.gauge('series_catalogue.tenants')
+
+    def _load(self, key):
+        entry = _Entry(time.time())
+        for name in self._list_series(*key):
+            metric = self._decode(name)
+            if metric is not None:
+                entry.add(name, metric)
+        return entry
+
+    def _refresh(self, key, entry):
+        now = time.time()
+        # measurements reach the database a while after they were taken.
+        since = int(entry.refreshed_at) - self._refresh_interval
+        tenant_id, region = key
+        try:
+            names = [name for name in
+                     self._list_recent_series(tenant_id, region, since)
+                     if name not in entry.metrics]
+            metrics = [(name, self._decode(name)) for name in names]
+        except Exception:
+            with self._lock:
+                entry.refreshing = False
+            raise
+        with self._lock:
+            size = entry.size
+            for name, metric in metrics:
+                if metric is not None:
+                    entry.add(name, metric)
+            entry.refreshed_at = now
+            entry.refreshing = False
+            if self._entries.get(key) is entry:
+                self._size += entry.size - size
+        self._refreshes.inc()
+
+    def _reload(self, key, load):
+        try:
+            load.entry = self._load(key)
+            self._store(key, load.entry)
+        finally:
+            with self._lock:
+                del self._loads[key]
+            load.done.set()
+        return load.entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            if entry.size > self._max_bytes:
+                LOG.info('Not caching the %d series of tenant %s, they are '
+                         'larger than the catalogue.' %
+                         (len(entry.names), key[0]))
+            else:
+                self._entries[key] = entry
+                self._size += entry.size
+            while self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self._evictions.inc()
+            self._bytes.set(self._size)
+            self._tenants.set(len(self._entries))
+
+    def _get(self, tenant_id, region):
+        key = (tenant_id, region)
+        while True:
+            now = time.time()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    # most recently used last.
+                    self._entries[key] = self._entries.pop(key)
+                load = self._loads.get(key)
+                expired = entry is None or now - entry.loaded_at >= self._ttl
+                if expired and load is None:
+                    load = self._loads[key] = _Load()
+                    leader = True
+                else:
+                    leader = False
+                refresh = (not expired and not entry.refreshing and
+                           now - entry.refreshed_at >= self._refresh_interval)
+                if refresh:
+                    entry.refreshing = True
+
+            if leader:
+                self._misses.inc()
+                return self._reload(key, load)
+            if entry is not None:
+                # expired series are listed until they are loaded again.
+                self._hits.inc()
+                if refresh:
+                    self._refresh(key, entry)
+                return entry
+            # another thread makes the first load, or failed and the next
+            # one to get here tries again.
+            load.done.wait()
+            if load.entry is not None:
+                self._hits.inc()
+                return load.entry
+
+    def list_metrics(self, tenant_id, region, name, dimensions, offset):
+        """Returns the metrics of a tenant and region, sorted by series.
+
+        The series of a name are next to each other in the sorted names, and
+        the page starts at the offset, so both are found by bisection. A
+        page costs its size, plus the series skipped because their
+        dimensions do not match.
+
+        :param name: The name the metrics must have, or None.
+        :param dimensions: The dimensions the metrics must have, or None.
+        :param offset: The ID of the last metric of the previous page, or
+        None to return all of them.
+        """
+        entry = self._get(tenant_id, region)
+        with self._lock:
+            names = entry.names
+            if name:
+                # the serie without dimensions, then the ones with; names
+                # such as name%20x sort in between.
+                name_prefix = serie_names.prefix(tenant_id, region, name)
+                start = bisect.bisect_left(names, name_prefix)
+                ranges = [(start, bisect.bisect_right(names, name_prefix,
+                                                      start)),
+                          (bisect.bisect_left(names, name_prefix + '&'),
+                           bisect.bisect_left(names, name_prefix + "'"))]
+            else:
+                ranges = [(0, len(names))]
+            if offset is not None:
+                start = bisect.bisect_left(names, urllib.unquote(offset))
+                ranges = [(max(low, start), high) for low, high in ranges]
+
+            metrics = []
+            for low, high in ranges:
+                for i in xrange(low, high):
+                    metric = entry.metrics[names[i]]
+                    if not _matches(metric, dimensions):
+                        continue
+                    metrics.append(metric)
+                    if (offset is not None and
+                            len(metrics) >= constants.PAGE_LIMIT):
+                        return metrics
+            return metrics
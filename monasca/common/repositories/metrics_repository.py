@@ -16,6 +16,8 @@ import abc
 
 import six
 
+from monasca.common import timestamps
+
 
 @six.add_metaclass(abc.ABCMeta)
 class MetricsRepository(object):
@@ -25,15 +27,45 @@ class MetricsRepository(object):
 
     @abc.abstractmethod
     def measurement_list(self, tenant_id, region, name, dimensions,
-                         start_timestamp, end_timestamp, offset):
+                         start_timestamp, end_timestamp, offset,
+                         time_format=timestamps.ISO_8601):
         pass
 
     @abc.abstractmethod
     def metrics_statistics(self, tenant_id, region, name, dimensions,
-                           start_timestamp, end_timestamp, statistics, period):
+                           start_timestamp, end_timestamp, statistics, period,
+                           time_format=timestamps.ISO_8601):
         pass
 
+    def measurement_stream(self, tenant_id, region, name, dimensions,
+                           start_timestamp, end_timestamp,
+                           time_format=timestamps.ISO_8601):
+        """Returns an iterator over the measurements of every series.
+
+        A series may be split over several consecutive measurements, each
+        with some of its points. This default returns the whole result of
+        measurement_list.
+        """
+        return iter(self.measurement_list(tenant_id, region, name,
+                                          dimensions, start_timestamp,
+                                          end_timestamp, None, time_format))
+
+    def metrics_statistics_stream(self, tenant_id, region, name, dimensions,
+                                  start_timestamp, end_timestamp, statistics,
+                                  period, time_format=timestamps.ISO_8601):
+        """Returns an iterator over the statistics of every series.
+
+        A series may be split over several consecutive statistics, each with
+        some of its periods. This default returns the whole result of
+        metrics_statistics.
+        """
+        return iter(self.metrics_statistics(tenant_id, region, name,
+                                            dimensions, start_timestamp,
+                                            end_timestamp, statistics,
+                                            period, time_format))
+
     @abc.abstractmethod
     def alarm_history(self, tenant_id, alarm_id_list,
-                      offset, start_timestamp, end_timestamp):
+                      offset, start_timestamp, end_timestamp,
+                      time_format=timestamps.ISO_8601):
         pass
\ No newline at end of file
@@ -26,7 +26,7 @@ class AlarmsRepository(mysql_repository.MySQLRepository,
                        alarms_repository.AlarmsRepository):
 
     base_query = """
-          select distinct a.id as alarm_id, a.state,
+          select distinct a.id as alarm_id, a.state, ad.tenant_id,
           ad.id as alarm_definition_id, ad.name as alarm_definition_name,
           ad.severity,
           md.name as metric_name, mdg.dimensions as metric_dimensions
@@ -194,6 +194,13 @@ class AlarmsRepository(mysql_repository.MySQLRepository,
         else:
             return rows
 
+    @mysql_repository.mysql_try_catch_block
+    def get_all_alarms(self):
+
+        query = AlarmsRepository.base_query + " order by a.id "
+
+        return self._execute_query(query, [])
+
     @mysql_repository.mysql_try_catch_block
     def get_alarms(self, tenant_id, query_parms, offset):
 
@@ -206,12 +213,8 @@ class AlarmsRepository(mysql_repository.MySQLRepository,
         where_clause = " where ad.tenant_id = %s "
 
         if offset is not None:
-            where_clause += " and ad.id > %s"
+            where_clause += " and a.id > %s"
             parms.append(offset.encode('utf8'))
-            limit_clause = " limit %s "
-            parms.append(constants.PAGE_LIMIT)
-        else:
-            limit_clause = ""
 
         if 'alarm_definition_id' in query_parms:
             parms.append(query_parms['alarm_definition_id'])
@@ -266,6 +269,18 @@ class AlarmsRepository(mysql_repository.MySQLRepository,
             parms += sub_select_parms
             where_clause += sub_select_clause
 
-        query = select_clause + where_clause + order_by_clause + limit_clause
+        if offset is not None:
+            # a page holds PAGE_LIMIT alarms with all of their metrics, not
+            # PAGE_LIMIT rows.
+            where_clause = """ where a.id in
+                (select id from
+                    (select distinct a.id from alarm as a
+                     inner join alarm_definition as ad
+                        on ad.id = a.alarm_definition_id
+                     {} order by a.id limit %s) as page) """.format(
+                where_clause)
+            parms.append(constants.PAGE_LIMIT)
+
+        query = select_clause + where_clause + order_by_clause
 
         return self._execute_query(query, parms)
@@ -0,0 +1,89 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Formatting of the timestamps of measurements, statistics and alarms.
+
+Timestamps are formatted a column at a time: with NumPy when it is
+installed, otherwise by carrying the date over the consecutive timestamps of
+the same day, which is the common case as results are sorted by time.
+"""
+
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+ISO_8601 = 'iso8601'
+EPOCH_MS = 'epoch_ms'
+TIME_FORMATS = (ISO_8601, EPOCH_MS)
+
+# columns shorter than this are formatted in Python, the conversion to an
+# array costs more than it saves.
+NUMPY_MIN_SIZE = 64
+
+_SECONDS_PER_DAY = 86400
+_MINUTES = ['%02d:%02d:' % divmod(minute, 60) for minute in range(1440)]
+_SECONDS = ['%02dZ' % second for second in range(60)]
+
+
+def _format_python(timestamps):
+    formatted = []
+    day_start = None
+    for timestamp in timestamps:
+        timestamp = int(timestamp)
+        if (day_start is None or
+                not day_start <= timestamp < day_start + _SECONDS_PER_DAY):
+            day_start = timestamp - timestamp % _SECONDS_PER_DAY
+            date = time.strftime('%Y-%m-%dT', time.gmtime(day_start))
+        seconds = timestamp - day_start
+        formatted.append(date + _MINUTES[seconds // 60] +
+                         _SECONDS[seconds % 60])
+    return formatted
+
+
+def _format_numpy(timestamps):
+    seconds = numpy.asarray(timestamps, dtype='int64').astype(
+        'datetime64[s]')
+    return numpy.datetime_as_string(seconds, timezone='UTC').tolist()
+
+
+def format_timestamps(timestamps, time_format=ISO_8601):
+    """Formats timestamps in seconds since the epoch.
+
+    :param timestamps: A list of timestamps.
+    :param time_format: ISO_8601 for strings such as 2014-10-13T19:59:22Z,
+    or EPOCH_MS for milliseconds since the epoch.
+    :return: A list of the formatted timestamps.
+    """
+    if time_format == EPOCH_MS:
+        # InfluxDB returns floats, which would be encoded with a fraction.
+        return [int(round(timestamp * 1000)) for timestamp in timestamps]
+    if numpy is not None and len(timestamps) >= NUMPY_MIN_SIZE:
+        return _format_numpy(timestamps)
+    return _format_python(timestamps)
+
+
+def format_points(points, time_format=ISO_8601):
+    """Formats the timestamp at the start of every point, in place.
+
+    :param points: A list of lists, such as the points of an InfluxDB serie.
+    :return: The points.
+    """
+    formatted = format_timestamps([point[0] for point in points], time_format)
+    for point, timestamp in zip(points, formatted):
+        point[0] = timestamp
+    return points
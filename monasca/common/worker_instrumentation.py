@@ -0,0 +1,122 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Shares the instrumentation of the worker processes of a server.
+
+Every worker writes the snapshot of its instruments to <directory>/<pid>.json
+every interval seconds, and collect() merges the snapshots of all of the
+workers, so any worker can answer for the whole server.
+"""
+
+import json
+import os
+import threading
+import time
+
+from monasca.common import instrumentation
+from monasca.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+_lock = threading.Lock()
+_exporting_pid = None
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, '%d.json' % pid)
+
+
+def _write_snapshot(directory):
+    path = _snapshot_path(directory, os.getpid())
+    with open(path + '.tmp', 'w') as snapshot_file:
+        json.dump(instrumentation.snapshot(), snapshot_file)
+    os.rename(path + '.tmp', path)
+
+
+def _export(directory, interval):
+    while True:
+        try:
+            _write_snapshot(directory)
+        except Exception as ex:
+            LOG.warning('Could not write the instrumentation snapshot to '
+                        '%s: %s' % (directory, ex))
+        time.sleep(interval)
+
+
+def start(directory, interval):
+    """Starts writing the snapshots of this process in the background.
+
+    Calling start again in the same process does nothing, but a process
+    forked after the call, like a gunicorn worker, starts its own writer.
+
+    :param directory: The directory shared by the workers.
+    :param interval: The number of seconds between snapshots.
+    """
+    global _exporting_pid
+    with _lock:
+        if _exporting_pid == os.getpid():
+            return
+        _exporting_pid = os.getpid()
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError as ex:
+                LOG.warning('Could not create the instrumentation directory '
+                            '%s: %s' % (directory, ex))
+        thread = threading.Thread(target=_export,
+                                  args=(directory, interval),
+                                  name='instrumentation-export')
+        thread.daemon = True
+        thread.start()
+
+
+def collect(directory, max_age):
+    """Returns the merged instrumentation of the workers.
+
+    The current process contributes its live snapshot. Snapshots older
+    than max_age seconds are left out, they were written by workers that
+    have exited.
+
+    :param directory: The directory shared by the workers, or None to only
+    report the current process.
+    :param max_age: The age in seconds of the snapshots to leave out.
+    :return: A dict with the pids of the workers and the merged
+    instruments.
+    """
+    pid = os.getpid()
+    pids = [pid]
+    snapshots = [instrumentation.snapshot()]
+
+    names = os.listdir(directory) if directory and os.path.isdir(
+        directory) else []
+    now = time.time()
+    for name in names:
+        worker, ext = os.path.splitext(name)
+        if ext != '.json' or not worker.isdigit() or int(worker) == pid:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                continue
+            with open(path) as snapshot_file:
+                snapshots.append(json.load(snapshot_file))
+            pids.append(int(worker))
+        except (IOError, OSError, ValueError) as ex:
+            # the worker may have exited or be replacing the file.
+            LOG.debug('Skipping instrumentation snapshot %s: %s' %
+                      (path, ex))
+
+    return {'workers': sorted(pids),
+            'instruments': instrumentation.merge(snapshots)}
@@ -0,0 +1,217 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Benchmarks for the metrics ingestion path.
+
+Run from the root directory of this project::
+
+    python -m monasca.tests.benchmarks.ingestion_benchmark
+
+Use --help to see the batch shapes and simulated broker round trip that can
+be configured.
+"""
+
+import argparse
+import gzip
+import json
+import StringIO
+import time
+
+from monasca.common import content_encoding
+from monasca.common import json_stream
+from monasca.common import msgpack_stream
+from monasca.common.messaging import fake_publisher
+from monasca.common.messaging.message_formats.reference import (
+    metrics as reference_metrics)
+from monasca.v2.common.schemas import metrics_request_body_schema
+from monasca.v2.common import utils
+
+
+class RoundTripPublisher(fake_publisher.FakePublisher):
+    """Fake publisher that sleeps once per call to simulate a broker."""
+
+    def __init__(self, topic, round_trip):
+        super(RoundTripPublisher, self).__init__(topic)
+        self.round_trip = round_trip
+
+    def send_message(self, message):
+        time.sleep(self.round_trip)
+
+    def send_messages(self, messages, keys=None):
+        time.sleep(self.round_trip)
+
+
+def make_metrics(batch_size, num_dimensions=5):
+    return [{'name': 'cpu.idle_perc',
+             'dimensions': dict(('dim%d' % d, 'value-%d-%d' % (d, i))
+                                for d in range(num_dimensions)),
+             'timestamp': 1405630174 + i,
+             'value': float(i)}
+            for i in range(batch_size)]
+
+
+def bench_per_metric(publisher, metrics, requests):
+    for _ in range(requests):
+        for metric in metrics:
+            publisher.send_message(json.dumps(metric))
+
+
+def bench_batched(publisher, metrics, requests):
+    for _ in range(requests):
+        publisher.send_messages([json.dumps(metric) for metric in metrics])
+
+
+def bench_validate_reference(_publisher, metrics, requests):
+    for _ in range(requests):
+        metrics_request_body_schema.validate_reference(metrics)
+
+
+def bench_validate(_publisher, metrics, requests):
+    for _ in range(requests):
+        metrics_request_body_schema.validate(metrics)
+
+
+def bench_transform_dumps(_publisher, metrics, requests):
+    for _ in range(requests):
+        [json.dumps(metric, default=utils.date_handler) for metric in
+         reference_metrics.transform(metrics, 'tenant', 'region')]
+
+
+def bench_serialize(_publisher, metrics, requests):
+    raw_metrics = [json.dumps(metric) for metric in metrics]
+    for _ in range(requests):
+        reference_metrics.serialize(metrics, raw_metrics, 'tenant', 'region')
+
+
+def _gzip(body):
+    out = StringIO.StringIO()
+    gzip_file = gzip.GzipFile(fileobj=out, mode='w')
+    gzip_file.write(body)
+    gzip_file.close()
+    return out.getvalue()
+
+
+def bench_decode(body, requests, content_encoding_header=None):
+    for _ in range(requests):
+        stream = content_encoding.decoding_stream(
+            StringIO.StringIO(body), content_encoding_header, len(body) * 100)
+        for _metric in json_stream.JSONStream(stream):
+            pass
+
+
+def bench_ingest_json(body, requests):
+    for _ in range(requests):
+        values = json_stream.JSONStream(StringIO.StringIO(body))
+        metrics, raw_metrics = zip(*values.iter_with_raw())
+        metrics = list(metrics)
+        metrics_request_body_schema.validate(metrics)
+        reference_metrics.serialize(metrics, list(raw_metrics), 'tenant',
+                                    'region')
+
+
+def bench_ingest_msgpack(body, requests):
+    for _ in range(requests):
+        metrics = list(msgpack_stream.MsgpackStream(StringIO.StringIO(body)))
+        metrics_request_body_schema.validate(metrics)
+        reference_metrics.serialize(metrics, [None] * len(metrics), 'tenant',
+                                    'region')
+
+
+def bench_split_decode(body, requests):
+    for _ in range(requests):
+        [json.dumps(item) for item in json.loads(body)]
+
+
+def bench_split_raw(body, requests):
+    for _ in range(requests):
+        json_stream.split_array(body)
+
+
+def _run_ingest(name, func, body, metrics, requests):
+    start = time.time()
+    func(body, requests)
+    elapsed = time.time() - start
+    total = len(metrics) * requests
+    print('%-14s %8d metrics in %8.3fs  %12.1f metrics/s  %9.1f POST/s' %
+          (name, total, elapsed, total / elapsed, requests / elapsed))
+
+
+def _run_decode(name, body, metrics, requests, content_encoding_header=None):
+    start = time.time()
+    bench_decode(body, requests, content_encoding_header)
+    elapsed = time.time() - start
+    total = len(metrics) * requests
+    print('%-14s %8d metrics in %8.3fs  %12.1f metrics/s  %9d bytes/POST' %
+          (name, total, elapsed, total / elapsed, len(body)))
+
+
+def _run(name, func, publisher, metrics, requests):
+    start = time.time()
+    func(publisher, metrics, requests)
+    elapsed = time.time() - start
+    total = len(metrics) * requests
+    print('%-14s %8d metrics in %8.3fs  %12.1f metrics/s' %
+          (name, total, elapsed, total / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='Number of metrics per POST.')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='Number of POSTs to simulate.')
+    parser.add_argument('--round-trip-ms', type=float, default=0.5,
+                        help='Simulated broker round trip per produce call.')
+    args = parser.parse_args()
+
+    metrics = make_metrics(args.batch_size)
+    publisher = RoundTripPublisher('metrics', args.round_trip_ms / 1000.0)
+
+    print('publisher: batch size %d, %.2fms round trip' %
+          (args.batch_size, args.round_trip_ms))
+    _run('per-metric', bench_per_metric, publisher, metrics, args.requests)
+    _run('batched', bench_batched, publisher, metrics, args.requests)
+
+    print('validation: batch size %d' % args.batch_size)
+    _run('voluptuous', bench_validate_reference, None, metrics,
+         args.requests)
+    _run('fast path', bench_validate, None, metrics, args.requests)
+
+    print('reference envelope: batch size %d' % args.batch_size)
+    _run('encode', bench_transform_dumps, None, metrics, args.requests)
+    _run('splice', bench_serialize, None, metrics, args.requests)
+
+    body = json.dumps(metrics)
+    print('request body decoding: batch size %d' % args.batch_size)
+    _run_decode('identity', body, metrics, args.requests)
+    _run_decode('gzip', _gzip(body), metrics, args.requests, 'gzip')
+
+    print('request body format (decode, validate, serialize): '
+          'batch size %d' % args.batch_size)
+    _run_ingest('json', bench_ingest_json, body, metrics, args.requests)
+    if msgpack_stream.is_available():
+        _run_ingest('msgpack', bench_ingest_msgpack,
+                    msgpack_stream.msgpack.packb(metrics), metrics,
+                    args.requests)
+    else:
+        print('msgpack        not installed')
+
+    print('legacy dispatcher array split: batch size %d' % args.batch_size)
+    _run_ingest('loads/dumps', bench_split_decode, body, metrics,
+                args.requests)
+    _run_ingest('split_array', bench_split_raw, body, metrics, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Decoding of InfluxDB serie name listings.
+
+Run from the root directory of this project::
+
+    python -m monasca.tests.benchmarks.serie_names_benchmark
+
+A list series result of --series names, with --dimensions dimensions each,
+is decoded with the original regular expressions, with the single pass
+decoder, and twice through the decode cache, the second time with every
+name remembered as when the same series are listed again.
+"""
+
+import argparse
+import time
+import urllib
+
+from monasca.common.repositories.influxdb import serie_names
+
+
+def make_serie_names(num_series, num_dimensions):
+    names = []
+    for i in range(num_series):
+        dimensions = [('hostname', 'host-%05d' % (i % 20000)),
+                      ('service', 'monitoring'),
+                      ('url', 'http://host-%05d:8080/healthcheck' %
+                       (i % 20000))]
+        for d in range(len(dimensions), num_dimensions):
+            dimensions.append(('dim%d' % d, 'value-%d' % (i % 31)))
+        name = u'tenant-%03d?useast&%s' % (i % 7, 'metric.%d' % (i // 20000))
+        for dimension_name, dimension_value in sorted(
+                dimensions[:num_dimensions]):
+            name += u'&%s=%s' % (urllib.quote(dimension_name, safe=''),
+                                 urllib.quote(dimension_value, safe=''))
+        names.append(name)
+    return names
+
+
+def timed(decode, names):
+    start = time.time()
+    for name in names:
+        decode(name)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--series', type=int, default=1000000,
+                        help='Number of serie names in the listing.')
+    parser.add_argument('--dimensions', type=int, default=3,
+                        help='Number of dimensions per serie.')
+    args = parser.parse_args()
+
+    names = make_serie_names(args.series, args.dimensions)
+    cache = serie_names.DecodeCache(2 * args.series)
+    results = [('regexes', timed(serie_names.decode_with_regexes, names)),
+               ('single pass', timed(serie_names.decode, names)),
+               ('cache, first listing', timed(cache.decode, names)),
+               ('cache, next listing', timed(cache.decode, names))]
+
+    print('%d serie names, %d dimensions each' %
+          (args.series, args.dimensions))
+    baseline = results[0][1]
+    for label, elapsed in results:
+        print('%-22s %8.3fs  %10.0f names/s  %5.1fx' %
+              (label, elapsed, args.series / elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
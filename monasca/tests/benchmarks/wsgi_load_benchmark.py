@@ -0,0 +1,236 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""End to end throughput of POST /v2.0/metrics through the WSGI app.
+
+Run from the root directory of this project::
+
+    python -m monasca.tests.benchmarks.wsgi_load_benchmark
+
+The Metrics dispatcher is loaded with the recording messaging driver and the
+fake metrics repository, so no message queue or database is needed, and
+requests are sent to the WSGI application in process by --concurrency
+threads. Every request body is one of the --shapes batch sizes, picked with
+their weights. The packaging metadata must be current for the recording
+driver to be found (python setup.py egg_info).
+"""
+
+import argparse
+import json
+import random
+import StringIO
+import threading
+import time
+from wsgiref import util as wsgi_util
+
+from oslo.config import cfg
+
+from monasca.common import instrumentation
+from monasca.common import resource_api
+from monasca.v2.reference import metrics as metrics_dispatcher
+
+_NAMES = ('cpu.idle_perc', 'cpu.user_perc', 'mem.usable_mb',
+          'disk.space_used_perc', 'net.in_bytes_sec', 'load.avg_1_min',
+          'http_status', 'process.pid_count')
+_SERVICES = ('compute', 'monitoring', 'object-storage', 'networking')
+
+
+def make_metric(i, num_dimensions):
+    dimensions = {'hostname': 'host-%04d' % (i % 1000),
+                  'service': _SERVICES[i % len(_SERVICES)],
+                  'component': 'component-%d' % (i % 17),
+                  'device': 'sda%d' % (i % 4),
+                  'url': 'http://host-%04d:8080/healthcheck' % (i % 1000)}
+    for d in range(len(dimensions), num_dimensions):
+        dimensions['dim%d' % d] = 'value-%d' % (i % 31)
+    return {'name': _NAMES[i % len(_NAMES)],
+            'dimensions': dict(sorted(dimensions.items())[:num_dimensions]),
+            'timestamp': 1405630174 + i,
+            'value': float(i % 100)}
+
+
+def parse_shapes(shapes):
+    """Parses batch_size:weight pairs separated by commas."""
+    result = []
+    for shape in shapes.split(','):
+        batch_size, _, weight = shape.partition(':')
+        result.append((int(batch_size), float(weight or 1)))
+    return result
+
+
+def make_bodies(shapes, num_dimensions):
+    bodies = []
+    for batch_size, weight in shapes:
+        metrics = [make_metric(i, num_dimensions) for i in range(batch_size)]
+        body = json.dumps(metrics[0] if batch_size == 1 else metrics)
+        bodies.append((body, batch_size, weight))
+    return bodies
+
+
+def make_app():
+    app = resource_api.ResourceAPI()
+    app.add_route(None, metrics_dispatcher.Metrics(cfg.CONF))
+    return app
+
+
+def post(app, body):
+    environ = {'REQUEST_METHOD': 'POST',
+               'PATH_INFO': '/v2.0/metrics/',
+               'CONTENT_TYPE': 'application/json',
+               'CONTENT_LENGTH': str(len(body)),
+               'HTTP_X_ROLES': 'agent',
+               'HTTP_X_TENANT_ID': 'benchmark-tenant',
+               'wsgi.input': StringIO.StringIO(body)}
+    wsgi_util.setup_testing_defaults(environ)
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    ''.join(app(environ, start_response))
+    return statuses[0]
+
+
+class LoadRun(object):
+
+    def __init__(self, app, bodies, requests, seed=0):
+        self._app = app
+        self._random = random.Random(seed)
+        total_weight = sum(weight for _, _, weight in bodies)
+        self._plan = []
+        for _ in range(requests):
+            pick = self._random.uniform(0, total_weight)
+            for body, batch_size, weight in bodies:
+                pick -= weight
+                if pick <= 0:
+                    break
+            self._plan.append((body, batch_size))
+        self._lock = threading.Lock()
+        self._next = 0
+        self.latencies = []
+        self.metrics = 0
+        self.errors = {}
+
+    def _take(self):
+        with self._lock:
+            if self._next >= len(self._plan):
+                return None
+            self._next += 1
+            return self._plan[self._next - 1]
+
+    def _worker(self):
+        while True:
+            item = self._take()
+            if item is None:
+                return
+            body, batch_size = item
+            start = time.time()
+            status = post(self._app, body)
+            latency = time.time() - start
+            with self._lock:
+                self.latencies.append(latency)
+                if status.startswith('204'):
+                    self.metrics += batch_size
+                else:
+                    self.errors[status] = self.errors.get(status, 0) + 1
+
+    def run(self, concurrency):
+        threads = [threading.Thread(target=self._worker)
+                   for _ in range(concurrency)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.time() - start
+
+
+def wait_published(published, count, timeout=30):
+    """Waits for metrics still queued in async mode to be published."""
+    deadline = time.time() + timeout
+    while published.count < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='Number of POSTs to send.')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Number of threads sending POSTs.')
+    parser.add_argument('--shapes', default='1:40,10:30,100:20,500:10',
+                        help='Batch sizes and their weights, as '
+                             'batch_size:weight separated by commas.')
+    parser.add_argument('--dimensions', type=int, default=5,
+                        help='Number of dimensions per metric.')
+    parser.add_argument('--latency-ms', type=float, default=0.5,
+                        help='Simulated message queue round trip per send.')
+    parser.add_argument('--group-commit', action='store_true',
+                        help='Enable [ingestion] group_commit_enabled.')
+    parser.add_argument('--async', action='store_true',
+                        help='Enable [ingestion] async_enabled.')
+    parser.add_argument('--keyed', action='store_true',
+                        help='Enable [kafka] keyed partition keys.')
+    args = parser.parse_args()
+
+    cfg.CONF(args=[], project='monasca', default_config_files=[])
+    cfg.CONF.set_override('region', 'benchmark')
+    cfg.CONF.set_override('driver', 'recording', 'messaging')
+    cfg.CONF.set_override('recording_latency_ms', args.latency_ms,
+                          'messaging')
+    cfg.CONF.set_override('metrics_driver', 'fake_metrics_repo',
+                          'repositories')
+    cfg.CONF.set_override('group_commit_enabled', args.group_commit,
+                          'ingestion')
+    cfg.CONF.set_override('async_enabled', args.async, 'ingestion')
+    cfg.CONF.set_override('keyed', args.keyed, 'kafka')
+
+    app = make_app()
+    bodies = make_bodies(parse_shapes(args.shapes), args.dimensions)
+    published = instrumentation.counter('publisher.recording.metrics.messages')
+    # one request of every shape first, so the timed run is warm.
+    for body, _, _ in bodies:
+        post(app, body)
+    wait_published(published, sum(size for _, size, _ in bodies))
+    published_before = published.count
+
+    load = LoadRun(app, bodies, args.requests)
+    elapsed = load.run(args.concurrency)
+    latencies = sorted(load.latencies)
+
+    print('POST /v2.0/metrics: %d requests, %d threads, shapes %s, '
+          '%.2fms simulated round trip' %
+          (args.requests, args.concurrency, args.shapes, args.latency_ms))
+    print('%10.1f requests/s  %12.1f metrics/s' %
+          (len(latencies) / elapsed, load.metrics / elapsed))
+    print('latency p50 %8.3fms  p99 %8.3fms  max %8.3fms' %
+          (percentile(latencies, 50) * 1000,
+           percentile(latencies, 99) * 1000, latencies[-1] * 1000))
+    wait_published(published, published_before + load.metrics)
+    print('%d metrics accepted, %d published' %
+          (load.metrics, published.count - published_before))
+    if load.errors:
+        print('errors: %s' % ', '.join('%s x%d' % item
+                                       for item in load.errors.items()))
+
+
+if __name__ == '__main__':
+    main()
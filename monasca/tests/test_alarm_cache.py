@@ -0,0 +1,228 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import sqlite3
+import unittest
+
+import mock
+
+from monasca.common.repositories import cached_alarms_repository
+from monasca.common.repositories import constants
+from monasca.common.repositories import exceptions
+import monasca.v2.reference  # noqa
+
+try:
+    from monasca.common.repositories.mysql import alarms_repository
+except ImportError:
+    alarms_repository = None
+
+
+def _row(alarm_id, tenant_id='t1', state='OK', definition_id='d1',
+         metric_name='cpu', dimensions='host=a'):
+    return {'alarm_id': alarm_id, 'state': state, 'tenant_id': tenant_id,
+            'alarm_definition_id': definition_id,
+            'alarm_definition_name': 'def-' + definition_id,
+            'severity': 'LOW', 'metric_name': metric_name,
+            'metric_dimensions': dimensions}
+
+
+class FakeAlarmsRepository(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.during_load = None
+
+    def get_all_alarms(self):
+        if self.during_load:
+            self.during_load()
+        return list(self.rows)
+
+    def get_alarm(self, tenant_id, id):
+        rows = [row for row in self.rows
+                if row['alarm_id'] == id and row['tenant_id'] == tenant_id]
+        if not rows:
+            raise exceptions.DoesNotExistException
+        return rows
+
+    def get_alarms(self, tenant_id, query_parms, offset):
+        return 'delegated'
+
+
+class TestCachedAlarmsRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.delegate = FakeAlarmsRepository([
+            _row('a1'), _row('a1', metric_name='mem', dimensions='host=b'),
+            _row('a2', state='ALARM', definition_id='d2'),
+            _row('a3', tenant_id='t2')])
+        self.cache = cached_alarms_repository.CachedAlarmsRepository(
+            self.delegate, ['events', 'alarm-state-transitions'], 300)
+        # no consumers or refresh thread, the tests drive the cache.
+        self.cache._pid = os.getpid()
+
+    def _event(self, event_type, **event):
+        self.cache._handle_message(json.dumps({event_type: event}))
+
+    def test_delegates_until_loaded(self):
+        self.assertEqual('delegated', self.cache.get_alarms('t1', {}, None))
+        self.assertIsNone(self.cache.watermark())
+
+    def test_list_and_show(self):
+        self.cache._refresh()
+        rows = self.cache.get_alarms('t1', {}, None)
+        self.assertEqual(['a1', 'a1', 'a2'],
+                         [row['alarm_id'] for row in rows])
+        self.assertEqual(
+            ['a1', 'a1'], [row['alarm_id'] for row in self.cache.get_alarms(
+                't1', {'metric_dimensions': 'host:b'}, None)])
+        self.assertEqual(
+            ['a2'], [row['alarm_id'] for row in self.cache.get_alarms(
+                't1', {'state': 'ALARM'}, None)])
+        self.assertEqual(
+            ['a2'], [row['alarm_id'] for row in self.cache.get_alarms(
+                't1', {}, 'a1')])
+        self.assertEqual(2, len(self.cache.get_alarm('t1', 'a1')))
+        self.assertRaises(exceptions.DoesNotExistException,
+                          self.cache.get_alarm, 't2', 'a1')
+
+    def test_events(self):
+        self.cache._refresh()
+        self._event('alarm-transitioned', tenantId='t1', alarmId='a1',
+                    newState='ALARM')
+        self._event('alarm-definition-updated', tenantId='t1',
+                    alarmDefinitionId='d2', alarmName='renamed',
+                    severity='HIGH')
+        self._event('alarm-deleted', tenant_id='t2', alarmId='a3')
+        self.delegate.rows.append(_row('a4'))
+        self._event('alarm-created', tenantId='t1', alarmId='a4')
+
+        self.assertEqual('ALARM',
+                         self.cache.get_alarm('t1', 'a1')[0]['state'])
+        self.assertEqual('renamed', self.cache.get_alarm(
+            't1', 'a2')[0]['alarm_definition_name'])
+        self.assertEqual([], self.cache.get_alarms('t2', {}, None))
+        self.assertEqual(1, len(self.cache.get_alarm('t1', 'a4')))
+
+        self._event('alarm-definition-deleted', alarmDefinitionId='d1')
+        self.assertEqual(['a2'], [row['alarm_id'] for row in
+                                  self.cache.get_alarms('t1', {}, None)])
+
+    def test_events_during_load_are_applied_again(self):
+        def transition():
+            self._event('alarm-transitioned', tenantId='t1', alarmId='a2',
+                        newState='OK')
+        self.delegate.during_load = transition
+        self.cache._refresh()
+        self.assertEqual('OK', self.cache.get_alarm('t1', 'a2')[0]['state'])
+
+    def test_show_alarm_not_in_the_cache_yet(self):
+        self.cache._refresh()
+        self.delegate.rows.append(_row('a5'))
+        self.assertEqual(1, len(self.cache.get_alarm('t1', 'a5')))
+        self.assertRaises(exceptions.DoesNotExistException,
+                          self.cache.get_alarm, 't1', 'a6')
+
+
+class _GroupConcat(object):
+    """group_concat(name, '=', value) as in MySQL."""
+
+    def __init__(self):
+        self.parts = []
+
+    def step(self, *args):
+        self.parts.append(''.join(args))
+
+    def finalize(self):
+        return ','.join(sorted(self.parts))
+
+
+@unittest.skipIf(alarms_repository is None, 'MySQLdb is not installed')
+class TestCachedAndSQLPagesMatch(unittest.TestCase):
+
+    def setUp(self):
+        self.db = sqlite3.connect(':memory:')
+        self.db.row_factory = sqlite3.Row
+        self.db.create_aggregate('group_concat', 3, _GroupConcat)
+        self.db.executescript("""
+            create table alarm_definition (id, tenant_id, name, severity);
+            create table alarm (id, state, alarm_definition_id);
+            create table metric_definition (id, name);
+            create table metric_definition_dimensions
+                (id, metric_definition_id, metric_dimension_set_id);
+            create table metric_dimension (dimension_set_id, name, value);
+            create table alarm_metric
+                (alarm_id, metric_definition_dimensions_id);
+            insert into alarm_definition values ('d1', 't1', 'one', 'LOW');
+            insert into alarm_definition values ('d0', 't1', 'zero', 'HIGH');
+            insert into alarm_definition values ('d2', 't2', 'two', 'LOW');
+            insert into metric_definition values ('m1', 'cpu');
+            insert into metric_definition values ('m2', 'mem');
+            insert into metric_definition_dimensions values ('x1', 'm1', 's1');
+            insert into metric_definition_dimensions values ('x2', 'm2', 's2');
+            insert into metric_dimension values ('s1', 'host', 'a');
+            insert into metric_dimension values ('s2', 'host', 'b');
+            """)
+        # alarm ids do not sort like the ids of their definitions.
+        for i, (definition_id, state) in enumerate(
+                [('d1', 'OK'), ('d0', 'ALARM'), ('d1', 'ALARM'),
+                 ('d0', 'OK'), ('d2', 'OK'), ('d1', 'OK'), ('d0', 'OK')]):
+            alarm_id = 'a%d' % i
+            self.db.execute('insert into alarm values (?, ?, ?)',
+                            (alarm_id, state, definition_id))
+            self.db.execute('insert into alarm_metric values (?, ?)',
+                            (alarm_id, 'x1'))
+            if i % 2:
+                self.db.execute('insert into alarm_metric values (?, ?)',
+                                (alarm_id, 'x2'))
+
+        self.sql = alarms_repository.AlarmsRepository()
+        self.sql._execute_query = self._execute_query
+        self.cache = cached_alarms_repository.CachedAlarmsRepository(
+            self.sql, [], 300)
+        self.cache._pid = os.getpid()
+        self.cache._refresh()
+
+    def _execute_query(self, query, parms):
+        rows = self.db.execute(query.replace('%s', '?'), parms).fetchall()
+        return [dict(zip(row.keys(), row)) for row in rows]
+
+    def _pages(self, repo, query_parms):
+        pages = [repo.get_alarms('t1', query_parms, None)]
+        offset = u''
+        # more pages than there are alarms means the offset does not move.
+        for _ in range(10):
+            rows = repo.get_alarms('t1', query_parms, offset)
+            if not rows:
+                break
+            pages.append(rows)
+            offset = rows[-1]['alarm_id'].decode('utf8')
+        return [sorted((row['alarm_id'], row['metric_name']) for row in page)
+                for page in pages]
+
+    def test_same_pages(self):
+        with mock.patch.object(constants, 'PAGE_LIMIT', 2):
+            for query_parms in ({}, {'state': 'OK'},
+                                {'metric_name': 'mem'}):
+                self.assertEqual(self._pages(self.sql, query_parms),
+                                 self._pages(self.cache, query_parms))
+            self.assertEqual(
+                [[('a0', 'cpu'), ('a1', 'cpu'), ('a1', 'mem'),
+                  ('a2', 'cpu'), ('a3', 'cpu'), ('a3', 'mem'),
+                  ('a5', 'cpu'), ('a5', 'mem'), ('a6', 'cpu')],
+                 [('a0', 'cpu'), ('a1', 'cpu'), ('a1', 'mem')],
+                 [('a2', 'cpu'), ('a3', 'cpu'), ('a3', 'mem')],
+                 [('a5', 'cpu'), ('a5', 'mem'), ('a6', 'cpu')]],
+                self._pages(self.sql, {}))
@@ -0,0 +1,87 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import threading
+import time
+import unittest
+
+import mock
+
+from monasca.common import instrumentation
+from monasca.common.messaging import async_publisher
+from monasca.common.messaging import exceptions
+from monasca.common.messaging import fake_publisher
+
+
+class BlockingPublisher(fake_publisher.FakePublisher):
+
+    def __init__(self):
+        super(BlockingPublisher, self).__init__('test')
+        self.sent = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def send_messages(self, messages, keys=None):
+        self.started.set()
+        self.release.wait()
+        self.sent.extend(messages)
+
+
+class TestAsyncPublisher(unittest.TestCase):
+
+    def test_queue_full(self):
+        delegate = BlockingPublisher()
+        publisher = async_publisher.AsyncPublisher(delegate, 'test_full', 4)
+
+        publisher.send_messages(['a', 'b'])
+        delegate.started.wait(5)
+        publisher.send_messages(['c', 'd', 'e'])
+        self.assertRaises(exceptions.MessageQueueFullException,
+                          publisher.send_messages, ['f', 'g'])
+
+        stats = instrumentation.snapshot()
+        self.assertEqual(3, stats['publisher.async.test_full.depth']['value'])
+        self.assertEqual(2,
+                         stats['publisher.async.test_full.dropped']['count'])
+
+        delegate.release.set()
+        drained = instrumentation.meter('publisher.async.test_full.drained')
+        deadline = time.time() + 5
+        while drained.count < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], delegate.sent)
+        self.assertEqual(5, drained.count)
+
+    def test_workers_restart_after_fork(self):
+        delegate = BlockingPublisher()
+        delegate.release.set()
+        publisher = async_publisher.AsyncPublisher(delegate, 'test_fork', 4,
+                                                   workers=2)
+        publisher.send_messages(['a'])
+        deadline = time.time() + 5
+        while not delegate.sent and time.time() < deadline:
+            time.sleep(0.01)
+        parent_threads = publisher._threads
+        # left in the queue of the parent, without waking its workers.
+        publisher._queue.append((['queued in the parent'], None))
+
+        with mock.patch.object(os, 'getpid', return_value=-1):
+            publisher.send_messages(['b'])
+            self.assertEqual(2, len(publisher._threads))
+            self.assertFalse(set(parent_threads) & set(publisher._threads))
+            deadline = time.time() + 5
+            while len(delegate.sent) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(['a', 'b'], delegate.sent)
@@ -0,0 +1,96 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+import unittest
+
+from monasca.common import circuit_breaker
+from monasca.common import instrumentation
+
+
+class Probe(object):
+
+    def __init__(self):
+        self.reachable = threading.Event()
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if not self.reachable.is_set():
+            raise IOError('unreachable')
+
+
+def _wait_for_state(breaker, state):
+    deadline = time.time() + 5
+    while breaker.state != state and time.time() < deadline:
+        time.sleep(0.005)
+    return breaker.state
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_half_open_closed(self):
+        probe = Probe()
+        breaker = circuit_breaker.CircuitBreaker('test_cycle', probe,
+                                                 failure_threshold=2,
+                                                 retry_interval=0.01)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(circuit_breaker.CLOSED, breaker.state)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(circuit_breaker.OPEN, breaker.state)
+
+        # requests fail fast while the probe can not reach the service.
+        self.assertFalse(breaker.allow_request())
+        deadline = time.time() + 5
+        while probe.calls < 2 and time.time() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(circuit_breaker.OPEN, breaker.state)
+
+        probe.reachable.set()
+        self.assertEqual(circuit_breaker.HALF_OPEN,
+                         _wait_for_state(breaker, circuit_breaker.HALF_OPEN))
+        # a single trial request is let through.
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(circuit_breaker.CLOSED, breaker.state)
+        self.assertTrue(breaker.allow_request())
+
+        stats = instrumentation.snapshot()
+        prefix = 'circuit_breaker.test_cycle'
+        self.assertEqual('closed', stats[prefix + '.state']['value'])
+        self.assertEqual(1, stats[prefix + '.transitions.open']['count'])
+        self.assertEqual(1, stats[prefix + '.transitions.half_open']['count'])
+        self.assertEqual(1, stats[prefix + '.transitions.closed']['count'])
+        self.assertEqual(2, stats[prefix + '.rejected']['count'])
+
+    def test_failed_trial_reopens(self):
+        probe = Probe()
+        probe.reachable.set()
+        breaker = circuit_breaker.CircuitBreaker('test_trial', probe,
+                                                 retry_interval=0.01)
+        breaker.record_failure()
+        _wait_for_state(breaker, circuit_breaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        probe.reachable.clear()
+        breaker.record_failure()
+        self.assertEqual(circuit_breaker.OPEN, breaker.state)
+        self.assertFalse(breaker.allow_request())
+
+        # let the probe thread finish.
+        probe.reachable.set()
+        _wait_for_state(breaker, circuit_breaker.HALF_OPEN)
@@ -0,0 +1,71 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import gzip
+import StringIO
+import unittest
+import zlib
+
+from monasca.common import content_encoding
+
+BODY = '[' + ','.join(['{"name": "cpu", "value": 1}'] * 1000) + ']'
+
+
+def _gzip(body):
+    out = StringIO.StringIO()
+    gzip_file = gzip.GzipFile(fileobj=out, mode='w')
+    gzip_file.write(body)
+    gzip_file.close()
+    return out.getvalue()
+
+
+def _stream(encoded, encoding, max_size=len(BODY)):
+    return content_encoding.decoding_stream(StringIO.StringIO(encoded),
+                                            encoding, max_size)
+
+
+class TestContentEncoding(unittest.TestCase):
+
+    def test_identity(self):
+        self.assertEqual(BODY, _stream(BODY, None).read())
+        self.assertEqual(BODY, _stream(BODY, 'identity').read())
+
+    def test_gzip_and_deflate(self):
+        self.assertEqual(BODY, _stream(_gzip(BODY), 'gzip').read())
+        self.assertEqual(BODY, _stream(zlib.compress(BODY), 'Deflate').read())
+
+    def test_small_reads(self):
+        stream = _stream(zlib.compress(BODY), 'deflate')
+        chunks = []
+        while True:
+            chunk = stream.read(7)
+            if not chunk:
+                break
+            self.assertTrue(len(chunk) <= 7)
+            chunks.append(chunk)
+        self.assertEqual(BODY, ''.join(chunks))
+
+    def test_max_size(self):
+        stream = _stream(_gzip(BODY), 'gzip', len(BODY) - 1)
+        self.assertRaises(
+            content_encoding.DecompressedSizeExceededException, stream.read)
+
+    def test_corrupt_body(self):
+        stream = _stream('not compressed', 'gzip')
+        self.assertRaises(content_encoding.DecompressionException,
+                          stream.read)
+
+    def test_unsupported_encoding(self):
+        self.assertRaises(content_encoding.UnsupportedEncodingException,
+                          _stream, BODY, 'br')
@@ -0,0 +1,99 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import unittest
+
+from monasca.common.messaging import exceptions
+from monasca.common.messaging import fake_publisher
+from monasca.common.messaging import group_commit_publisher
+
+
+class RecordingPublisher(fake_publisher.FakePublisher):
+
+    def __init__(self, fail=False):
+        super(RecordingPublisher, self).__init__('test')
+        self.calls = []
+        self.fail = fail
+
+    def send_messages(self, messages, keys=None):
+        self.calls.append((messages, keys))
+        if self.fail:
+            raise exceptions.MessageQueueException('Kafka is down')
+
+
+def _send_concurrently(publisher, batches):
+    errors = []
+
+    def send(messages):
+        try:
+            publisher.send_messages(messages)
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=send, args=(messages,))
+               for messages in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return errors
+
+
+class TestGroupCommitPublisher(unittest.TestCase):
+
+    def test_concurrent_requests_share_a_publish(self):
+        delegate = RecordingPublisher()
+        publisher = group_commit_publisher.GroupCommitPublisher(
+            delegate, 'test_share', 1024 * 1024, 0.5)
+        batches = [['a%d' % i, 'b%d' % i] for i in range(8)]
+
+        self.assertEqual([], _send_concurrently(publisher, batches))
+        self.assertTrue(len(delegate.calls) < len(batches))
+        sent = sum((messages for messages, _keys in delegate.calls), [])
+        self.assertEqual(sorted(sum(batches, [])), sorted(sent))
+
+    def test_full_batch_is_sent_without_linger(self):
+        delegate = RecordingPublisher()
+        publisher = group_commit_publisher.GroupCommitPublisher(
+            delegate, 'test_full', 4, 60)
+        publisher.send_messages(['abcd'])
+        self.assertEqual([(['abcd'], None)], delegate.calls)
+
+    def test_every_request_gets_the_failure(self):
+        delegate = RecordingPublisher(fail=True)
+        publisher = group_commit_publisher.GroupCommitPublisher(
+            delegate, 'test_fail', 1024 * 1024, 0.2)
+        errors = _send_concurrently(publisher, [['a'], ['b'], ['c']])
+        self.assertEqual(3, len(errors))
+        for error in errors:
+            self.assertTrue(isinstance(error,
+                                       exceptions.MessageQueueException))
+
+    def test_keys_are_kept_with_their_messages(self):
+        delegate = RecordingPublisher()
+        publisher = group_commit_publisher.GroupCommitPublisher(
+            delegate, 'test_keys', 1024, 0)
+        publisher.send_messages(['a', 'b'], ['ka', 'kb'])
+        self.assertEqual([(['a', 'b'], ['ka', 'kb'])], delegate.calls)
+
+    def test_messages_without_keys_keep_no_key(self):
+        delegate = RecordingPublisher()
+        publisher = group_commit_publisher.GroupCommitPublisher(
+            delegate, 'test_no_keys', 1024, 0)
+        batch = group_commit_publisher._Batch()
+        batch.entries = [(['a'], None), (['b', 'c'], ['kb', 'kc'])]
+        publisher._flush(batch)
+        self.assertEqual([(['a', 'b', 'c'], [None, 'kb', 'kc'])],
+                         delegate.calls)
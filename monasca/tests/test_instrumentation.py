@@ -0,0 +1,119 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from monasca.common import instrumentation
+from monasca.common.messaging import exceptions
+from monasca.common.messaging import fake_publisher
+from monasca.common.messaging import instrumented_publisher
+from monasca.common import worker_instrumentation
+
+
+class FailingPublisher(fake_publisher.FakePublisher):
+
+    def __init__(self):
+        super(FailingPublisher, self).__init__('test')
+        self.fail = False
+
+    def send_messages(self, messages, keys=None):
+        if self.fail:
+            raise exceptions.MessageQueueException()
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = instrumentation.Histogram((10, 100))
+        for value in [1] * 50 + [50] * 45 + [500] * 5:
+            histogram.observe(value)
+        snap = histogram.snapshot()
+        self.assertEqual(100, snap['count'])
+        self.assertEqual([50, 45, 5], snap['buckets'])
+        self.assertEqual(1, snap['min'])
+        self.assertEqual(500, snap['max'])
+        self.assertEqual(10, snap['p50'])
+        self.assertEqual(100, snap['p95'])
+        self.assertEqual(500, snap['p99'])
+
+    def test_merge(self):
+        first = instrumentation.Histogram((10, 100))
+        second = instrumentation.Histogram((10, 100))
+        first.observe(5)
+        second.observe(50)
+        second.observe(60)
+        merged = instrumentation.merge([
+            {'h': first.snapshot(), 'c': {'type': 'counter', 'count': 2},
+             'g': {'type': 'gauge', 'value': 'open'}},
+            {'h': second.snapshot(), 'c': {'type': 'counter', 'count': 3},
+             'g': {'type': 'gauge', 'value': 'closed'}}])
+        self.assertEqual([1, 2, 0], merged['h']['buckets'])
+        self.assertEqual(115, merged['h']['sum'])
+        self.assertEqual(60, merged['h']['max'])
+        self.assertEqual(60, merged['h']['p50'])
+        self.assertEqual(5, merged['c']['count'])
+        self.assertEqual(['open', 'closed'], merged['g']['values'])
+
+
+class TestInstrumentedPublisher(unittest.TestCase):
+
+    def test_sends_and_failures(self):
+        delegate = FailingPublisher()
+        publisher = instrumented_publisher.InstrumentedPublisher(
+            delegate, 'test_topic')
+        publisher.send_messages(['ab', 'cde'])
+        delegate.fail = True
+        self.assertRaises(exceptions.MessageQueueException,
+                          publisher.send_messages, ['f'])
+
+        stats = instrumentation.snapshot()
+        prefix = 'publisher.test_topic'
+        self.assertEqual(2, stats[prefix + '.sends']['count'])
+        self.assertEqual(2, stats[prefix + '.messages']['count'])
+        self.assertEqual(5, stats[prefix + '.bytes']['count'])
+        self.assertEqual(1, stats[prefix + '.failures']['count'])
+        self.assertEqual(0, stats[prefix + '.retries']['count'])
+        self.assertEqual(1, stats[prefix + '.batch_size']['count'])
+        self.assertEqual(2, stats[prefix + '.latency_ms']['count'])
+
+
+class TestWorkerInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, pid, snap):
+        with open(os.path.join(self.directory, '%d.json' % pid), 'w') as f:
+            json.dump(snap, f)
+
+    def test_collect(self):
+        instrumentation.counter('test.workers').inc(2)
+        self._write(os.getpid() + 1,
+                    {'test.workers': {'type': 'counter', 'count': 3}})
+        stale = os.getpid() + 2
+        self._write(stale, {'test.workers': {'type': 'counter', 'count': 5}})
+        path = os.path.join(self.directory, '%d.json' % stale)
+        os.utime(path, (0, 0))
+
+        stats = worker_instrumentation.collect(self.directory, 15)
+        self.assertEqual(sorted([os.getpid(), os.getpid() + 1]),
+                         stats['workers'])
+        self.assertEqual(5, stats['instruments']['test.workers']['count'])
@@ -0,0 +1,121 @@
+# -*- coding: utf8 -*-
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import StringIO
+import unittest
+
+from monasca.common import json_stream
+
+
+def _stream(doc, read_size=3):
+    return json_stream.JSONStream(StringIO.StringIO(doc), read_size)
+
+
+class TestJSONStream(unittest.TestCase):
+
+    def test_array_elements_across_reads(self):
+        doc = [{'name': u'千', 'value': 12345.5}, 7, [1, 2], 'x']
+        for read_size in (1, 2, 3, 7, 1024):
+            values = _stream(json.dumps(doc), read_size)
+            self.assertTrue(values.is_array())
+            self.assertEqual(doc, list(values))
+
+    def test_raw_elements(self):
+        doc = ' [ {"a": [1, 2]} ,\n"x\\"",3.5e2]'
+        self.assertEqual([({'a': [1, 2]}, '{"a": [1, 2]}'),
+                          ('x"', '"x\\""'),
+                          (350.0, '3.5e2')],
+                         list(_stream(doc, 2).iter_with_raw()))
+        self.assertEqual(({'a': 1}, '{"a" : 1}'),
+                         _stream(' {"a" : 1} ').read_value_with_raw())
+
+    def test_number_split_at_read_boundary(self):
+        self.assertEqual([123456, 7], list(_stream(' [123456 , 7] ', 4)))
+        doc = '[1.5, 10.5,2, 1e5,-2.25E-3 ,{"value":0.125e+2}, -7]'
+        expected = [1.5, 10.5, 2, 1e5, -2.25E-3, {'value': 12.5}, -7]
+        for read_size in range(1, len(doc) + 1):
+            self.assertEqual(expected, list(_stream(doc, read_size)))
+            self.assertEqual(-2.25E-3, _stream('-2.25E-3',
+                                               read_size).read_value())
+
+    def test_deeply_nested(self):
+        doc = '[1, [[[[[[[["]"]]]]]]]], {"a": [[[[[{}]]]]]}]'
+        self.assertEqual(['1', '[[[[[[[["]"]]]]]]]]', '{"a": [[[[[{}]]]]]}'],
+                         json_stream.split_array(doc))
+
+    def test_empty_array(self):
+        self.assertEqual([], list(_stream(' [ ] ')))
+
+    def test_single_value(self):
+        values = _stream('{"name": "a", "value": 1}')
+        self.assertFalse(values.is_array())
+        self.assertEqual({'name': 'a', 'value': 1}, values.read_value())
+
+    def test_malformed_array(self):
+        for doc in ('[1, 2', '[1 2]', '[1,]', '[1] x'):
+            self.assertRaises(ValueError, list, _stream(doc))
+
+    def test_malformed_value(self):
+        for doc in ('{"a": 1} 2', '{"a": ', ''):
+            self.assertRaises(ValueError, _stream(doc).read_value)
+
+    def test_concatenated_values(self):
+        self.assertEqual([{'name': 'a', 'points': [[1, 2]]}, {'name': 'b'}],
+                         list(_stream('{"name": "a", "points": [[1, 2]]}'
+                                      '{"name": "b"}\n').iter_values()))
+        self.assertEqual([], list(_stream(' ').iter_values()))
+        self.assertRaises(ValueError, list,
+                          _stream('{"name": "a"}{"name"').iter_values())
+
+
+class TestSplitArray(unittest.TestCase):
+
+    def test_split(self):
+        doc = (' [ {"a": [1, {"b": "],}{"}]} ,\n"x\\",\\"" , 3.5e2,'
+               '[],{}, null]  ')
+        self.assertEqual(['{"a": [1, {"b": "],}{"}]}', '"x\\",\\""',
+                          '3.5e2', '[]', '{}', 'null'],
+                         json_stream.split_array(doc))
+
+    def test_same_elements_as_decoding(self):
+        doc = [{'name': u'千', 'dimensions': {'k': 'v,]'}, 'value': 1.5},
+               [1, [2, [3]]], 'x', 7]
+        text = json.dumps(doc)
+        self.assertEqual(doc, [json.loads(element) for element in
+                               json_stream.split_array(text)])
+
+    def test_deeply_nested(self):
+        doc = '[1, [[[[[[[["]"]]]]]]]], {"a": [[[[[{}]]]]]}]'
+        self.assertEqual(['1', '[[[[[[[["]"]]]]]]]]', '{"a": [[[[[{}]]]]]}'],
+                         json_stream.split_array(doc))
+
+    def test_empty_array(self):
+        self.assertEqual([], json_stream.split_array(' [ ] '))
+
+    def test_starts_array(self):
+        self.assertTrue(json_stream.starts_array(' \n[1]'))
+        self.assertFalse(json_stream.starts_array('{"a": [1]}'))
+        self.assertFalse(json_stream.starts_array(''))
+
+    def test_malformed(self):
+        for doc in ('{"a": 1}', '[1, 2', '[1,]', '[,1]', '[1,,2]', '[1] x',
+                    '[{]}', '["abc, 1]', '[1]]', ''):
+            self.assertRaises(ValueError, json_stream.split_array, doc)
+
+    def test_invalid_elements(self):
+        for doc in ('[{"a": 1}, garbage]', '[1 2]', '[{"a" 1}]', '[[1,]]',
+                    '[tru]', '["a" "b"]'):
+            self.assertRaises(ValueError, json_stream.split_array, doc)
@@ -0,0 +1,189 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import threading
+import time
+import unittest
+
+from kafka import client
+from kafka import codec
+from kafka import common
+from kafka import protocol
+import mock
+
+from monasca.common import circuit_breaker
+from monasca.common import kafka_client
+
+
+class TestClientRegistry(unittest.TestCase):
+
+    def test_shared_per_uri(self):
+        first = kafka_client.get_client('registry-a:9092', 1, 1)
+        self.assertIs(first, kafka_client.get_client('registry-a:9092', 1, 1))
+        self.assertIsNot(first,
+                         kafka_client.get_client('registry-b:9092', 1, 1))
+
+    def test_reset_after_fork(self):
+        parent = kafka_client.get_client('registry-fork:9092', 1, 1)
+        with mock.patch.object(os, 'getpid', return_value=-1):
+            child = kafka_client.get_client('registry-fork:9092', 1, 1)
+            self.assertIsNot(parent, child)
+            self.assertIs(child,
+                          kafka_client.get_client('registry-fork:9092', 1, 1))
+
+
+class TestResolveCodec(unittest.TestCase):
+
+    def test_codecs(self):
+        self.assertEqual(protocol.CODEC_NONE,
+                         kafka_client.resolve_codec('none'))
+        self.assertEqual(protocol.CODEC_NONE, kafka_client.resolve_codec(None))
+        self.assertEqual(protocol.CODEC_GZIP,
+                         kafka_client.resolve_codec('GZIP'))
+        self.assertRaises(ValueError, kafka_client.resolve_codec, 'zip')
+
+    def test_unavailable_codec_falls_back(self):
+        with mock.patch.object(codec, 'has_snappy', return_value=False):
+            self.assertEqual(protocol.CODEC_NONE,
+                             kafka_client.resolve_codec('snappy'))
+
+
+class FakeKafkaClient(object):
+    """A KafkaClient whose metadata loads wait for loads_proceed."""
+
+    loads_started = None
+    loads_proceed = None
+
+    def __init__(self, hosts):
+        self.brokers = {0: 'broker-0'}
+        self.topic_partitions = {'metrics': [0, 1]}
+        self.topics_to_brokers = {}
+        self.closed = False
+
+    def copy(self):
+        return FakeKafkaClient(None)
+
+    def load_metadata_for_topics(self, *topics):
+        FakeKafkaClient.loads_started.set()
+        FakeKafkaClient.loads_proceed.wait(5)
+        self.brokers = {1: 'broker-1'}
+        self.topic_partitions = {'metrics': [0, 1, 2]}
+
+    def close(self):
+        self.closed = True
+
+
+class TestReconnectingClientCopies(unittest.TestCase):
+
+    def setUp(self):
+        FakeKafkaClient.loads_started = threading.Event()
+        FakeKafkaClient.loads_proceed = threading.Event()
+        patcher = mock.patch.object(client, 'KafkaClient', FakeKafkaClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(FakeKafkaClient.loads_proceed.set)
+
+    def test_copies_in_use_do_not_block_others(self):
+        shared = kafka_client.ReconnectingClient('copies:9092', 'copies', 3,
+                                                 1)
+        shared._reconnect()
+        busy = shared.acquire()
+        loading = threading.Thread(target=busy.load_metadata_for_topics,
+                                   args=('metrics',))
+        loading.start()
+        self.assertTrue(FakeKafkaClient.loads_started.wait(5))
+
+        # the first copy is still loading, another one is handed out.
+        other = shared.acquire()
+        self.assertIsNot(busy, other)
+        shared.release(other)
+        self.assertIs(other, shared.acquire())
+        shared.release(other)
+
+        FakeKafkaClient.loads_proceed.set()
+        loading.join(5)
+        shared.release(busy)
+        # the metadata the copy loaded is handed to the next copies.
+        kafka = shared.acquire()
+        self.assertEqual({1: 'broker-1'}, kafka.brokers)
+        self.assertEqual([0, 1, 2], kafka.topic_partitions['metrics'])
+
+    def test_refresh_does_not_block_requests(self):
+        shared = kafka_client.ReconnectingClient('refresh:9092', 'refresh', 3,
+                                                 1, 0.01)
+        shared._reconnect()
+        shared.release(shared.acquire())
+        self.assertTrue(FakeKafkaClient.loads_started.wait(5))
+        kafka = shared.acquire()
+        self.assertEqual([0, 1], kafka.topic_partitions['metrics'])
+        shared.release(kafka)
+
+        # closing stops the refresh once its load is done.
+        shared.close()
+        FakeKafkaClient.loads_proceed.set()
+        deadline = time.time() + 5
+        while shared._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(shared._refreshing)
+
+    def test_refresh_does_not_take_the_half_open_trial(self):
+        shared = kafka_client.ReconnectingClient('trial:9092', 'trial', 1,
+                                                 1, 0.01)
+        shared._reconnect()
+        shared.breaker._set_state(circuit_breaker.HALF_OPEN)
+        self.assertTrue(FakeKafkaClient.loads_started.wait(5))
+        FakeKafkaClient.loads_proceed.set()
+
+        # the refresh ran, the trial request is still left for a publish.
+        kafka = shared.acquire()
+        shared.success()
+        shared.release(kafka)
+        self.assertEqual(circuit_breaker.CLOSED, shared.breaker.state)
+        shared.close()
+        deadline = time.time() + 5
+        while shared._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_copies_of_a_replaced_client_are_closed(self):
+        shared = kafka_client.ReconnectingClient('replaced:9092', 'replaced',
+                                                 3, 1)
+        shared._reconnect()
+        idle = shared.acquire()
+        busy = shared.acquire()
+        shared.release(idle)
+        shared._reconnect()
+        self.assertTrue(idle.closed)
+        shared.release(busy)
+        self.assertTrue(busy.closed)
+        self.assertIsNot(busy, shared.acquire())
+
+    def test_connects_in_the_background(self):
+        connects = threading.Event()
+
+        def connect(hosts):
+            self.assertTrue(connects.wait(5))
+            return FakeKafkaClient(hosts)
+
+        shared = kafka_client.ReconnectingClient('background:9092',
+                                                 'background', 3, 1)
+        with mock.patch.object(client, 'KafkaClient', side_effect=connect):
+            # requests fail fast while the connection is made.
+            self.assertRaises(common.KafkaUnavailableError, shared.get)
+            self.assertRaises(common.KafkaUnavailableError, shared.acquire)
+            connects.set()
+            deadline = time.time() + 5
+            while shared.client is None and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertIsInstance(shared.get(), FakeKafkaClient)
@@ -0,0 +1,254 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import unittest
+
+from kafka import common
+from kafka import protocol
+import mock
+from oslo.config import cfg
+
+from monasca.common import instrumentation
+from monasca.common import kafka_client
+from monasca.common import kafka_conn
+from monasca.common.messaging import exceptions
+from monasca.common.messaging import kafka_publisher
+import monasca.v2.reference  # noqa
+
+
+class TestKafkaPublisherCompression(unittest.TestCase):
+
+    def setUp(self):
+        # no connection is made, the tests give the publisher its client.
+        patcher = mock.patch.object(kafka_client.ReconnectingClient,
+                                    'connect')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cfg.CONF.set_override('uri', 'localhost:9092', 'kafka')
+        cfg.CONF.set_override('async', False, 'kafka')
+        cfg.CONF.set_override('compression', 'gzip', 'kafka')
+
+    def tearDown(self):
+        cfg.CONF.clear_override('uri', 'kafka')
+        cfg.CONF.clear_override('async', 'kafka')
+        cfg.CONF.clear_override('compression', 'kafka')
+
+    def test_gzip_message_set(self):
+        publisher = kafka_publisher.KafkaPublisher('compressed')
+        kafka = mock.Mock()
+        kafka.topic_partitions = {'compressed': [0, 1]}
+        kafka.send_produce_request.return_value = []
+        messages = [json.dumps({'metric': {'name': 'cpu', 'value': i},
+                                'meta': {'tenantId': 't', 'region': 'r'}})
+                    for i in range(100)]
+        with mock.patch.object(kafka_client.ReconnectingClient, 'acquire',
+                               return_value=kafka):
+            publisher.send_messages(messages)
+
+        requests = kafka.send_produce_request.call_args[0][0]
+        self.assertEqual(1, len(requests))
+        message_set = requests[0].messages
+        self.assertEqual(1, len(message_set))
+        self.assertEqual(protocol.CODEC_GZIP,
+                         message_set[0].attributes & protocol.CODEC_GZIP)
+
+        stats = instrumentation.snapshot()
+        prefix = 'publisher.kafka.compressed'
+        self.assertEqual(sum(len(message) for message in messages),
+                         stats[prefix + '.uncompressed_bytes']['count'])
+        self.assertEqual(len(message_set[0].value),
+                         stats[prefix + '.compressed_bytes']['count'])
+        self.assertTrue(stats[prefix + '.compression_ratio']['value'] > 5)
+
+
+class TestKafkaPublisherReroute(unittest.TestCase):
+
+    def setUp(self):
+        # no connection is made, the tests give the publisher its client.
+        patcher = mock.patch.object(kafka_client.ReconnectingClient,
+                                    'connect')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cfg.CONF.set_override('uri', 'localhost:9092', 'kafka')
+        cfg.CONF.set_override('async', False, 'kafka')
+        cfg.CONF.set_override('keyed', True, 'kafka')
+
+    def tearDown(self):
+        cfg.CONF.clear_override('uri', 'kafka')
+        cfg.CONF.clear_override('async', 'kafka')
+        cfg.CONF.clear_override('keyed', 'kafka')
+
+    def _send(self, publisher, kafka):
+        with mock.patch.object(kafka_client.ReconnectingClient, 'acquire',
+                               return_value=kafka):
+            publisher.send_messages(['a', 'b', 'c', 'd'],
+                                    ['k1', 'k2', 'k3', 'k4'])
+
+    def _responses(self, *errors):
+        def send(requests, **kwargs):
+            return [common.ProduceResponse(request.topic, request.partition,
+                                           errors[i] if i < len(errors)
+                                           else 0, 0)
+                    for i, request in enumerate(requests)]
+        return send
+
+    def test_leader_moved(self):
+        publisher = kafka_publisher.KafkaPublisher('rerouted')
+        kafka = mock.Mock()
+        kafka.topic_partitions = {'rerouted': [0, 1]}
+        calls = []
+
+        def send(requests, **kwargs):
+            calls.append([request.partition for request in requests])
+            error = common.NotLeaderForPartitionError.errno
+            return self._responses(*([0, error] if len(calls) == 1
+                                     else []))(requests)
+        kafka.send_produce_request.side_effect = send
+        self._send(publisher, kafka)
+
+        self.assertEqual(2, len(calls))
+        self.assertEqual(calls[0][1:], calls[1])
+        kafka.load_metadata_for_topics.assert_called_with('rerouted')
+        self.assertEqual(1, instrumentation.counter(
+            'publisher.kafka.rerouted.rerouted').count)
+
+    def test_leader_still_unavailable(self):
+        publisher = kafka_publisher.KafkaPublisher('unavailable')
+        kafka = mock.Mock()
+        kafka.topic_partitions = {'unavailable': [0, 1]}
+        kafka.send_produce_request.side_effect = common.LeaderUnavailableError
+        self.assertRaises(exceptions.MessageQueueException,
+                          self._send, publisher, kafka)
+        self.assertEqual(2, kafka.send_produce_request.call_count)
+
+
+class TestKafkaPublisherSplit(unittest.TestCase):
+
+    def setUp(self):
+        # no connection is made, the tests give the publisher its client.
+        patcher = mock.patch.object(kafka_client.ReconnectingClient,
+                                    'connect')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cfg.CONF.set_override('uri', 'localhost:9092', 'kafka')
+        cfg.CONF.set_override('async', False, 'kafka')
+        cfg.CONF.set_override('max_message_bytes', 100, 'kafka')
+        cfg.CONF.set_override('dead_letter_topic', 'dead-letter', 'kafka')
+
+    def tearDown(self):
+        cfg.CONF.clear_override('uri', 'kafka')
+        cfg.CONF.clear_override('async', 'kafka')
+        cfg.CONF.clear_override('max_message_bytes', 'kafka')
+        cfg.CONF.clear_override('dead_letter_topic', 'kafka')
+
+    def _kafka(self, topic, max_size=None):
+        kafka = mock.Mock()
+        kafka.topic_partitions = {topic: [0], 'dead-letter': [0, 1]}
+        self.sent = []
+
+        def send(requests, **kwargs):
+            responses = []
+            for request in requests:
+                size = sum(len(message.value) for message in request.messages)
+                error = 0
+                if max_size is not None and size > max_size:
+                    error = common.MessageSizeTooLargeError.errno
+                else:
+                    self.sent.append((request.topic,
+                                      [message.value for message in
+                                       request.messages]))
+                responses.append(common.ProduceResponse(
+                    request.topic, request.partition, error, 0))
+            return responses
+        kafka.send_produce_request.side_effect = send
+        return kafka
+
+    def _send(self, publisher, kafka, messages):
+        with mock.patch.object(kafka_client.ReconnectingClient, 'acquire',
+                               return_value=kafka):
+            publisher.send_messages(messages)
+
+    def test_split_by_size(self):
+        publisher = kafka_publisher.KafkaPublisher('split')
+        messages = ['%02d' % i + 'x' * 18 for i in range(5)]
+        big = 'y' * 200
+        self._send(publisher, self._kafka('split'), messages + [big])
+
+        self.assertEqual([('split', messages[:2]), ('split', messages[2:4]),
+                          ('split', messages[4:])], self.sent[:3])
+        self.assertEqual('dead-letter', self.sent[3][0])
+        self.assertEqual(big, protocol.gzip_decode(self.sent[3][1][0])[-200:])
+        stats = instrumentation.snapshot()
+        self.assertEqual(1, stats['publisher.kafka.split.split']['count'])
+        self.assertEqual(
+            1, stats['publisher.kafka.split.dead_lettered']['count'])
+
+    def test_rejected_by_broker(self):
+        cfg.CONF.set_override('max_message_bytes', 1000, 'kafka')
+        publisher = kafka_publisher.KafkaPublisher('rejected')
+        messages = ['a' * 30, 'b' * 30, 'c' * 60]
+        self._send(publisher, self._kafka('rejected', max_size=50),
+                   messages)
+
+        self.assertEqual([('rejected', ['a' * 30]), ('rejected', ['b' * 30])],
+                         self.sent[:2])
+        self.assertEqual(['dead-letter'], [topic for topic, _ in
+                                           self.sent[2:]])
+        self.assertEqual(1, instrumentation.counter(
+            'publisher.kafka.rejected.dead_lettered').count)
+
+    def test_no_dead_letter_topic(self):
+        cfg.CONF.set_override('dead_letter_topic', '', 'kafka')
+        publisher = kafka_publisher.KafkaPublisher('too_large')
+        kafka = self._kafka('too_large')
+        self.assertRaises(exceptions.MessageQueueException, self._send,
+                          publisher, kafka, ['z' * 200])
+        self.assertEqual(0, kafka.send_produce_request.call_count)
+
+
+class TestKafkaConnectionSendMessages(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(kafka_client.ReconnectingClient,
+                                    'connect')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cfg.CONF.set_override('uri', 'localhost:9092', 'kafka')
+        cfg.CONF.set_override('async', False, 'kafka')
+        cfg.CONF.set_override('compact', False, 'kafka')
+        self.kafka = mock.Mock()
+        self.kafka.topic_partitions = {'metrics': [0]}
+        self.kafka.send_produce_request.return_value = []
+        patcher = mock.patch.object(kafka_client.ReconnectingClient,
+                                    'acquire', return_value=self.kafka)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cfg.CONF.clear_override('uri', 'kafka')
+        cfg.CONF.clear_override('async', 'kafka')
+        cfg.CONF.clear_override('compact', 'kafka')
+
+    def test_array_elements_are_sent(self):
+        conn = kafka_conn.KafkaConnection('metrics')
+        self.assertEqual(204, conn.send_messages('[{"a": 1}, {"b": 2}]'))
+        request = self.kafka.send_produce_request.call_args[0][0][0]
+        self.assertEqual(['{"a": 1}', '{"b": 2}'],
+                         [m.value for m in request.messages])
+
+    def test_invalid_element_is_not_acceptable(self):
+        conn = kafka_conn.KafkaConnection('metrics')
+        self.assertEqual(406, conn.send_messages('[{"a": 1}, garbage]'))
+        self.assertFalse(self.kafka.send_produce_request.called)
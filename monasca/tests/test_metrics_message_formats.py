@@ -0,0 +1,85 @@
+# -*- coding: utf8 -*-
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import unittest
+
+from oslo.config import cfg
+
+from monasca.common.messaging.message_formats.identity import (
+    metrics as identity_metrics)
+from monasca.common.messaging.message_formats import (
+    metrics_transform_factory)
+from monasca.common.messaging.message_formats.reference import (
+    metrics as reference_metrics)
+from monasca.common.messaging import rabbitmq_publisher
+import monasca.v2.reference  # noqa
+
+METRICS = [{u'name': u'千', u'dimensions': {u'千': u'千'},
+            u'timestamp': 1405630174, u'value': 1.5},
+           {u'name': u'cpu', u'timestamp': 1405630175, u'value': 2}]
+
+RAW_METRICS = [json.dumps(metric, ensure_ascii=False).encode('utf8')
+               for metric in METRICS]
+
+
+class TestReferenceMetrics(unittest.TestCase):
+
+    def test_serialize_splices_raw_metrics(self):
+        messages = reference_metrics.serialize(METRICS, RAW_METRICS,
+                                               u'tenant', u'useast')
+        self.assertEqual(2, len(messages))
+        for metric, raw, message in zip(METRICS, RAW_METRICS, messages):
+            self.assertIn(raw, message)
+            envelope = json.loads(message)
+            self.assertEqual(metric, envelope['metric'])
+            self.assertEqual({'tenantId': 'tenant', 'region': 'useast'},
+                             envelope['meta'])
+            self.assertIn('creation_time', envelope)
+
+    def test_serialize_without_raw_metric(self):
+        message, = reference_metrics.serialize(METRICS[0], None, u'tenant',
+                                               u'useast')
+        self.assertEqual(METRICS[0], json.loads(message)['metric'])
+
+    def test_transform_does_not_share_envelopes(self):
+        transformed = reference_metrics.transform(METRICS, 'tenant', 'useast')
+        self.assertEqual(METRICS, [t['metric'] for t in transformed])
+
+
+class TestIdentityMetrics(unittest.TestCase):
+
+    def test_serialize(self):
+        self.assertEqual(RAW_METRICS,
+                         identity_metrics.serialize(METRICS, RAW_METRICS,
+                                                    'tenant', 'useast'))
+        self.assertEqual([json.dumps(METRICS[1])],
+                         identity_metrics.serialize(METRICS[1], None,
+                                                    'tenant', 'useast'))
+
+
+class TestUnimplemented(unittest.TestCase):
+
+    def tearDown(self):
+        cfg.CONF.clear_override('metrics_message_format', 'messaging')
+
+    def test_cadf_is_rejected_when_loaded(self):
+        cfg.CONF.set_override('metrics_message_format', 'cadf', 'messaging')
+        self.assertRaises(NotImplementedError,
+                          metrics_transform_factory.create_metrics_serializer)
+
+    def test_rabbitmq_is_rejected_when_loaded(self):
+        self.assertRaises(NotImplementedError,
+                          rabbitmq_publisher.RabbitmqPublisher, 'metrics')
@@ -0,0 +1,94 @@
+# -*- coding: utf8 -*-
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import copy
+import random
+import unittest
+
+from monasca.v2.common.schemas import dimensions_schema
+from monasca.v2.common.schemas import exceptions
+from monasca.v2.common.schemas import metrics_request_body_schema as schema
+
+VALID_METRIC = {'name': 'cpu.idle_perc',
+                'dimensions': {'hostname': 'host-1', u'千': u'千'},
+                'timestamp': 1405630174,
+                'value': 99.5}
+
+FIELD_VALUES = ['', 'a', u'千', 'a' * 64, 'a' * 65, u'千' * 255, 'a' * 256,
+                0, 1, -1, 1.5, -0.5, float('nan'), float('inf'), 10 ** 20,
+                True, False, None, [], {}, {'a': 'b'}, {'a': 1}, {1: 'a'},
+                {'a' * 256: 'a'}, {'a': 'a' * 256}, [VALID_METRIC]]
+
+
+def _reference_error(msg):
+    try:
+        schema.validate_reference(msg)
+    except exceptions.ValidationException as ex:
+        return str(ex)
+    return None
+
+
+def _error(msg):
+    try:
+        schema.validate(msg)
+    except exceptions.ValidationException as ex:
+        return str(ex)
+    return None
+
+
+def _metric_variants():
+    yield copy.deepcopy(VALID_METRIC)
+    for key in VALID_METRIC.keys() + ['extra', 1, u'name']:
+        metric = copy.deepcopy(VALID_METRIC)
+        if key in metric:
+            metric.pop(key)
+            yield copy.deepcopy(metric)
+        for value in FIELD_VALUES:
+            metric[key] = value
+            yield copy.deepcopy(metric)
+
+
+class TestMetricsRequestBodySchema(unittest.TestCase):
+
+    def _assert_equivalent(self, msg):
+        expected = _reference_error(msg)
+        self.assertEqual(expected is None, schema.is_valid(msg), repr(msg))
+        self.assertEqual(expected, _error(msg), repr(msg))
+
+    def test_single_metric(self):
+        for metric in _metric_variants():
+            self._assert_equivalent(metric)
+
+    def test_metric_list(self):
+        variants = list(_metric_variants())
+        rand = random.Random(42)
+        self._assert_equivalent([])
+        for _ in range(500):
+            self._assert_equivalent(
+                rand.sample(variants, rand.randint(1, 4)))
+
+    def test_not_a_metric(self):
+        for msg in FIELD_VALUES + [[1], [[]], [None, VALID_METRIC]]:
+            self._assert_equivalent(msg)
+
+    def test_dimensions(self):
+        for dimensions in FIELD_VALUES:
+            try:
+                dimensions_schema.dimensions_schema(dimensions)
+                valid = True
+            except Exception:
+                valid = False
+            self.assertEqual(valid, dimensions_schema.is_valid(dimensions),
+                             repr(dimensions))
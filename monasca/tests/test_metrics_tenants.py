@@ -0,0 +1,94 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import unittest
+
+import falcon
+from falcon import testing
+import mock
+
+from monasca.v2.reference import metrics
+
+
+def _metric(name, tenant_id=None):
+    metric = {'name': name, 'timestamp': 1, 'value': 2}
+    if tenant_id is not None:
+        metric['tenant_id'] = tenant_id
+    return metric
+
+
+class TestGroupByTenant(unittest.TestCase):
+
+    def test_group_by_tenant(self):
+        body = [_metric('a', 't1'), _metric('b'), _metric('c', 't2'),
+                _metric('d', 't1')]
+        raw = ['ra', 'rb', 'rc', 'rd']
+        tenants = metrics.group_by_tenant(body, raw, 'default')
+
+        self.assertEqual(['t1', 'default', 't2'], tenants.keys())
+        self.assertEqual(([_metric('a'), _metric('d')], [None, None]),
+                         tenants['t1'])
+        self.assertEqual(([_metric('b')], ['rb']), tenants['default'])
+        self.assertEqual(([_metric('c')], [None]), tenants['t2'])
+        # the tenant_id is removed so the metrics pass validation.
+        self.assertEqual(_metric('a'), body[0])
+
+    def test_single_metric(self):
+        tenants = metrics.group_by_tenant(_metric('a', 't1'), 'ra', 'x')
+        self.assertEqual({'t1': ([_metric('a')], [None])}, dict(tenants))
+
+    def test_invalid_tenant_id(self):
+        for tenant_id in ('', 5, None):
+            metric = _metric('a')
+            metric['tenant_id'] = tenant_id
+            self.assertRaises(falcon.HTTPBadRequest, metrics.group_by_tenant,
+                              [metric], ['ra'], 'x')
+
+
+class TestPostMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.resource = metrics.Metrics.__new__(metrics.Metrics)
+        self.resource._region = 'region'
+        self.resource._delegate_authorized_roles = ['monitoring-delegate']
+        self.resource._post_metrics_authorized_roles = ['monasca-agent']
+        self.resource._metrics_chunk_size = 2
+        self.resource._metrics_serializer = (
+            lambda values, raw_values, tenant_id, region: raw_values)
+        self.resource._message_queue = mock.Mock()
+        self.resource._keyed = False
+
+    def _post(self, body):
+        environ = testing.create_environ(
+            '/v2.0/metrics/', method='POST', body=json.dumps(body),
+            headers={'Content-Type': 'application/json',
+                     'X-ROLES': 'monasca-agent', 'X-TENANT-ID': 't'})
+        res = falcon.Response()
+        self.resource.do_post_metrics(falcon.Request(environ), res)
+        return res
+
+    def test_body_is_published_once(self):
+        body = [_metric(name) for name in 'abcde']
+        self.assertEqual(falcon.HTTP_204, self._post(body).status)
+        send_messages = self.resource._message_queue.send_messages
+        self.assertEqual(1, send_messages.call_count)
+        messages, keys = send_messages.call_args[0]
+        self.assertEqual(body, [json.loads(message) for message in messages])
+        self.assertIsNone(keys)
+
+    def test_nothing_published_when_a_later_chunk_is_invalid(self):
+        body = [_metric(name) for name in 'abcd'] + [{'name': 'e'}]
+        self.assertRaises(falcon.HTTPBadRequest, self._post, body)
+        self.assertFalse(self.resource._message_queue.send_messages.called)
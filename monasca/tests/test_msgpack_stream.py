@@ -0,0 +1,74 @@
+# -*- coding: utf8 -*-
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import StringIO
+import unittest
+
+from monasca.common import json_stream
+from monasca.common import msgpack_stream
+
+msgpack = msgpack_stream.msgpack
+
+
+def _stream(doc, read_size=3):
+    return msgpack_stream.MsgpackStream(StringIO.StringIO(doc), read_size)
+
+
+@unittest.skipUnless(msgpack_stream.is_available(), 'msgpack not installed')
+class TestMsgpackStream(unittest.TestCase):
+
+    def test_array_elements_across_reads(self):
+        doc = [{'name': u'千', 'value': 12345.5}, 7, [1, 2], 'x']
+        for read_size in (1, 2, 3, 7, 1024):
+            values = _stream(msgpack.packb(doc), read_size)
+            self.assertTrue(values.is_array())
+            self.assertEqual(doc, list(values))
+
+    def test_same_values_as_json(self):
+        doc = [{'name': u'cpu.idle_perc',
+                'dimensions': {u'hostname': u'h\xe9llo'},
+                'timestamp': 1405630174,
+                'value': 1.5}] * 20
+        from_json = list(json_stream.JSONStream(
+            StringIO.StringIO(json.dumps(doc))))
+        from_msgpack = list(_stream(msgpack.packb(doc, use_bin_type=False)))
+        self.assertEqual(from_json, from_msgpack)
+        self.assertTrue(isinstance(from_msgpack[0]['name'], unicode))
+
+    def test_large_array(self):
+        doc = range(70000)
+        self.assertEqual(doc, list(_stream(msgpack.packb(doc), 4096)))
+
+    def test_empty_array(self):
+        self.assertEqual([], list(_stream(msgpack.packb([]))))
+
+    def test_single_value(self):
+        values = _stream(msgpack.packb({'name': 'a', 'value': 1}))
+        self.assertFalse(values.is_array())
+        self.assertEqual({'name': 'a', 'value': 1}, values.read_value())
+
+    def test_malformed_array(self):
+        for doc in (msgpack.packb([1, 2])[:-1],
+                    msgpack.packb([1]) + msgpack.packb(2),
+                    msgpack.packb(1)):
+            self.assertRaises(ValueError, list, _stream(doc))
+
+    def test_malformed_value(self):
+        for doc in (msgpack.packb({'a': 1}) + '\x01',
+                    msgpack.packb({'a': 'bc'})[:-1],
+                    '',
+                    '\xc1'):
+            self.assertRaises(ValueError, _stream(doc).read_value)
@@ -0,0 +1,124 @@
+# -*- coding: utf8 -*-
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+import mock
+from oslo.config import cfg
+
+from monasca.common import kafka_client
+from monasca.common.messaging import kafka_publisher
+from monasca.common.messaging import partitioning
+import monasca.v2.reference  # noqa
+
+
+class TestPartitioning(unittest.TestCase):
+
+    def test_series_key_ignores_dimension_order(self):
+        first = {'name': 'cpu', 'dimensions': {'a': '1', 'b': '2'}}
+        second = {'dimensions': {'b': '2', 'a': '1'}, 'name': 'cpu'}
+        self.assertEqual(partitioning.series_key(first, 't', 'r'),
+                         partitioning.series_key(second, 't', 'r'))
+
+    def test_series_key_identity(self):
+        metric = {'name': 'cpu', 'dimensions': {'a': '1'}}
+        keys = set([partitioning.series_key(metric, 't', 'r'),
+                    partitioning.series_key(metric, 'u', 'r'),
+                    partitioning.series_key(metric, 't', 's'),
+                    partitioning.series_key({'name': 'mem',
+                                             'dimensions': {'a': '1'}},
+                                            't', 'r'),
+                    partitioning.series_key({'name': 'cpu',
+                                             'dimensions': {'a': '2'}},
+                                            't', 'r'),
+                    partitioning.series_key({'name': 'cpu'}, 't', 'r')])
+        self.assertEqual(6, len(keys))
+
+    def test_series_key_unicode(self):
+        metric = {'name': u'caf\xe9', 'dimensions': {u'k': u'☃'}}
+        key = partitioning.series_key(metric, u't', u'r')
+        self.assertTrue(isinstance(key, str))
+
+    def test_partition_is_stable(self):
+        partitions = range(8)
+        # zlib.crc32('abc') is 0x352441c2.
+        self.assertEqual(0x352441c2 % 8,
+                         partitioning.partition('abc', partitions))
+
+
+class TestKeyedKafkaPublisher(unittest.TestCase):
+
+    def setUp(self):
+        # no connection is made, the tests give the publisher its client.
+        patcher = mock.patch.object(kafka_client.ReconnectingClient,
+                                    'connect')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cfg.CONF.set_override('uri', 'localhost:9092', 'kafka')
+        cfg.CONF.set_override('keyed', True, 'kafka')
+        cfg.CONF.set_override('async', False, 'kafka')
+
+    def tearDown(self):
+        cfg.CONF.clear_override('uri', 'kafka')
+        cfg.CONF.clear_override('keyed', 'kafka')
+        cfg.CONF.clear_override('async', 'kafka')
+
+    def test_messages_of_a_series_go_to_one_partition(self):
+        publisher = kafka_publisher.KafkaPublisher('metrics')
+        kafka = mock.Mock()
+        kafka.topic_partitions = {'metrics': range(4)}
+        kafka.send_produce_request.return_value = []
+
+        keys = ['series-%d' % (i % 5) for i in range(50)]
+        messages = ['%s %d' % (key, i) for i, key in enumerate(keys)]
+        with mock.patch.object(kafka_client.ReconnectingClient, 'acquire',
+                               return_value=kafka):
+            publisher.send_messages(messages, keys)
+
+        requests = kafka.send_produce_request.call_args[0][0]
+        self.assertEqual(1, kafka.send_produce_request.call_count)
+        self.assertEqual(len(set(request.partition for request in requests)),
+                         len(requests))
+        for request in requests:
+            sent = [message.value for message in request.messages]
+            series = set(message.split()[0] for message in sent)
+            for name in series:
+                self.assertEqual(
+                    request.partition,
+                    partitioning.partition(name, range(4)))
+            self.assertEqual(sent, [message for message in messages
+                                    if message.split()[0] in series])
+
+    def test_messages_without_keys_are_spread(self):
+        publisher = kafka_publisher.KafkaPublisher('events')
+        kafka = mock.Mock()
+        kafka.topic_partitions = {'events': range(4)}
+        kafka.send_produce_request.return_value = []
+
+        with mock.patch.object(kafka_client.ReconnectingClient, 'acquire',
+                               return_value=kafka):
+            for i in range(8):
+                publisher.send_message('event %d' % i)
+            publisher.send_messages(['a', 'b', 'c'], ['cpu', None, None])
+
+        partitions = [call[0][0][0].partition for call in
+                      kafka.send_produce_request.call_args_list[:8]]
+        self.assertEqual([1, 2, 3, 0, 1, 2, 3, 0], partitions)
+        requests = kafka.send_produce_request.call_args[0][0]
+        sent = dict((request.partition,
+                     [message.value for message in request.messages])
+                    for request in requests)
+        self.assertEqual(['b', 'c'], sent[1])
+        self.assertEqual(['a'], sent[partitioning.partition('cpu', range(4))])
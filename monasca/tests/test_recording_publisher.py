@@ -0,0 +1,42 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import time
+import unittest
+
+from monasca.common.messaging import fake_publisher
+
+
+class TestRecordingPublisher(unittest.TestCase):
+
+    def test_ring_buffer(self):
+        publisher = fake_publisher.RecordingPublisher('test_ring', 3, 0)
+        publisher.send_messages(['a', 'bb'], ['k1', 'k2'])
+        publisher.send_messages(['ccc', 'dddd'])
+
+        self.assertEqual([('bb', 'k2'), ('ccc', None), ('dddd', None)],
+                         publisher.recorded())
+        self.assertEqual(2, publisher.sends.count)
+        self.assertEqual(4, publisher.messages.count)
+        self.assertEqual(10, publisher.bytes.count)
+
+        publisher.clear()
+        self.assertEqual([], publisher.recorded())
+
+    def test_latency(self):
+        publisher = fake_publisher.RecordingPublisher('test_latency', 10,
+                                                      0.05)
+        start = time.time()
+        publisher.send_message('a')
+        self.assertTrue(time.time() - start >= 0.05)
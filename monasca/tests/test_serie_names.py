@@ -0,0 +1,87 @@
+# -*- coding: utf8 -*-
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import random
+import unittest
+import urllib
+
+from monasca.common.repositories.influxdb import serie_names
+
+_ALPHABET = u'ab.-_ +%&?=千'
+
+
+def _quote(text):
+    return urllib.quote(text.encode('utf8'), safe='').decode('utf8')
+
+
+def _serie_name(rnd):
+    parts = [u''.join(rnd.choice(_ALPHABET) for _ in range(rnd.randint(0, 4)))
+             for _ in range(rnd.randint(3, 7))]
+    if rnd.random() < 0.5:
+        # well formed, every part url encoded.
+        return u'%s?%s&%s%s' % (
+            _quote(parts[0]), _quote(parts[1]), _quote(parts[2]),
+            u''.join(u'&%s=%s' % (_quote(part), _quote(part[::-1]))
+                     for part in parts[3:]))
+    # anything made of the separators, encoded parts and raw characters.
+    return u''.join(rnd.choice([part, _quote(part), u'?', u'&', u'='])
+                    for part in parts)
+
+
+def _outcome(decoder, serie_name):
+    try:
+        return decoder(serie_name)
+    except Exception as ex:
+        return type(ex)
+
+
+class TestSerieNames(unittest.TestCase):
+
+    def test_same_as_regexes(self):
+        rnd = random.Random(7)
+        names = [u'tenant?useast&%E5%8D%83&dim1=%E5%8D%83&dim2=%E5%8D%83',
+                 u'tenant?useast&cpu.idle_perc', u'tenant?useast&a+b&c=d+e',
+                 u'tenant?useast&cpu&host=a&host=b', u'tenant?useast&cpu&',
+                 u'tenant?useast&cpu&host', u'tenant?useast&cpu&x&host=a',
+                 u'tenant?useast&cpu&host=a&x', u'tenant?useast&cpu&a=b=c',
+                 u'tenant?useast&cpu&h=a?b', u'tenant?use?ast&cpu',
+                 u't=x?useast&cpu', u'?useast&cpu', u'tenant?useast', u'']
+        names.extend(_serie_name(rnd) for _ in range(5000))
+        for name in names:
+            self.assertEqual(
+                _outcome(serie_names.decode_with_regexes, name),
+                _outcome(serie_names.decode, name), name)
+
+    def test_cache(self):
+        decoded = []
+
+        def decoder(serie_name):
+            decoded.append(serie_name)
+            return serie_names.decode(serie_name)
+
+        cache = serie_names.DecodeCache(4, decoder)
+        first = cache.decode(u't?r&a')
+        self.assertIs(first, cache.decode(u't?r&a'))
+        cache.decode(u't?r&b')
+        cache.decode(u't?r&c')
+        # a moved from the previous generation to the current one.
+        cache.decode(u't?r&a')
+        cache.decode(u't?r&d')
+        cache.decode(u't?r&e')
+        cache.decode(u't?r&a')
+        cache.decode(u't?r&b')
+        self.assertEqual([u't?r&a', u't?r&b', u't?r&c', u't?r&d', u't?r&e',
+                          u't?r&b'], decoded)
+        self.assertIsNone(cache.decode(u'not a serie'))
@@ -0,0 +1,216 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import unittest
+import urllib
+
+import mock
+
+from monasca.common import instrumentation
+from monasca.common.repositories import constants
+from monasca.common.repositories.influxdb import metrics_repository
+from monasca.common.repositories.influxdb import series_catalogue
+import monasca.v2.reference  # noqa
+
+
+def _decode(serie_name):
+    parts = serie_name.split('&')
+    metric = {'name': parts[1], 'id': serie_name}
+    if len(parts) > 2:
+        metric['dimensions'] = dict(part.split('=') for part in parts[2:])
+    return metric
+
+
+class FakeSeries(object):
+
+    def __init__(self):
+        self.series = {}
+        self.recent = {}
+        self.loads = []
+        self.refreshes = 0
+        # when set, listings wait for it once they started.
+        self.proceed = None
+        self.started = threading.Event()
+
+    def _wait(self):
+        self.started.set()
+        if self.proceed is not None:
+            self.proceed.wait(5)
+
+    def list_series(self, tenant_id, region):
+        self.loads.append(tenant_id)
+        self._wait()
+        return list(self.series.get(tenant_id, ()))
+
+    def list_recent_series(self, tenant_id, region, start_timestamp):
+        self.refreshes += 1
+        self._wait()
+        return list(self.recent.get(tenant_id, ()))
+
+
+class TestSeriesCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeSeries()
+        self.fake.series['t1'] = ['t1?r&mem&host=a', 't1?r&cpu&host=b',
+                                  't1?r&cpu&host=a']
+        self.fake.series['t2'] = ['t2?r&cpu&host=c']
+        self.catalogue = self._catalogue()
+
+    def _catalogue(self, ttl=300, refresh_interval=30, max_bytes=1048576):
+        return series_catalogue.SeriesCatalogue(
+            self.fake.list_series, self.fake.list_recent_series, _decode,
+            ttl, refresh_interval, max_bytes)
+
+    def _ids(self, *args):
+        return [metric['id'] for metric in
+                self.catalogue.list_metrics('t1', 'r', *args)]
+
+    def test_filters(self):
+        hits = instrumentation.counter('series_catalogue.hits').count
+        self.assertEqual(['t1?r&cpu&host=a', 't1?r&cpu&host=b',
+                          't1?r&mem&host=a'], self._ids(None, None, None))
+        self.assertEqual(['t1?r&cpu&host=a', 't1?r&cpu&host=b'],
+                         self._ids('cpu', None, None))
+        self.assertEqual(['t1?r&cpu&host=a', 't1?r&mem&host=a'],
+                         self._ids(None, {'host': 'a'}, None))
+        self.assertEqual(['t1?r&cpu&host=b', 't1?r&mem&host=a'],
+                         self._ids(None, None, 't1%3Fr%26cpu%26host%3Db'))
+        self.assertEqual(['t1'], self.fake.loads)
+        self.assertEqual(hits + 3, instrumentation.counter(
+            'series_catalogue.hits').count)
+
+    def test_refresh_and_ttl(self):
+        with mock.patch('time.time', return_value=1000):
+            self._ids(None, None, None)
+        self.fake.recent['t1'] = ['t1?r&disk&host=a']
+        with mock.patch('time.time', return_value=1031):
+            self.assertIn('t1?r&disk&host=a', self._ids(None, None, None))
+        self.assertEqual(['t1'], self.fake.loads)
+
+        self.fake.series['t1'] = ['t1?r&cpu&host=a']
+        with mock.patch('time.time', return_value=1300):
+            self.assertEqual(['t1?r&cpu&host=a'],
+                             self._ids(None, None, None))
+        self.assertEqual(['t1', 't1'], self.fake.loads)
+
+    def test_eviction(self):
+        size = (len('t1?r&cpu&host=a') + series_catalogue.SERIES_OVERHEAD)
+        self.catalogue = self._catalogue(max_bytes=size * 3)
+        self.catalogue.list_metrics('t1', 'r', None, None, None)
+        self.catalogue.list_metrics('t2', 'r', None, None, None)
+        self.assertEqual(['t1', 't2'], self.fake.loads)
+        # t1 was used least recently, so it made room for t2.
+        self.catalogue.list_metrics('t2', 'r', None, None, None)
+        self.catalogue.list_metrics('t1', 'r', None, None, None)
+        self.assertEqual(['t1', 't2', 't1'], self.fake.loads)
+
+    def test_name_range_and_offset(self):
+        self.fake.series['t1'] = (
+            ['t1?r&cpu', 't1?r&cpu%20x&host=a', 't1?r&cpu.idle&host=a',
+             't1?r&cpu&host=a', 't1?r&cp&host=a'] +
+            ['t1?r&mem&host=%04d' % i for i in range(5000)])
+        self.assertEqual(['t1?r&cpu', 't1?r&cpu&host=a'],
+                         self._ids('cpu', None, None))
+        self.assertEqual(['t1?r&cpu&host=a'],
+                         self._ids('cpu', None, 't1%3Fr%26cpu%26'))
+
+        with mock.patch.object(series_catalogue.constants, 'PAGE_LIMIT', 3):
+            self.assertEqual(['t1?r&mem&host=4998', 't1?r&mem&host=4999'],
+                             self._ids('mem', None,
+                                       't1%3Fr%26mem%26host%3D4998'))
+            self.assertEqual(['t1?r&mem&host=0010', 't1?r&mem&host=0011',
+                              't1?r&mem&host=0012'],
+                             self._ids(None, None,
+                                       't1%3Fr%26mem%26host%3D0010'))
+
+    def _list_concurrently(self, count):
+        results = []
+
+        def list_metrics():
+            results.append(self._ids(None, None, None))
+
+        threads = [threading.Thread(target=list_metrics)
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_one_load_for_concurrent_listings(self):
+        self.fake.proceed = threading.Event()
+        threads, results = self._list_concurrently(5)
+        self.assertTrue(self.fake.started.wait(5))
+        self.fake.proceed.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(['t1'], self.fake.loads)
+        self.assertEqual([['t1?r&cpu&host=a', 't1?r&cpu&host=b',
+                           't1?r&mem&host=a']] * 5, results)
+
+    def test_stale_series_are_listed_while_one_thread_reloads(self):
+        with mock.patch('time.time', return_value=1000):
+            self._ids(None, None, None)
+        self.fake.series['t1'] = ['t1?r&cpu&host=a']
+        self.fake.started.clear()
+        self.fake.proceed = threading.Event()
+
+        with mock.patch('time.time', return_value=1300):
+            threads, results = self._list_concurrently(1)
+            self.assertTrue(self.fake.started.wait(5))
+            # the expired series answer while they are loaded again.
+            self.assertEqual(3, len(self._ids(None, None, None)))
+            self.fake.proceed.set()
+            threads[0].join(5)
+            self.assertEqual([['t1?r&cpu&host=a']], results)
+            self.assertEqual(['t1?r&cpu&host=a'],
+                             self._ids(None, None, None))
+        self.assertEqual(['t1', 't1'], self.fake.loads)
+
+    def test_one_refresh_at_a_time(self):
+        with mock.patch('time.time', return_value=1000):
+            self._ids(None, None, None)
+        self.fake.started.clear()
+        self.fake.proceed = threading.Event()
+
+        with mock.patch('time.time', return_value=1031):
+            threads, results = self._list_concurrently(1)
+            self.assertTrue(self.fake.started.wait(5))
+            self.assertEqual(3, len(self._ids(None, None, None)))
+            self.fake.proceed.set()
+            threads[0].join(5)
+        self.assertEqual(1, self.fake.refreshes)
+
+
+class TestRepositoryPages(unittest.TestCase):
+
+    def test_pages_are_listed_from_the_catalogue_by_default(self):
+        names = ['tenant?useast&cpu&host=%04d' % i
+                 for i in range(2 * constants.PAGE_LIMIT)]
+        with mock.patch.object(metrics_repository.client, 'InfluxDBClient'):
+            repo = metrics_repository.MetricsRepository()
+        query = repo.influxdb_client.query
+        query.return_value = [{'name': 'list_series_result',
+                               'columns': ['time', 'name'],
+                               'points': [[0, name] for name in
+                                          reversed(names)]}]
+
+        first = repo.list_metrics(u'tenant', u'useast', None, None, '')
+        second = repo.list_metrics(u'tenant', u'useast', None, None,
+                                   first[-1]['id'] + '%00')
+
+        # the series are listed and sorted once, not for every page.
+        self.assertEqual(1, query.call_count)
+        self.assertEqual(names, [urllib.unquote(metric['id'])
+                                 for metric in first + second])
@@ -0,0 +1,164 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from monasca.common.messaging import exceptions
+from monasca.common.messaging import fake_publisher
+from monasca.common.messaging import spool
+from monasca.common.messaging import spooling_publisher
+
+
+class FlakyPublisher(fake_publisher.FakePublisher):
+
+    def __init__(self):
+        super(FlakyPublisher, self).__init__('test')
+        self.sent = []
+        self.available = False
+
+    def send_messages(self, messages, keys=None):
+        if not self.available:
+            raise exceptions.MessageQueueUnavailable('Kafka is down')
+        if 'too large' in messages:
+            raise exceptions.MessageQueueException('Message too large')
+        self.sent.extend(messages)
+
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _open(self, max_size=4096):
+        return spool.Spool(self.directory, 64, max_size, fsync='always')
+
+    def test_replay_in_order_across_segments(self):
+        s = self._open()
+        messages = ['message %d' % i for i in range(20)]
+        for message in messages:
+            s.append([message])
+        self.assertEqual(20, len(s))
+        self.assertTrue(len(os.listdir(self.directory)) > 2)
+
+        self.assertEqual(messages[:7], s.peek(7))
+        s.commit(7)
+        self.assertEqual(messages[7:], s.peek(100))
+        s.commit(13)
+        self.assertEqual([], s.peek(100))
+        self.assertEqual(0, len(s))
+
+    def test_reopen(self):
+        s = self._open()
+        s.append(['a', 'b', 'c'])
+        s.commit(1)
+        s.append(['d'])
+
+        s = self._open()
+        self.assertEqual(3, len(s))
+        self.assertEqual(['b', 'c', 'd'], s.peek(10))
+
+    def test_full(self):
+        s = self._open(max_size=40)
+        s.append(['0123456789'])
+        self.assertRaises(spool.SpoolFullException,
+                          s.append, ['0123456789', '0123456789'])
+        self.assertEqual(['0123456789'], s.peek(10))
+
+    def test_claim_directory(self):
+        first = spool.claim_directory(self.directory)
+        second = spool.claim_directory(self.directory)
+        self.assertNotEqual(first, second)
+
+
+class TestSpoolingPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spool_and_replay(self):
+        delegate = FlakyPublisher()
+        publisher = spooling_publisher.SpoolingPublisher(
+            delegate, 'test', lambda: spool.Spool(self.directory, 1024, 4096),
+            replay_rate=1000, replay_batch_size=2, retry_interval=0.01)
+
+        publisher.send_messages(['a', 'b', 'c'])
+        delegate.available = True
+        publisher.send_messages(['d'])
+
+        _wait_for(lambda: len(delegate.sent) >= 4)
+        self.assertEqual(['a', 'b', 'c', 'd'], delegate.sent)
+
+        publisher.send_messages(['e'])
+        _wait_for(lambda: len(delegate.sent) >= 5)
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], delegate.sent)
+
+    def test_replay_without_rate_limit(self):
+        delegate = FlakyPublisher()
+        publisher = spooling_publisher.SpoolingPublisher(
+            delegate, 'test', lambda: spool.Spool(self.directory, 1024, 4096),
+            replay_rate=0, replay_batch_size=2, retry_interval=0.01)
+
+        publisher.send_messages(['a', 'b', 'c'])
+        delegate.available = True
+        _wait_for(lambda: not publisher._replaying)
+        self.assertEqual(['a', 'b', 'c'], delegate.sent)
+        publisher.send_messages(['d'])
+        self.assertEqual(['a', 'b', 'c', 'd'], delegate.sent)
+
+    def test_rejected_messages_are_not_spooled(self):
+        delegate = FlakyPublisher()
+        delegate.available = True
+        publisher = spooling_publisher.SpoolingPublisher(
+            delegate, 'test', lambda: spool.Spool(self.directory, 1024, 4096),
+            replay_rate=1000, replay_batch_size=2, retry_interval=0.01)
+        self.assertRaises(exceptions.MessageQueueException,
+                          publisher.send_messages, ['too large'])
+        self.assertEqual(0, len(publisher._spool))
+
+    def test_rejected_message_is_dropped_while_replaying(self):
+        delegate = FlakyPublisher()
+        publisher = spooling_publisher.SpoolingPublisher(
+            delegate, 'test', lambda: spool.Spool(self.directory, 1024, 4096),
+            replay_rate=1000, replay_batch_size=3, retry_interval=0.01,
+            max_attempts=2)
+
+        publisher.send_messages(['a', 'too large', 'b', 'c'])
+        delegate.available = True
+        _wait_for(lambda: not publisher._replaying)
+        self.assertEqual(['a', 'b', 'c'], delegate.sent)
+        self.assertEqual(0, len(publisher._spool))
+
+    def test_records_keep_missing_keys(self):
+        records = [spooling_publisher._pack('a', 'ka'),
+                   spooling_publisher._pack('b', None)]
+        self.assertEqual((['a', 'b'], ['ka', None]),
+                         spooling_publisher._unpack(records))
+        self.assertEqual((['b'], None),
+                         spooling_publisher._unpack(records[1:]))
@@ -0,0 +1,77 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import StringIO
+import unittest
+
+import mock
+
+from monasca.common.repositories.influxdb import metrics_repository
+from monasca.v2.reference import helpers
+
+
+def _part(name, points, **extra):
+    return dict({'name': name, 'dimensions': {'host': 'a'},
+                 'columns': ['timestamp', 'value'],
+                 'measurements': points}, **extra)
+
+
+class TestDumpitUtf8Stream(unittest.TestCase):
+
+    def _dump(self, measurements):
+        return json.loads(''.join(helpers.dumpit_utf8_stream(
+            iter(measurements))))
+
+    def test_parts_of_a_series_are_merged(self):
+        result = self._dump([_part('cpu', [], id=9),
+                             _part('cpu', [['t1', 1], ['t2', 2]], id=8),
+                             _part('cpu', [['t3', 3]], id=7),
+                             _part(u'千', [['t4', 4]], id=6)])
+        self.assertEqual(
+            [_part('cpu', [['t1', 1], ['t2', 2], ['t3', 3]], id=7),
+             _part(u'千', [['t4', 4]], id=6)], result)
+
+    def test_statistics_and_empty(self):
+        self.assertEqual([], self._dump([]))
+        self.assertEqual([_part('cpu', [['t1', 1]])],
+                         self._dump([_part('cpu', [['t1', 1]])]))
+
+
+class TestInfluxdbMeasurementStream(unittest.TestCase):
+
+    def test_series_are_read_part_by_part(self):
+        body = ''.join(json.dumps(serie) for serie in [
+            {'name': 'tenant?useast&cpu&host=a',
+             'columns': ['time', 'sequence_number', 'value'],
+             'points': [[1413230362, 1, 99.5]]},
+            {'name': 'tenant?useast&cpu&host=a',
+             'columns': ['time', 'sequence_number', 'value'],
+             'points': [[1413230300, 2, 98.5]]}])
+        response = mock.Mock(status_code=200, raw=StringIO.StringIO(body))
+
+        with mock.patch.object(metrics_repository.client, 'InfluxDBClient'):
+            repo = metrics_repository.MetricsRepository()
+        with mock.patch.object(metrics_repository.requests, 'get',
+                               return_value=response) as get:
+            parts = list(repo.measurement_stream(u'tenant', u'useast', u'cpu',
+                                                 None, 1413230000, None))
+
+        self.assertEqual('true', get.call_args[1]['params']['chunked'])
+        self.assertEqual(30.0, get.call_args[1]['timeout'])
+        self.assertEqual([[u'2014-10-13T19:59:22Z', 1, 99.5]],
+                         parts[0]['measurements'])
+        self.assertEqual(1413230300, parts[1]['id'])
+        self.assertEqual({u'host': u'a'}, parts[1]['dimensions'])
+        response.close.assert_called_once_with()
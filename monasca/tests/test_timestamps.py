@@ -0,0 +1,63 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import random
+import time
+import unittest
+
+from monasca.common import timestamps
+
+
+def _strftime(timestamps_list):
+    return [time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+            for timestamp in timestamps_list]
+
+
+class TestTimestamps(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(3)
+        # statistics buckets across days, then unordered timestamps.
+        self.timestamps = (range(1413230000, 1413230000 + 300 * 600, 300) +
+                           [rnd.randint(0, 2 ** 32) for _ in range(1000)])
+
+    def test_same_as_strftime(self):
+        self.assertEqual(_strftime(self.timestamps),
+                         timestamps._format_python(self.timestamps))
+        self.assertEqual(_strftime(self.timestamps[:10]),
+                         timestamps.format_timestamps(self.timestamps[:10]))
+
+    @unittest.skipIf(timestamps.numpy is None, 'NumPy is not installed')
+    def test_numpy_same_as_strftime(self):
+        self.assertEqual(_strftime(self.timestamps),
+                         timestamps._format_numpy(self.timestamps))
+
+    def test_points_and_epoch_ms(self):
+        points = [[1413230362, 1, 99.5], [1413230363.0, 2, 98.5]]
+        self.assertEqual([[1413230362000, 1, 99.5], [1413230363000, 2, 98.5]],
+                         timestamps.format_points(points,
+                                                  timestamps.EPOCH_MS))
+        points = [[1413230362, 1, 99.5]]
+        self.assertEqual([['2014-10-13T19:59:22Z', 1, 99.5]],
+                         timestamps.format_points(points))
+
+    def test_epoch_ms_of_floats(self):
+        formatted = timestamps.format_timestamps(
+            [1413230363.0, 1413230362.9996, 1413230362.1234],
+            timestamps.EPOCH_MS)
+        self.assertEqual([1413230363000, 1413230363000, 1413230362123],
+                         formatted)
+        self.assertEqual('[1413230363000, 1413230363000, 1413230362123]',
+                         json.dumps(formatted))
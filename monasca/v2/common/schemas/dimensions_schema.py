@@ -25,7 +25,26 @@ dimensions_schema = voluptuous.Schema({
         voluptuous.Any(str, unicode), voluptuous.Length(max=255))})
 
 
+def is_valid(dimensions):
+    """Specialized equivalent of dimensions_schema.
+
+    :param dimensions: The dimensions to check.
+    :return: True if dimensions_schema would accept the dimensions.
+    """
+    if not isinstance(dimensions, dict):
+        return False
+    for dimension_name, dimension_value in dimensions.iteritems():
+        if not (isinstance(dimension_name, basestring) and
+                len(dimension_name) <= 255 and
+                isinstance(dimension_value, basestring) and
+                len(dimension_value) <= 255):
+            return False
+    return True
+
+
 def validate(dimensions):
+    if is_valid(dimensions):
+        return
     try:
         dimensions_schema(dimensions)
     except Exception as ex:
@@ -23,7 +23,18 @@ metric_name_schema = voluptuous.Schema(
     voluptuous.All(voluptuous.Any(str, unicode), voluptuous.Length(max=64)))
 
 
+def is_valid(name):
+    """Specialized equivalent of metric_name_schema.
+
+    :param name: The metric name to check.
+    :return: True if metric_name_schema would accept the name.
+    """
+    return isinstance(name, basestring) and len(name) <= 64
+
+
 def validate(name):
+    if is_valid(name):
+        return
     try:
         metric_name_schema(name)
     except Exception as ex:
@@ -32,9 +32,67 @@ request_body_schema = voluptuous.Schema(
     voluptuous.Any(metric_schema, [metric_schema]))
 
 
-def validate(msg):
+def _is_valid_metric(metric):
+    if not isinstance(metric, dict):
+        return False
+
+    try:
+        name = metric['name']
+        timestamp = metric['timestamp']
+        value = metric['value']
+    except KeyError:
+        return False
+
+    # name, timestamp and value are present, so any other key than
+    # dimensions makes the metric too long.
+    if 'dimensions' in metric:
+        if (len(metric) != 4 or
+                not dimensions_schema.is_valid(metric['dimensions'])):
+            return False
+    elif len(metric) != 3:
+        return False
+
+    # "not timestamp < 0" rather than "timestamp >= 0" to match
+    # voluptuous.Range for NaN.
+    return (metric_name_schema.is_valid(name) and
+            isinstance(timestamp, (int, float)) and not timestamp < 0 and
+            isinstance(value, (int, float)))
+
+
+def is_valid(msg):
+    """Specialized equivalent of request_body_schema.
+
+    Checks the metric shape directly instead of walking the nested
+    voluptuous validators, which is a large part of the CPU cost of a
+    POST. It never accepts a body that request_body_schema rejects.
+
+    :param msg: A metric object or array of metric objects.
+    :return: True if request_body_schema would accept msg.
+    """
+    if isinstance(msg, list):
+        for metric in msg:
+            if not _is_valid_metric(metric):
+                return False
+        return True
+    return _is_valid_metric(msg)
+
+
+def validate_reference(msg):
+    """Validates msg with the voluptuous request_body_schema."""
     try:
         request_body_schema(msg)
     except Exception as ex:
         LOG.debug(ex)
         raise exceptions.ValidationException(str(ex))
+
+
+def validate(msg):
+    """Validates a metric or an array of metrics.
+
+    Valid bodies are accepted by is_valid. Anything it rejects is run
+    through the reference schema so the error message is the one
+    voluptuous reports.
+    """
+    if is_valid(msg):
+        return
+    validate_reference(msg)
@@ -53,12 +53,112 @@ messaging_opts = [cfg.StrOpt('driver', default='kafka',
                                   'publish to the message queue'),
                   cfg.StrOpt('events_message_format', default='reference',
                              help='The type of events message format to '
-                                  'publish to the message queue')]
+                                  'publish to the message queue'),
+                  cfg.IntOpt('recording_capacity', default=10000,
+                             help='The number of messages the recording '
+                                  'driver keeps in memory per topic'),
+                  cfg.FloatOpt('recording_latency_ms', default=0.0,
+                               help='The number of milliseconds every send '
+                                    'of the recording driver takes, to '
+                                    'simulate a message queue')]
 
 messaging_group = cfg.OptGroup(name='messaging', title='messaging')
 cfg.CONF.register_group(messaging_group)
 cfg.CONF.register_opts(messaging_opts, messaging_group)
 
+ingestion_opts = [
+    cfg.IntOpt('metrics_chunk_size', default=500,
+               help='The maximum number of metrics that are decoded and '
+                    'validated at a time while a POST request body is being '
+                    'read. The metrics are only published once the whole '
+                    'body is valid'),
+    cfg.IntOpt('max_decompressed_size', default=16777216,
+               help='The maximum size in bytes of a request body sent with '
+                    'Content-Encoding gzip or deflate, after '
+                    'decompression'),
+    cfg.BoolOpt('async_enabled', default=False,
+                help='If True, POSTed metrics are put on an in-process '
+                     'queue and published by background threads, and the '
+                     'request returns as soon as they are queued'),
+    cfg.IntOpt('async_queue_size', default=100000,
+               help='The maximum number of metrics waiting to be published '
+                    'in async mode. Must be larger than the number of '
+                    'metrics in a POST request, which are queued together'),
+    cfg.IntOpt('async_workers', default=1,
+               help='The number of threads publishing metrics in async '
+                    'mode'),
+    cfg.IntOpt('async_retry_after', default=5,
+               help='The number of seconds clients are asked to wait in the '
+                    'Retry-After header when the async queue is full'),
+    cfg.BoolOpt('group_commit_enabled', default=False,
+                help='If True, the metrics of concurrent requests in a '
+                     'worker are published together, and every request '
+                     'waits for the outcome of the publish its metrics '
+                     'were part of'),
+    cfg.IntOpt('group_commit_max_bytes', default=1048576,
+               help='The size in bytes of the metrics waiting to be '
+                    'published together that makes them be published at '
+                    'once'),
+    cfg.IntOpt('group_commit_linger_ms', default=5,
+               help='The maximum number of milliseconds a request waits for '
+                    'other requests to publish their metrics with')]
+
+ingestion_group = cfg.OptGroup(name='ingestion', title='ingestion')
+cfg.CONF.register_group(ingestion_group)
+cfg.CONF.register_opts(ingestion_opts, ingestion_group)
+
+spool_opts = [
+    cfg.BoolOpt('enabled', default=False,
+                help='If True, POSTed metrics that can not be published are '
+                     'written to a spool on local disk and replayed once '
+                     'the message queue is available again'),
+    cfg.StrOpt('directory', default='/var/spool/monasca-api',
+               help='The directory that holds the spools. Every API worker '
+                    'process uses its own sub-directory'),
+    cfg.IntOpt('segment_size', default=67108864,
+               help='The size in bytes of every spool segment file'),
+    cfg.IntOpt('max_size', default=1073741824,
+               help='The maximum number of bytes of spooled metrics per '
+                    'worker process. When the spool is full, requests are '
+                    'answered with 503'),
+    cfg.StrOpt('fsync', default='interval',
+               help='When spooled metrics are flushed to disk. One of '
+                    'always, interval or never'),
+    cfg.FloatOpt('fsync_interval', default=1.0,
+                 help='The minimum number of seconds between flushes when '
+                      'fsync is interval'),
+    cfg.IntOpt('replay_rate', default=1000,
+               help='The maximum number of spooled metrics replayed per '
+                    'second, or 0 for no limit'),
+    cfg.IntOpt('replay_batch_size', default=500,
+               help='The maximum number of spooled metrics published at a '
+                    'time while replaying'),
+    cfg.IntOpt('max_attempts', default=3,
+               help='The number of times a spooled metric the message '
+                    'queue rejects, rather than being unavailable, is '
+                    'replayed before it is dropped')]
+
+spool_group = cfg.OptGroup(name='spool', title='spool')
+cfg.CONF.register_group(spool_group)
+cfg.CONF.register_opts(spool_opts, spool_group)
+
+instrumentation_opts = [
+    cfg.StrOpt('directory', default='',
+               help='The directory where every API worker process writes '
+                    'the snapshot of its instrumentation, so the admin '
+                    'endpoint can report all of the workers. It must be '
+                    'writable by the API user. If empty, nothing is written '
+                    'and the endpoint only reports the worker that serves '
+                    'it'),
+    cfg.FloatOpt('export_interval', default=5.0,
+                 help='The number of seconds between the snapshots written '
+                      'by every worker')]
+
+instrumentation_group = cfg.OptGroup(name='instrumentation',
+                                     title='instrumentation')
+cfg.CONF.register_group(instrumentation_group)
+cfg.CONF.register_opts(instrumentation_opts, instrumentation_group)
+
 repositories_opts = [
     cfg.StrOpt('metrics_driver', default='influxdb_metrics_repo',
                help='The repository driver to use for metrics'),
@@ -78,9 +178,33 @@ repositories_group = cfg.OptGroup(name='repositories', title='repositories')
 cfg.CONF.register_group(repositories_group)
 cfg.CONF.register_opts(repositories_opts, repositories_group)
 
+alarm_cache_opts = [
+    cfg.BoolOpt('enabled', default=False,
+                help='If True, every API worker keeps all alarms in memory '
+                     'to answer alarm list and show requests, kept current '
+                     'by consuming the alarm events from kafka'),
+    cfg.IntOpt('refresh_interval', default=300,
+               help='The number of seconds between loads of all alarms '
+                    'from the alarms repository'),
+    cfg.StrOpt('events_topic', default='events',
+               help='The topic of the alarm and alarm definition events'),
+    cfg.StrOpt('alarm_state_transitions_topic',
+               default='alarm-state-transitions',
+               help='The topic of the alarm state transitions')]
+
+alarm_cache_group = cfg.OptGroup(name='alarm_cache', title='alarm_cache')
+cfg.CONF.register_group(alarm_cache_group)
+cfg.CONF.register_opts(alarm_cache_opts, alarm_cache_group)
+
 
-kafka_opts = [cfg.StrOpt('uri', help='Address to kafka server. For example: '
-                                     'uri=192.168.1.191:9092'),
+kafka_opts = [cfg.StrOpt('uri', help='Addresses of kafka brokers to '
+                                     'bootstrap from, separated by commas. '
+                                     'For example: uri=192.168.1.191:9092,'
+                                     '192.168.1.192:9092'),
+              cfg.IntOpt('metadata_refresh_interval', default=30,
+                         help='The number of seconds between reloads of the '
+                              'partition leaders from kafka, or 0 to only '
+                              'reload them when a request fails.'),
               cfg.StrOpt('metrics_topic', default='metrics',
                          help='The topic that metrics will be published too.'),
               cfg.StrOpt('events_topic', default='raw-events',
@@ -88,17 +212,40 @@ kafka_opts = [cfg.StrOpt('uri', help='Address to kafka server. For example: '
               cfg.StrOpt('group', default='api',
                          help='The group name that this service belongs to.'),
               cfg.IntOpt('wait_time', default=1,
-                         help='The wait time when no messages on kafka '
-                              'queue.'), cfg.IntOpt('ack_time', default=20,
-                                                    help='The ack time back '
-                                                         'to kafka.'),
+                         help='The number of seconds between background '
+                              'reconnection attempts while kafka is '
+                              'unavailable.'),
+              cfg.IntOpt('ack_time', default=20,
+                         help='The ack time back to kafka.'),
               cfg.IntOpt('max_retry', default=3,
-                         help='The number of retry when there is a '
-                              'connection error.'),
+                         help='The number of consecutive connection errors '
+                              'after which requests fail fast until kafka '
+                              'is reachable again.'),
               cfg.BoolOpt('auto_commit', default=False,
                           help='If automatically commmit when consume '
                                'messages.'),
               cfg.BoolOpt('async', default=True, help='The type of posting.'),
+              cfg.BoolOpt('keyed', default=False, help=(
+                  'If True, metrics are published to the partition chosen '
+                  'by the hash of their tenant, region, name and '
+                  'dimensions, so all of the measurements of a series go '
+                  'to the same partition. Otherwise messages are sent to '
+                  'the partitions in turn.')),
+              cfg.StrOpt('compression', default='none', help=(
+                  'The codec used to compress every message set published '
+                  'to kafka: none, gzip, snappy or lz4. snappy needs the '
+                  'python-snappy package and lz4 a kafka client that '
+                  'supports it; otherwise messages are sent '
+                  'uncompressed.')),
+              cfg.IntOpt('max_message_bytes', default=1000000, help=(
+                  'The largest message set, in bytes before compression, '
+                  'sent to one partition in one produce request. Larger '
+                  'batches are split. Should not exceed message.max.bytes '
+                  'of the brokers.')),
+              cfg.StrOpt('dead_letter_topic', default='', help=(
+                  'The topic messages larger than max_message_bytes, or '
+                  'rejected as too large by the brokers, are sent to, gzip '
+                  'compressed. If empty, such messages fail the request.')),
               cfg.BoolOpt('compact', default=True, help=(
                   'Specify if the message received should be parsed.'
                   'If True, message will not be parsed, otherwise '
@@ -117,12 +264,43 @@ cfg.CONF.register_opts(kafka_opts, kafka_group)
 
 influxdb_opts = [cfg.StrOpt('database_name'), cfg.StrOpt('ip_address'),
                  cfg.StrOpt('port'), cfg.StrOpt('user'),
-                 cfg.StrOpt('password')]
+                 cfg.StrOpt('password'),
+                 cfg.IntOpt('serie_name_cache_size', default=50000,
+                            help='The number of recently decoded serie names '
+                                 'whose metrics are remembered, or 0 to '
+                                 'decode every one.'),
+                 cfg.FloatOpt('timeout', default=30.0,
+                              help='The number of seconds to wait for '
+                                   'InfluxDB to accept a connection, and '
+                                   'for every read of a response.')]
 
 influxdb_group = cfg.OptGroup(name='influxdb', title='influxdb')
 cfg.CONF.register_group(influxdb_group)
 cfg.CONF.register_opts(influxdb_opts, influxdb_group)
 
+series_catalogue_opts = [
+    cfg.BoolOpt('enabled', default=True,
+                help='If True, metric listings are answered from an '
+                     'in-memory catalogue of the series of every tenant '
+                     'instead of listing the series in InfluxDB. Without '
+                     'the catalogue every page lists and sorts all of the '
+                     'series of the tenant.'),
+    cfg.IntOpt('ttl', default=300,
+               help='The number of seconds after which all of the series of '
+                    'a tenant are loaded again, dropping deleted series.'),
+    cfg.IntOpt('refresh_interval', default=30,
+               help='The number of seconds after which the series of a '
+                    'tenant that received measurements since the last '
+                    'refresh are added.'),
+    cfg.IntOpt('max_bytes', default=67108864,
+               help='The estimated memory all of the catalogues are kept '
+                    'under, by evicting the tenants used least recently.')]
+
+series_catalogue_group = cfg.OptGroup(name='series_catalogue',
+                                      title='series_catalogue')
+cfg.CONF.register_group(series_catalogue_group)
+cfg.CONF.register_opts(series_catalogue_opts, series_catalogue_group)
+
 mysql_opts = [cfg.StrOpt('database_name'), cfg.StrOpt('hostname'),
               cfg.StrOpt('username'), cfg.StrOpt('password')]
 
@@ -0,0 +1,51 @@
+# Copyright 2014 Hewlett-Packard
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+import falcon
+from oslo.config import cfg
+
+from monasca.api import monasca_admin_api_v2
+from monasca.common import resource_api
+from monasca.common import worker_instrumentation
+from monasca.openstack.common import log
+from monasca.v2.reference import helpers
+
+
+LOG = log.getLogger(__name__)
+
+
+class Admin(monasca_admin_api_v2.AdminV2API):
+    def __init__(self, global_conf):
+
+        super(Admin, self).__init__(global_conf)
+        self._default_authorized_roles = (
+            cfg.CONF.security.default_authorized_roles)
+        self._directory = cfg.CONF.instrumentation.directory
+        self._interval = cfg.CONF.instrumentation.export_interval
+        if self._directory:
+            worker_instrumentation.start(self._directory, self._interval)
+
+    @resource_api.Restify('/v2.0/admin/instrumentation', method='get')
+    def do_get_instrumentation(self, req, res):
+        helpers.validate_authorization(req, self._default_authorized_roles)
+        if self._directory:
+            # a worker forked after the dispatcher was loaded starts its
+            # own writer on its first request.
+            worker_instrumentation.start(self._directory, self._interval)
+        stats = worker_instrumentation.collect(self._directory,
+                                               3 * self._interval)
+        res.body = json.dumps(stats)
+        res.status = falcon.HTTP_200
@@ -16,7 +16,7 @@ import falcon
 from oslo.config import cfg
 
 from monasca.common.messaging import exceptions as message_queue_exceptions
-from monasca.common import resource_api
+from monasca.common.messaging import instrumented_publisher
 import monasca.expression_parser.alarm_expr_parser
 from monasca.openstack.common import log
 from monasca.v2.reference import helpers
@@ -35,15 +35,12 @@ class Alarming(object):
 
         super(Alarming, self).__init__()
 
-        self.events_message_queue = (
-            resource_api.init_driver('monasca.messaging',
-                                     cfg.CONF.messaging.driver,
-                                     (['events'])))
+        self.events_message_queue = instrumented_publisher.create(
+            cfg.CONF.messaging.driver, 'events')
 
         self.alarm_state_transitions_message_queue = (
-            resource_api.init_driver('monasca.messaging',
-                                     cfg.CONF.messaging.driver,
-                                     (['alarm-state-transitions'])))
+            instrumented_publisher.create(cfg.CONF.messaging.driver,
+                                          'alarm-state-transitions'))
 
     def _send_alarm_transitioned_event(self, tenant_id, alarm_id,
                                        alarm_definition_row,
@@ -18,6 +18,7 @@ import falcon
 from oslo.config import cfg
 
 from monasca.api.alarms_api_v2 import AlarmsV2API
+from monasca.common.repositories import cached_alarms_repository
 from monasca.common.repositories import exceptions
 from monasca.common import resource_api
 from monasca.openstack.common import log
@@ -50,6 +51,17 @@ class Alarms(AlarmsV2API, Alarming):
             self._alarms_repo = resource_api.init_driver(
                 'monasca.repositories', cfg.CONF.repositories.alarms_driver)
 
+            self._alarm_cache = None
+            if cfg.CONF.alarm_cache.enabled:
+                self._alarm_cache = (
+                    cached_alarms_repository.CachedAlarmsRepository(
+                        self._alarms_repo,
+                        [cfg.CONF.alarm_cache.events_topic,
+                         cfg.CONF.alarm_cache.alarm_state_transitions_topic],
+                        cfg.CONF.alarm_cache.refresh_interval,
+                        cfg.CONF.kafka.wait_time))
+                self._alarms_repo = self._alarm_cache
+
             self._metrics_repo = resource_api.init_driver(
                 'monasca.repositories', cfg.CONF.repositories.metrics_driver)
 
@@ -103,6 +115,7 @@ class Alarms(AlarmsV2API, Alarming):
 
         result = self._alarm_list(req.uri, tenant_id, query_parms, offset)
 
+        self._set_watermark_header(res)
         res.body = helpers.dumpit_utf8(result)
         res.status = falcon.HTTP_200
 
@@ -119,6 +132,7 @@ class Alarms(AlarmsV2API, Alarming):
 
         result = self._alarm_show(req.uri, tenant_id, id)
 
+        self._set_watermark_header(res)
         res.body = helpers.dumpit_utf8(result)
         res.status = falcon.HTTP_200
 
@@ -132,10 +146,11 @@ class Alarms(AlarmsV2API, Alarming):
         query_parms = falcon.uri.parse_query_string(req.query_string)
         offset = helpers.normalize_offset(helpers.get_query_param(req,
                                                                   'offset'))
+        time_format = helpers.get_query_time_format(req)
 
         result = self._alarm_history_list(tenant_id, start_timestamp,
                                           end_timestamp, query_parms,
-                                          req.uri, offset)
+                                          req.uri, offset, time_format)
 
         res.body = helpers.dumpit_utf8(result)
         res.status = falcon.HTTP_200
@@ -147,8 +162,10 @@ class Alarms(AlarmsV2API, Alarming):
         tenant_id = helpers.get_tenant_id(req)
         offset = helpers.normalize_offset(helpers.get_query_param(req,
                                                                   'offset'))
+        time_format = helpers.get_query_time_format(req)
 
-        result = self._alarm_history(tenant_id, [id], req.uri, offset)
+        result = self._alarm_history(tenant_id, [id], req.uri, offset,
+                                     time_format)
 
         res.body = helpers.dumpit_utf8(result)
         res.status = falcon.HTTP_200
@@ -187,7 +204,8 @@ class Alarms(AlarmsV2API, Alarming):
 
     @resource_try_catch_block
     def _alarm_history_list(self, tenant_id, start_timestamp,
-                            end_timestamp, query_parms, req_uri, offset):
+                            end_timestamp, query_parms, req_uri, offset,
+                            time_format):
 
         # get_alarms expects 'metric_dimensions' for dimensions key.
         if 'dimensions' in query_parms:
@@ -201,14 +219,17 @@ class Alarms(AlarmsV2API, Alarming):
         result = self._metrics_repo.alarm_history(tenant_id, alarm_id_list,
                                                   offset,
                                                   start_timestamp,
-                                                  end_timestamp)
+                                                  end_timestamp,
+                                                  time_format)
 
         return helpers.paginate(result, req_uri, offset)
 
     @resource_try_catch_block
-    def _alarm_history(self, tenant_id, alarm_id, req_uri, offset):
+    def _alarm_history(self, tenant_id, alarm_id, req_uri, offset,
+                       time_format):
 
-        result = self._metrics_repo.alarm_history(tenant_id, alarm_id, offset)
+        result = self._metrics_repo.alarm_history(tenant_id, alarm_id, offset,
+                                                  time_format=time_format)
 
         return helpers.paginate(result, req_uri, offset)
 
@@ -316,6 +337,14 @@ class Alarms(AlarmsV2API, Alarming):
 
         return helpers.paginate(result, req_uri, offset)
 
+    def _set_watermark_header(self, res):
+
+        # tells clients how current an answer from the alarm cache is.
+        if self._alarm_cache is not None:
+            watermark = self._alarm_cache.watermark()
+            if watermark is not None:
+                res.set_header('X-Alarm-Cache-Watermark', watermark)
+
     def _get_alarm_state(self, req):
 
         json_msg = helpers.read_http_resource(req)
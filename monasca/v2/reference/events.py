@@ -19,6 +19,7 @@ from oslo.config import cfg
 
 from monasca.api import monasca_events_api_v2
 from monasca.common.messaging import exceptions as message_queue_exceptions
+from monasca.common.messaging import instrumented_publisher
 from monasca.common.messaging.message_formats import events_transform_factory
 from monasca.common import resource_api
 from monasca.openstack.common import log
@@ -47,10 +48,8 @@ class Events(monasca_events_api_v2.EventsV2API):
             cfg.CONF.security.agent_authorized_roles)
         self._event_transform = (
             events_transform_factory.create_events_transform())
-        self._message_queue = (
-            resource_api.init_driver('monasca.messaging',
-                                     cfg.CONF.messaging.driver,
-                                     ['raw-events']))
+        self._message_queue = instrumented_publisher.create(
+            cfg.CONF.messaging.driver, 'raw-events')
 
     def _validate_event(self, event):
         """Validates the event
@@ -17,9 +17,14 @@ import json
 import urlparse
 
 import falcon
+from oslo.config import cfg
 import simplejson
 
+from monasca.common import content_encoding
+from monasca.common import json_stream
+from monasca.common import msgpack_stream
 from monasca.common.repositories import constants
+from monasca.common import timestamps
 from monasca.openstack.common import log
 from monasca.v2.common.schemas import dimensions_schema
 from monasca.v2.common.schemas import exceptions as schemas_exceptions
@@ -27,6 +32,9 @@ from monasca.v2.common.schemas import metric_name_schema
 
 LOG = log.getLogger(__name__)
 
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
 
 def read_json_msg_body(req):
     """Read the json_msg from the http request body and return them as JSON.
@@ -45,10 +53,25 @@ def read_json_msg_body(req):
                                     'Request body is not valid JSON')
 
 
-def validate_json_content_type(req):
-    if req.content_type not in ['application/json']:
-        raise falcon.HTTPBadRequest('Bad request', 'Bad content type. Must be '
-                                                   'application/json')
+def validate_json_content_type(req, content_types=(JSON_CONTENT_TYPE,)):
+    """Negotiates the content type of the request body.
+
+    :param req: HTTP request object.
+    :param content_types: The content types the resource accepts.
+    application/x-msgpack is only accepted if the msgpack package is
+    installed.
+    :return: The content type of the request body, without parameters.
+    :raises falcon.HTTPBadRequest: If the content type is not accepted.
+    """
+    content_types = [content_type for content_type in content_types
+                     if (content_type != MSGPACK_CONTENT_TYPE or
+                         msgpack_stream.is_available())]
+    content_type = (req.content_type or '').split(';')[0].strip().lower()
+    if content_type not in content_types:
+        raise falcon.HTTPBadRequest('Bad request',
+                                    'Bad content type. Must be ' +
+                                    ' or '.join(content_types))
+    return content_type
 
 
 def is_in_role(req, authorized_roles):
@@ -247,6 +270,20 @@ def get_query_period(req):
         raise falcon.HTTPBadRequest('Bad request', ex.message)
 
 
+def get_query_time_format(req):
+    """Returns the time_format query param, iso8601 by default.
+
+    :raises falcon.HTTPBadRequest: If it is not iso8601 or epoch_ms.
+    """
+    time_format = get_query_param(req, 'time_format',
+                                  default_val=timestamps.ISO_8601)
+    if time_format not in timestamps.TIME_FORMATS:
+        raise falcon.HTTPBadRequest('Bad request',
+                                    'time_format must be one of ' +
+                                    ', '.join(timestamps.TIME_FORMATS))
+    return time_format
+
+
 def validate_query_name(name):
     """Validates the query param name.
 
@@ -414,13 +451,47 @@ def add_links_to_resource_list(resourcelist, uri):
     return resourcelist
 
 
+def get_http_resource_stream(req):
+    """Returns a stream that reads the decoded body of the http request.
+
+    Bodies sent with Content-Encoding gzip or deflate are decompressed
+    while they are read, up to [ingestion] max_decompressed_size bytes.
+    The errors raised while reading the stream are translated into http
+    errors by read_http_resource and read_http_resource_chunks.
+
+    :param req: the http request.
+    :raises falcon.HTTPUnsupportedMediaType: If the Content-Encoding is not
+    supported.
+    """
+    try:
+        return content_encoding.decoding_stream(
+            req.stream, req.get_header('Content-Encoding'),
+            cfg.CONF.ingestion.max_decompressed_size)
+    except content_encoding.UnsupportedEncodingException as ex:
+        LOG.debug(ex)
+        raise falcon.HTTPUnsupportedMediaType(
+            'Content-Encoding must be gzip, deflate or identity')
+
+
+def _raise_decoding_error(ex):
+    LOG.debug(ex)
+    if isinstance(ex, content_encoding.DecompressedSizeExceededException):
+        raise falcon.HTTPError(
+            status=falcon.HTTP_413,
+            title='Request Entity Too Large',
+            description=str(ex),
+            code=413)
+    raise falcon.HTTPBadRequest('Bad request',
+                                'Request body could not be decompressed')
+
+
 def read_http_resource(req):
     """Read from http request and return json.
 
     :param req: the http request.
     """
     try:
-        msg = req.stream.read()
+        msg = get_http_resource_stream(req).read()
         json_msg = simplejson.loads(msg)
         return json_msg
     except ValueError as ex:
@@ -428,6 +499,88 @@ def read_http_resource(req):
         raise falcon.HTTPBadRequest(
             'Bad request',
             'Request body is not valid JSON')
+    except (content_encoding.DecompressionException,
+            content_encoding.DecompressedSizeExceededException) as ex:
+        _raise_decoding_error(ex)
+
+
+def read_http_resource_chunks(req, chunk_size,
+                              content_type=JSON_CONTENT_TYPE):
+    """Read a JSON array from the http request incrementally.
+
+    The request body is decoded as it is read from the stream and the
+    elements of the array are yielded in lists of at most chunk_size
+    elements, so only one chunk has to be held in memory at a time.
+
+    Every chunk is yielded as a (values, raw_values) tuple where raw_values
+    holds the JSON text each value was decoded from, so it can be passed
+    on without being encoded again. If the body is not an array, the
+    decoded object and its JSON text are yielded as is.
+
+    MessagePack bodies are decoded the same way, but as there is no JSON
+    text for their values, raw_values holds None for every value.
+
+    :param req: the http request.
+    :param chunk_size: the maximum number of elements per chunk.
+    :param content_type: the negotiated content type of the body,
+    application/json or application/x-msgpack.
+    :raises falcon.HTTPBadRequest: while iterating, if the body is not
+    valid JSON or MessagePack, or can not be decompressed.
+    :raises falcon.HTTPError: while iterating, with status 413 if the
+    decompressed body is too large.
+    """
+    if content_type == MSGPACK_CONTENT_TYPE:
+        chunks = _read_msgpack_chunks(req, chunk_size)
+        format_name = 'MessagePack'
+    else:
+        chunks = _read_json_chunks(req, chunk_size)
+        format_name = 'JSON'
+    try:
+        for chunk in chunks:
+            yield chunk
+    except ValueError as ex:
+        LOG.debug(ex)
+        raise falcon.HTTPBadRequest(
+            'Bad request',
+            'Request body is not valid %s' % format_name)
+    except (content_encoding.DecompressionException,
+            content_encoding.DecompressedSizeExceededException) as ex:
+        _raise_decoding_error(ex)
+
+
+def _read_json_chunks(req, chunk_size):
+    values = json_stream.JSONStream(get_http_resource_stream(req))
+    if not values.is_array():
+        yield values.read_value_with_raw()
+        return
+
+    chunk = []
+    raw_chunk = []
+    for value, raw in values.iter_with_raw():
+        chunk.append(value)
+        raw_chunk.append(raw)
+        if len(chunk) >= chunk_size:
+            yield chunk, raw_chunk
+            chunk = []
+            raw_chunk = []
+    if chunk:
+        yield chunk, raw_chunk
+
+
+def _read_msgpack_chunks(req, chunk_size):
+    values = msgpack_stream.MsgpackStream(get_http_resource_stream(req))
+    if not values.is_array():
+        yield values.read_value(), None
+        return
+
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= chunk_size:
+            yield chunk, [None] * len(chunk)
+            chunk = []
+    if chunk:
+        yield chunk, [None] * len(chunk)
 
 
 def raise_not_found_exception(resource_name, resource_id, tenant_id):
@@ -449,3 +602,41 @@ def raise_not_found_exception(resource_name, resource_id, tenant_id):
 def dumpit_utf8(thingy):
 
     return json.dumps(thingy, ensure_ascii=False).encode('utf8')
+
+
+def dumpit_utf8_stream(measurements):
+    """Yields the JSON of a list of measurements or statistics in parts.
+
+    Consecutive elements of the same series, as returned by the streaming
+    methods of the metrics repository, are written as one element with all
+    of their points and the id of the last of them. Only one element is
+    held at a time.
+    """
+    yield '['
+    current = None
+    last_id = None
+    has_points = False
+    for measurement in measurements:
+        series = (measurement['name'], measurement['dimensions'])
+        points = dumpit_utf8(measurement['measurements'])[1:-1]
+        if current is None or series != current:
+            if current is not None:
+                yield _close_measurement(last_id) + ','
+            head = dict((key, value) for key, value in measurement.iteritems()
+                        if key not in ('id', 'measurements'))
+            yield dumpit_utf8(head)[:-1] + ', "measurements": [' + points
+            current = series
+            has_points = bool(points)
+        elif points:
+            yield (', ' if has_points else '') + points
+            has_points = True
+        last_id = measurement.get('id')
+    if current is not None:
+        yield _close_measurement(last_id)
+    yield ']'
+
+
+def _close_measurement(last_id):
+    if last_id is None:
+        return ']}'
+    return '], "id": ' + dumpit_utf8(last_id) + '}'
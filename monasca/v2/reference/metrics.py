@@ -12,26 +12,88 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import json
+import collections
 
 import falcon
 from oslo.config import cfg
 
 from monasca.api import monasca_api_v2
+from monasca.common.messaging import async_publisher
 from monasca.common.messaging import exceptions as message_queue_exceptions
+from monasca.common.messaging import group_commit_publisher
+from monasca.common.messaging import instrumented_publisher
 from monasca.common.messaging.message_formats import metrics_transform_factory
+from monasca.common.messaging import partitioning
+from monasca.common.messaging import spool
+from monasca.common.messaging import spooling_publisher
 from monasca.common import resource_api
 from monasca.openstack.common import log
 from monasca.v2.common.schemas import (exceptions as schemas_exceptions)
 from monasca.v2.common.schemas import (
     metrics_request_body_schema as schemas_metrics)
-from monasca.v2.common import utils
 from monasca.v2.reference import helpers
 
 
 LOG = log.getLogger(__name__)
 
 
+def _create_metrics_spool():
+    return spool.Spool(spool.claim_directory(cfg.CONF.spool.directory),
+                       cfg.CONF.spool.segment_size,
+                       cfg.CONF.spool.max_size,
+                       cfg.CONF.spool.fsync,
+                       cfg.CONF.spool.fsync_interval)
+
+
+def _log_stream_errors(chunks):
+    """Yields the chunks of a streamed response, logging a failure.
+
+    The status is sent before the body, so a failure while streaming ends
+    the body early, leaving a truncated JSON document.
+    """
+    try:
+        for chunk in chunks:
+            yield chunk
+    except Exception as ex:
+        LOG.exception(ex)
+
+
+def group_by_tenant(metrics, raw_metrics, tenant_id):
+    """Groups the metrics of a delegate request by tenant.
+
+    Metrics may carry their own tenant_id property, which is removed from
+    the metric. As the JSON text of those metrics still holds it, their raw
+    text is dropped so they are encoded again. Metrics without a tenant_id
+    belong to tenant_id.
+
+    :param metrics: A metric object or array of metric objects.
+    :param raw_metrics: The JSON text of the metric or metrics.
+    :param tenant_id: The tenant of the metrics without a tenant_id.
+    :return: An OrderedDict of tenant ID to (metrics, raw_metrics) lists,
+    in the order the tenants first appear in metrics.
+    :raises falcon.HTTPBadRequest: If a tenant_id is not a non-empty string.
+    """
+    if not isinstance(metrics, list):
+        metrics = [metrics]
+        raw_metrics = [raw_metrics]
+
+    tenants = collections.OrderedDict()
+    for metric, raw in zip(metrics, raw_metrics):
+        metric_tenant_id = tenant_id
+        if isinstance(metric, dict) and 'tenant_id' in metric:
+            metric_tenant_id = metric.pop('tenant_id')
+            if (not isinstance(metric_tenant_id, basestring) or
+                    not metric_tenant_id):
+                raise falcon.HTTPBadRequest(
+                    'Bad request', 'tenant_id must be a non-empty string')
+            raw = None
+        tenant_metrics, tenant_raw_metrics = tenants.setdefault(
+            metric_tenant_id, ([], []))
+        tenant_metrics.append(metric)
+        tenant_raw_metrics.append(raw)
+    return tenants
+
+
 class Metrics(monasca_api_v2.V2API):
     def __init__(self, global_conf):
 
@@ -47,12 +109,30 @@ class Metrics(monasca_api_v2.V2API):
             self._post_metrics_authorized_roles = (
                 cfg.CONF.security.default_authorized_roles +
                 cfg.CONF.security.agent_authorized_roles)
-            self._metrics_transform = (
-                metrics_transform_factory.create_metrics_transform())
-            self._message_queue = (
-                resource_api.init_driver('monasca.messaging',
-                                         cfg.CONF.messaging.driver,
-                                         ['metrics']))
+            self._metrics_chunk_size = cfg.CONF.ingestion.metrics_chunk_size
+            self._metrics_serializer = (
+                metrics_transform_factory.create_metrics_serializer())
+            self._message_queue = instrumented_publisher.create(
+                cfg.CONF.messaging.driver, 'metrics')
+            if cfg.CONF.ingestion.group_commit_enabled:
+                self._message_queue = (
+                    group_commit_publisher.GroupCommitPublisher(
+                        self._message_queue, 'metrics',
+                        cfg.CONF.ingestion.group_commit_max_bytes,
+                        cfg.CONF.ingestion.group_commit_linger_ms / 1000.0))
+            if cfg.CONF.spool.enabled:
+                self._message_queue = spooling_publisher.SpoolingPublisher(
+                    self._message_queue, 'metrics', _create_metrics_spool,
+                    cfg.CONF.spool.replay_rate,
+                    cfg.CONF.spool.replay_batch_size,
+                    max_attempts=cfg.CONF.spool.max_attempts)
+            if cfg.CONF.ingestion.async_enabled:
+                self._message_queue = async_publisher.AsyncPublisher(
+                    self._message_queue, 'metrics',
+                    cfg.CONF.ingestion.async_queue_size,
+                    cfg.CONF.ingestion.async_workers)
+            self._async_retry_after = cfg.CONF.ingestion.async_retry_after
+            self._keyed = cfg.CONF.kafka.keyed
             self._metrics_repo = resource_api.init_driver(
                 'monasca.repositories', cfg.CONF.repositories.metrics_driver)
 
@@ -73,27 +153,29 @@ class Metrics(monasca_api_v2.V2API):
             LOG.debug(ex)
             raise falcon.HTTPBadRequest('Bad request', ex.message)
 
-    def _send_metrics(self, metrics):
+    def _send_metrics(self, messages, keys=None):
         """Send the metrics using the message queue.
 
-        :param metrics: A metric object or array of metrics objects.
+        All of the given messages are published with a single call to the
+        message queue. In async mode the messages are only queued to be
+        published.
+
+        :param messages: A list of serialized metric messages.
+        :param keys: The partition keys of the messages, or None.
         :raises: falcon.HTTPServiceUnavailable
         """
 
-        def _send_metric(metric):
-            try:
-                str_msg = json.dumps(metric, default=utils.date_handler)
-                self._message_queue.send_message(str_msg)
-            except message_queue_exceptions.MessageQueueException as ex:
-                LOG.exception(ex)
-                raise falcon.HTTPServiceUnavailable('Service unavailable',
-                                                    ex.message, 60)
-
-        if isinstance(metrics, list):
-            for metric in metrics:
-                _send_metric(metric)
-        else:
-            _send_metric(metrics)
+        try:
+            self._message_queue.send_messages(messages, keys)
+        except message_queue_exceptions.MessageQueueFullException as ex:
+            LOG.warning(ex)
+            raise falcon.HTTPServiceUnavailable('Service unavailable',
+                                                ex.message,
+                                                self._async_retry_after)
+        except message_queue_exceptions.MessageQueueException as ex:
+            LOG.exception(ex)
+            raise falcon.HTTPServiceUnavailable('Service unavailable',
+                                                ex.message, 60)
 
     def _list_metrics(self, tenant_id, name, dimensions, req_uri, offset):
         """Query the metric repo for the metrics, format them and return them.
@@ -118,7 +200,7 @@ class Metrics(monasca_api_v2.V2API):
                                                 ex.message, 60)
 
     def _measurement_list(self, tenant_id, name, dimensions, start_timestamp,
-                          end_timestamp, req_uri, offset):
+                          end_timestamp, req_uri, offset, time_format):
         try:
             result = self._metrics_repo.measurement_list(tenant_id,
                                                          self._region,
@@ -126,7 +208,8 @@ class Metrics(monasca_api_v2.V2API):
                                                          dimensions,
                                                          start_timestamp,
                                                          end_timestamp,
-                                                         offset)
+                                                         offset,
+                                                         time_format)
 
             if offset is not None:
 
@@ -147,16 +230,28 @@ class Metrics(monasca_api_v2.V2API):
             raise falcon.HTTPServiceUnavailable('Service unavailable',
                                                 ex.message, 60)
 
-    def _metric_statistics(self, tenant_id, name, dimensions, start_timestamp,
-                           end_timestamp, statistics, period):
+    def _measurement_stream(self, tenant_id, name, dimensions,
+                            start_timestamp, end_timestamp, time_format):
         try:
-            return self._metrics_repo.metrics_statistics(tenant_id,
+            return self._metrics_repo.measurement_stream(tenant_id,
                                                          self._region,
                                                          name,
                                                          dimensions,
                                                          start_timestamp,
                                                          end_timestamp,
-                                                         statistics, period)
+                                                         time_format)
+
+        except Exception as ex:
+            LOG.exception(ex)
+            raise falcon.HTTPServiceUnavailable('Service unavailable',
+                                                ex.message, 60)
+
+    def _metric_statistics(self, tenant_id, name, dimensions, start_timestamp,
+                           end_timestamp, statistics, period, time_format):
+        try:
+            return self._metrics_repo.metrics_statistics_stream(
+                tenant_id, self._region, name, dimensions, start_timestamp,
+                end_timestamp, statistics, period, time_format)
         except Exception as ex:
             LOG.exception(ex)
             raise falcon.HTTPServiceUnavailable('Service unavailable',
@@ -164,17 +259,42 @@ class Metrics(monasca_api_v2.V2API):
 
     @resource_api.Restify('/v2.0/metrics/', method='post')
     def do_post_metrics(self, req, res):
-        helpers.validate_json_content_type(req)
+        content_type = helpers.validate_json_content_type(
+            req, (helpers.JSON_CONTENT_TYPE, helpers.MSGPACK_CONTENT_TYPE))
         helpers.validate_authorization(req,
                                        self._post_metrics_authorized_roles)
-        metrics = helpers.read_http_resource(req)
-        self._validate_metrics(metrics)
         tenant_id = (
             helpers.get_x_tenant_or_tenant_id(req,
                                               self._delegate_authorized_roles))
-        transformed_metrics = self._metrics_transform(metrics, tenant_id,
-                                                      self._region)
-        self._send_metrics(transformed_metrics)
+        # Delegates may set the tenant of every metric in the body. For
+        # anyone else a tenant_id property fails validation.
+        is_delegate = helpers.is_in_role(req, self._delegate_authorized_roles)
+        # The body is decoded incrementally and every chunk is validated and
+        # serialized before the next one is read, but nothing is published
+        # before the whole body is known to be valid, so a rejected request
+        # can be retried without duplicating metrics.
+        messages = []
+        keys = [] if self._keyed else None
+        for metrics, raw_metrics in helpers.read_http_resource_chunks(
+                req, self._metrics_chunk_size, content_type):
+            if is_delegate:
+                tenants = group_by_tenant(metrics, raw_metrics, tenant_id)
+                self._validate_metrics(metrics)
+            else:
+                self._validate_metrics(metrics)
+                tenants = {tenant_id: (metrics, raw_metrics)}
+            for metrics_tenant_id, (tenant_metrics, tenant_raw_metrics) in (
+                    tenants.iteritems()):
+                messages.extend(self._metrics_serializer(tenant_metrics,
+                                                         tenant_raw_metrics,
+                                                         metrics_tenant_id,
+                                                         self._region))
+                if self._keyed:
+                    keys.extend(partitioning.series_keys(tenant_metrics,
+                                                         metrics_tenant_id,
+                                                         self._region))
+        if messages:
+            self._send_metrics(messages, keys)
         res.status = falcon.HTTP_204
 
     @resource_api.Restify('/v2.0/metrics/', method='get')
@@ -204,11 +324,19 @@ class Metrics(monasca_api_v2.V2API):
         end_timestamp = helpers.get_query_endtime_timestamp(req, False)
         offset = helpers.normalize_offset(helpers.get_query_param(req,
                                                                   'offset'))
-        result = self._measurement_list(tenant_id, name, dimensions,
-                                        start_timestamp, end_timestamp,
-                                        req.uri, offset)
-
-        res.body = helpers.dumpit_utf8(result)
+        time_format = helpers.get_query_time_format(req)
+        if offset is None:
+            # the whole range, sent as it is read from the repository.
+            result = self._measurement_stream(tenant_id, name, dimensions,
+                                              start_timestamp, end_timestamp,
+                                              time_format)
+            res.stream = _log_stream_errors(
+                helpers.dumpit_utf8_stream(result))
+        else:
+            result = self._measurement_list(tenant_id, name, dimensions,
+                                            start_timestamp, end_timestamp,
+                                            req.uri, offset, time_format)
+            res.body = helpers.dumpit_utf8(result)
         res.status = falcon.HTTP_200
 
     @resource_api.Restify('/v2.0/metrics/statistics', method='get')
@@ -223,8 +351,9 @@ class Metrics(monasca_api_v2.V2API):
         end_timestamp = helpers.get_query_endtime_timestamp(req, False)
         statistics = helpers.get_query_statistics(req)
         period = helpers.get_query_period(req)
+        time_format = helpers.get_query_time_format(req)
         result = self._metric_statistics(tenant_id, name, dimensions,
                                          start_timestamp, end_timestamp,
-                                         statistics, period)
-        res.body = helpers.dumpit_utf8(result)
+                                         statistics, period, time_format)
+        res.stream = _log_stream_errors(helpers.dumpit_utf8_stream(result))
         res.status = falcon.HTTP_200